@@ -4,7 +4,7 @@ import os, sys
 
 import numpy as np
 
-from pygeoc.raster import RasterUtilClass
+from pygeoc.raster import RasterUtilClass, RasterCalculator
 from pygeoc.utils import UtilClass
 
 
@@ -24,6 +24,10 @@ def main():
     RasterUtilClass.write_gtiff_file(output_tif, rst.nRows, rst.nCols, output_data, rst.geotrans,
                                      rst.srs, rst.noDataValue, rst.dataType)
 
+    # The same transformation evaluated block by block without loading the whole raster
+    output_tif2 = wp + '/log_dem_blockwise.tif'
+    RasterCalculator({'dem': input_tif}, 'log(dem)', rst.noDataValue).run(output_tif2)
+
 
 if __name__ == "__main__":
     main()
@@ -15,6 +15,7 @@
     - 21-09-07 lj - remove unnecessary functions of watershed_delineation
     - 21-11-01 lj - separate TauDEM and TauDEM_Ext related classes
     - 23-10-30 lj - move taudem extension functions of AutoFuzSlpPos to here
+    - 26-10-17 ag - read serialized subbasin of watershed_delineation from memory workspace
 
    .. _TauDEM:
       https://github.com/dtarb/TauDEM
@@ -30,7 +31,7 @@ from typing import List, Dict, AnyStr, Optional
 
 from osgeo.gdal import GDT_Int32
 from pygeoc.postTauDEM import StreamnetUtil
-from pygeoc.raster import RasterUtilClass
+from pygeoc.raster import RasterUtilClass, MemoryWorkspace
 from pygeoc.vector import VectorUtilClass
 from pygeoc.utils import UtilClass, MathClass, FileClass, StringClass, sysstr
 
@@ -897,7 +898,8 @@ class TauDEMWorkflow(object):
     def watershed_delineation(np, dem, outlet_file=None, thresh=0, singlebasin=False,
                               workingdir=None, mpi_bin=None, bin_dir=None,
                               logfile=None, runtime_file=None, hostfile=None,
-                              avoid_redo=False):
+                              avoid_redo=False, gtiff_profile=None, memory_workspace=None,
+                              stats_cache=None):
         """Watershed Delineation based on D8 flow direction.
 
         Args:
@@ -914,6 +916,19 @@ class TauDEMWorkflow(object):
             hostfile: host list file path for MPI
             avoid_redo: avoid executing some functions that do not depend on input arguments
                         when repeatedly invoke this function
+            gtiff_profile: GeoTiff creation options profile (e.g., 'deflate', see
+                           `pygeoc.raster.GTIFF_PROFILES`) of rasters written by PyGeoC,
+                           None as default to use the current default profile
+            memory_workspace: None (default) to write the serialized subbasin raster
+                              (`subbsn_m`) to `workingdir` and read it back from there.
+                              True to write it to GDAL `/vsimem/`, or a directory on RAM
+                              disk (e.g., `/dev/shm`), from which it is read to derive the
+                              serialized stream raster and subbasin shapefile, and then
+                              persisted to `workingdir` once. The other rasters are produced
+                              and consumed by TauDEM executables, and are always on disk.
+            stats_cache: None (default) to compute the statistics of accumulated flow without
+                         cache. True to use the default `pygeoc.raster.RasterStatsCache`
+                         (e.g., `~/.pygeoc/raster_stats.json`), or an instance of it.
         """
         # 1. Check directories
         if not os.path.exists(dem):
@@ -946,7 +961,8 @@ class TauDEMWorkflow(object):
                           log_file=logfile, runtime_file=runtime_file, hostfile=hostfile)
         # Initial stream network using mean accumulation as threshold
         UtilClass.writelog(logfile, '[Output] %s' % 'Generating stream raster initially...', 'a')
-        min_accum, max_accum, mean_accum, std_accum = RasterUtilClass.raster_statistics(nc.d8acc)
+        min_accum, max_accum, mean_accum, std_accum = \
+            RasterUtilClass.raster_statistics(nc.d8acc, cache=stats_cache)
         TauDEM.threshold(np, nc.d8acc, nc.stream_raster, mean_accum, workingdir,
                          mpi_bin, bin_dir, log_file=logfile,
                          runtime_file=runtime_file, hostfile=hostfile)
@@ -979,7 +995,7 @@ class TauDEMWorkflow(object):
             UtilClass.writelog(logfile, '[Output] %s' %
                                'Drop analysis to select optimal threshold...', 'a')
             min_accum, max_accum, mean_accum, std_accum = \
-                RasterUtilClass.raster_statistics(nc.d8acc_weight)
+                RasterUtilClass.raster_statistics(nc.d8acc_weight, cache=stats_cache)
             if mean_accum - std_accum < 0:
                 minthresh = mean_accum
             else:
@@ -1015,11 +1031,27 @@ class TauDEMWorkflow(object):
         # Serialize IDs of subbasins and the corresponding streams
         UtilClass.writelog(logfile, '[Output] %s' % 'Serialize subbasin&stream IDs...', 'a')
         id_map = StreamnetUtil.serialize_streamnet(nc.streamnet_shp, nc.streamnet_m)
-        RasterUtilClass.raster_reclassify(nc.subbsn, id_map, nc.subbsn_m, GDT_Int32)
-        StreamnetUtil.assign_stream_id_raster(nc.stream_raster, nc.subbsn_m, nc.stream_m)
-        # convert raster to shapefile (for subbasin and basin)
-        UtilClass.writelog(logfile, '[Output] %s' % 'Generating subbasin vector...', 'a')
-        VectorUtilClass.raster2shp(nc.subbsn_m, nc.subbsn_shp, 'subbasin', 'SUBBASINID')
+        previous_profile = None
+        if gtiff_profile is not None:
+            previous_profile = RasterUtilClass.set_default_gtiff_profile(gtiff_profile)
+        workspace = None
+        subbsn_m = nc.subbsn_m
+        if memory_workspace:
+            workspace = MemoryWorkspace(None if memory_workspace is True else memory_workspace)
+            subbsn_m = workspace.get_path(nc.subbsn_m)
+        try:
+            RasterUtilClass.raster_reclassify(nc.subbsn, id_map, subbsn_m, GDT_Int32)
+            StreamnetUtil.assign_stream_id_raster(nc.stream_raster, subbsn_m, nc.stream_m)
+            # convert raster to shapefile (for subbasin and basin)
+            UtilClass.writelog(logfile, '[Output] %s' % 'Generating subbasin vector...', 'a')
+            VectorUtilClass.raster2shp(subbsn_m, nc.subbsn_shp, 'subbasin', 'SUBBASINID')
+            if workspace is not None:
+                workspace.persist(subbsn_m, nc.subbsn_m)
+        finally:
+            if workspace is not None:
+                workspace.cleanup()
+            if previous_profile is not None:
+                RasterUtilClass.set_default_gtiff_profile(previous_profile)
         # Finish the workflow
         UtilClass.writelog(logfile, '[Output] %s' %
                            'Original subbasin delineation is finished!', 'a')
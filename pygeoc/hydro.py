@@ -8,13 +8,28 @@
     - 17-06-25 lj - check by pylint and reformat by Google style.
     - 18-02-05 lj - compatible with Python3
     - 20-03-28 lj - add delineation function of Hillslopes.
+    - 26-10-17 ag - add vectorized D8 receiver indexes, i.e., D8Util.receiver_indices.
+    - 26-10-17 ag - add FlowGraph, the CSR flow graph of D8, Dinf, and MFD-md flow directions.
+    - 26-10-17 ag - add in-process D8 flow accumulation, i.e., D8Util.flow_accumulation.
+    - 26-10-17 ag - add priority-flood depression filling, i.e., DEMUtil.fill_depressions.
+    - 26-10-17 ag - add in-process D8 flow direction and slope with flat resolution.
 """
 from __future__ import absolute_import, unicode_literals
 
 import os
+from collections import deque
+from functools import partial
+from heapq import heapify, heappop, heappush
+
 import numpy
-from pygeoc.raster import RasterUtilClass, GDALDataType
-from pygeoc.utils import FileClass, PI, SQ2, DEFAULT_NODATA
+from pygeoc.raster import Raster, RasterUtilClass, TileScheduler, GDALDataType
+from pygeoc.raster import GDT_Int16, GDT_Float32
+from pygeoc.utils import FileClass, PI, SQ2, DEFAULT_NODATA, DELTA, is_string
+
+NO_RECEIVER = -1
+"""Receiver index of cells that flow out of the grid, or have no valid flow direction."""
+
+_UNRESOLVED = 0  # temporary flow direction of cells not resolved in tiles, not a D8 code
 
 
 class FlowModelConst(object):
@@ -137,6 +152,382 @@ class D8Util(object):
         drow, dcol = delta[int(dir_value)]
         return i + drow, j + dcol
 
+    @staticmethod
+    def receiver_indices(flowdir, alg='taudem', nodata=None):
+        """Get flat indexes of the downstream (receiver) cells of all cells.
+
+        Args:
+            flowdir: 2D array of D8 flow direction codes.
+            alg: D8 flow direction algorithm, i.e., "TauDEM", "ArcGIS", or "Whitebox".
+            nodata: nodata value of `flowdir`, None as default. Cells with nodata or any
+                    invalid code are regarded as having no receiver.
+
+        Returns:
+            1D int32 array of flat (row-major) receiver indexes, `NO_RECEIVER` (-1) for cells
+            flowing out of the grid, nodata cells, and cells with invalid codes.
+
+        Examples:
+            >>> D8Util.receiver_indices(numpy.array([[1, 5], [3, -9999]]), nodata=-9999)
+            array([ 1,  0,  0, -1], dtype=int32)
+        """
+        assert alg.lower() in FlowModelConst.d8_deltas
+        flowdir = numpy.asarray(flowdir)
+        nrows, ncols = flowdir.shape
+        if nrows * ncols > numpy.iinfo(numpy.int32).max:
+            raise ValueError('The grid is too large to be indexed by int32!')
+        # lookup tables of delta row and col of each code, all codes are within 0~255
+        valid_code = numpy.zeros(256, dtype=bool)
+        drow = numpy.zeros(256, dtype=numpy.int32)
+        dcol = numpy.zeros(256, dtype=numpy.int32)
+        for code, (delta_row, delta_col) in FlowModelConst.d8_deltas.get(alg.lower()).items():
+            valid_code[code] = True
+            drow[code] = delta_row
+            dcol[code] = delta_col
+        codes = flowdir.ravel()
+        valid = (codes >= 0) & (codes < 256)
+        if nodata is not None:
+            valid &= codes != nodata
+        if codes.dtype.kind == 'f':
+            valid &= codes == numpy.floor(codes)  # also excludes NaN
+        codes = numpy.where(valid, codes, 0).astype(numpy.intp)
+        valid &= valid_code[codes]
+        rows, cols = numpy.divmod(numpy.arange(nrows * ncols, dtype=numpy.int32), ncols)
+        rows += drow[codes]
+        cols += dcol[codes]
+        valid &= (rows >= 0) & (rows < nrows) & (cols >= 0) & (cols < ncols)
+        receivers = rows * ncols + cols
+        receivers[~valid] = NO_RECEIVER
+        return receivers
+
+    @staticmethod
+    def flow_accumulation(flowdir, alg='taudem', weight=None, outlets=None,
+                          edge_contamination=True, nodata_value=None):
+        """D8 flow accumulation in-process, i.e., D8 contributing area (count of cells or sum
+        of weights) as `TauDEM.aread8`.
+
+        Args:
+            flowdir: D8 flow direction, filename(string), Raster object, or numpy.ndarray.
+            alg: D8 flow direction algorithm, i.e., "TauDEM", "ArcGIS", or "Whitebox".
+            weight: weight grid (as `-wg` of aread8) with the same extent of `flowdir`,
+                    filename(string), Raster object, or numpy.ndarray. Cells with nodata
+                    (or NaN) weight are regarded as unknown, thus the accumulation of them
+                    and their downstream cells are nodata.
+            outlets: list of (row, col) of outlets, only the cells upstream of outlets are
+                     accumulated, and the others are nodata.
+            edge_contamination: If True (default), check edge contamination conservatively,
+                                i.e., cells adjacent to the grid edge or cells with nodata
+                                flow direction, as well as their downstream cells, are
+                                nodata since the accumulation may be underestimated.
+            nodata_value: nodata value of `flowdir`, see `RasterUtilClass.label_connected`.
+
+        Returns:
+            2D float64 array of accumulation, `DEFAULT_NODATA` for nodata.
+
+        Examples:
+            >>> flowdir = numpy.array([[7, 7, 6], [1, 7, 5], [1, 1, 7]])
+            >>> D8Util.flow_accumulation(flowdir, edge_contamination=False)
+            array([[1., 1., 1.],
+                   [2., 6., 1.],
+                   [1., 8., 9.]])
+        """
+        data, nodata_value = RasterUtilClass._get_data_and_nodata(flowdir, nodata_value)
+        nrows, ncols = data.shape
+        graph = FlowGraph.from_d8(data, alg, nodata_value)
+        valid = numpy.isfinite(data) if data.dtype.kind == 'f' else numpy.ones(data.shape, bool)
+        if nodata_value is not None:
+            valid &= data != nodata_value
+        if weight is None:
+            values = numpy.ones((nrows, ncols), dtype=numpy.float64)
+        else:
+            weight, weight_nodata = RasterUtilClass._get_data_and_nodata(weight)
+            if weight.shape != data.shape:
+                raise ValueError('The extent of weight is not consistent with flow direction!')
+            values = numpy.array(weight, dtype=numpy.float64)
+            if weight_nodata is not None:
+                values[weight == weight_nodata] = numpy.nan
+        if edge_contamination:
+            invalid = numpy.pad(~valid, 1, 'constant', constant_values=True)
+            adjacent = numpy.zeros((nrows, ncols), dtype=bool)
+            for drow, dcol in zip(FlowModelConst.ccw_drow, FlowModelConst.ccw_dcol):
+                adjacent |= invalid[1 + drow:1 + drow + nrows, 1 + dcol:1 + dcol + ncols]
+            values[adjacent] = numpy.nan
+        acc = graph.accumulate(values).reshape(nrows, ncols)
+        if outlets is not None:
+            upstream = numpy.zeros(nrows * ncols, dtype=bool)
+            upstream[graph.upstream([row * ncols + col for row, col in outlets])] = True
+            valid &= upstream.reshape(nrows, ncols)
+        return numpy.where(valid & numpy.isfinite(acc), acc, DEFAULT_NODATA)
+
+    @staticmethod
+    def flow_direction(dem, alg='taudem', nodata_value=None, cell_size=None,
+                       resolve_flats=True, cut_edges=None, unresolved_value=DEFAULT_NODATA):
+        """D8 flow direction and slope in-process, like `TauDEM.d8flowdir`.
+
+        Each cell flows to the neighbor with the steepest downslope, which is found by
+        comparing the shifted arrays of eight neighbors (the first one in counterclockwise
+        from east wins if tied). Cells on the grid edge or adjacent to nodata cells without
+        downslope neighbor flow out of the grid. Flats are resolved by the gradients towards
+        lower terrain and away from higher terrain (Barnes et al., 2014), and cells in the
+        flats without outlet (i.e., depressions, see `DEMUtil.fill_depressions`) have nodata.
+
+        Args:
+            dem: filled DEM, filename(string), Raster object, or numpy.ndarray.
+            alg: D8 flow direction algorithm of output codes, i.e., "TauDEM", "ArcGIS",
+                 or "Whitebox".
+            nodata_value: nodata value, see `RasterUtilClass.label_connected`.
+            cell_size: cell size, or (x size, y size), None as default to be derived from
+                       the geotransform of DEM if possible, otherwise 1.
+            resolve_flats: If True (default), resolve flats, otherwise the cells of flats
+                           have nodata.
+            cut_edges: (top, bottom, left, right) booleans which indicate the edges of `dem`
+                       are cut from a larger grid (e.g., edges of tile), rather than the
+                       edges of the grid. The cells on cut edges and the flats touching them
+                       are not resolved. None as default.
+            unresolved_value: flow direction of the cells which are not resolved because of
+                              `cut_edges`, `DEFAULT_NODATA` as default.
+
+        Returns:
+            flowdir: 2D int16 array of D8 flow direction codes, `DEFAULT_NODATA` for nodata.
+            slope: 2D float64 array of the slope (drop / distance) to the downstream cell,
+                   0 for cells flowing out or within flats, `DEFAULT_NODATA` for nodata.
+
+        Examples:
+            >>> dem = numpy.array([[5, 5, 5, 5, 5],
+            ...                    [5, 3, 3, 3, 5],
+            ...                    [5, 3, 3, 3, 5],
+            ...                    [5, 2, 5, 5, 5]])
+            >>> flowdir, slope = D8Util.flow_direction(dem)
+            >>> flowdir
+            array([[8, 7, 7, 7, 6],
+                   [1, 7, 6, 6, 5],
+                   [8, 7, 6, 5, 5],
+                   [1, 6, 5, 3, 4]], dtype=int16)
+        """
+        if is_string(dem):
+            dem = RasterUtilClass.read_raster(str(dem), lazy=True)
+        if cell_size is None and isinstance(dem, Raster) and dem.geotrans is not None:
+            cell_size = (abs(dem.geotrans[1]), abs(dem.geotrans[5]))
+        data, nodata_value = RasterUtilClass._get_data_and_nodata(dem, nodata_value)
+        if cell_size is None:
+            cell_size = 1.
+        xsize, ysize = cell_size if isinstance(cell_size, (list, tuple)) else (cell_size,
+                                                                                cell_size)
+        nrows, ncols = data.shape
+        elev = numpy.array(data, dtype=numpy.float64)
+        valid = ~numpy.isnan(elev)
+        if nodata_value is not None:
+            valid &= data != nodata_value
+        padded_elev = numpy.pad(elev, 1, 'constant', constant_values=numpy.nan)
+        padded_valid = numpy.pad(valid, 1, 'constant', constant_values=False)
+        dirs = numpy.full((nrows, ncols), -1, dtype=numpy.int8)
+        slope = numpy.zeros((nrows, ncols), dtype=numpy.float64)
+        out_dirs = numpy.full((nrows, ncols), -1, dtype=numpy.int8)  # first direction out
+        with numpy.errstate(invalid='ignore'):
+            for d, (drow, dcol) in enumerate(zip(FlowModelConst.ccw_drow,
+                                                 FlowModelConst.ccw_dcol)):
+                neighbor = padded_elev[1 + drow:1 + drow + nrows, 1 + dcol:1 + dcol + ncols]
+                neighbor_valid = padded_valid[1 + drow:1 + drow + nrows,
+                                              1 + dcol:1 + dcol + ncols]
+                drop = (elev - neighbor) / numpy.hypot(drow * ysize, dcol * xsize)
+                steeper = neighbor_valid & (drop > slope)
+                dirs[steeper] = d
+                slope[steeper] = drop[steeper]
+                out_dirs[(out_dirs < 0) & ~neighbor_valid] = d
+        unknown = numpy.zeros((nrows, ncols), dtype=bool)
+        if cut_edges is not None:
+            top, bottom, left, right = cut_edges
+            unknown[0, :] |= top
+            unknown[-1, :] |= bottom
+            unknown[:, 0] |= left
+            unknown[:, -1] |= right
+            unknown &= valid
+            dirs[unknown] = -1
+        outlets = valid & ~unknown & (dirs < 0) & (out_dirs >= 0)
+        dirs[outlets] = out_dirs[outlets]
+        flats = valid & ~unknown & (dirs < 0)
+        if resolve_flats and flats.any():
+            unknown |= D8Util._resolve_flats(elev, valid, dirs, flats, unknown)
+        codes = numpy.array(FlowModelConst.d8_dirs.get(alg.lower()), dtype=numpy.int16)
+        flowdir = numpy.where(dirs >= 0, codes[dirs], DEFAULT_NODATA).astype(numpy.int16)
+        flowdir[unknown] = unresolved_value
+        return flowdir, numpy.where(valid, slope, DEFAULT_NODATA)
+
+    @staticmethod
+    def _resolve_flats(elev, valid, dirs, flats, unknown):
+        """Assign D8 flow directions (index of `FlowModelConst.ccw_drow`) of flat cells by
+        the algorithm of Barnes et al. (2014), `dirs` is updated in place.
+
+        Args:
+            elev: 2D array of elevation.
+            valid: 2D boolean array of valid cells.
+            dirs: 2D int8 array of flow direction index, -1 for cells without direction.
+            flats: 2D boolean array of flat cells, i.e., valid cells without direction.
+            unknown: 2D boolean array of cells whose neighbors are unknown.
+
+        Returns:
+            2D boolean array of the flat cells which are not resolved since the flats
+            touch `unknown` cells.
+        """
+        nrows, ncols = elev.shape
+        width = ncols + 2
+        offsets = numpy.array([drow * width + dcol for drow, dcol in
+                               zip(FlowModelConst.ccw_drow, FlowModelConst.ccw_dcol)])
+        padded_elev = numpy.pad(elev, 1, 'constant', constant_values=numpy.nan)
+        padded_valid = numpy.pad(valid, 1, 'constant', constant_values=False)
+        padded_flats = numpy.pad(flats, 1, 'constant', constant_values=False)
+        # low edges: cells with direction adjacent to flat cells with the same elevation,
+        # high edges: flat cells adjacent to higher cells
+        low = numpy.zeros((nrows, ncols), dtype=bool)
+        high = numpy.zeros((nrows, ncols), dtype=bool)
+        for drow, dcol in zip(FlowModelConst.ccw_drow, FlowModelConst.ccw_dcol):
+            window = (slice(1 + drow, 1 + drow + nrows), slice(1 + dcol, 1 + dcol + ncols))
+            low |= padded_flats[window] & (padded_elev[window] == elev)
+            high |= padded_valid[window] & (padded_elev[window] > elev)
+        low &= dirs >= 0
+        high &= flats
+        # label flats with their low edges by the same elevation
+        labels, table = RasterUtilClass.label_connected(
+            numpy.where(flats | low | unknown, elev, numpy.nan), connectivity=8)
+        drainable = numpy.zeros(len(table['label']) + 1, dtype=bool)
+        drainable[labels[low]] = True
+        touched = numpy.zeros(drainable.size, dtype=bool)
+        touched[labels[unknown]] = True
+        touched[0] = False
+        blocked = flats & touched[labels]
+        drainable &= ~touched
+        drainable[0] = False
+        flats = flats & drainable[labels]
+        low &= drainable[labels]
+        labels = numpy.pad(labels, 1, 'constant').ravel()
+        allowed = numpy.pad(flats, 1, 'constant').ravel()
+
+        owner = numpy.zeros(labels.size, dtype=numpy.int64)
+
+        def bfs(starts):
+            """Breadth-first search from `starts` within flats, returns the loops."""
+            dist = numpy.zeros(labels.size, dtype=numpy.int32)
+            frontier = numpy.flatnonzero(numpy.pad(starts, 1, 'constant'))
+            loops = 1
+            dist[frontier] = loops
+            while frontier.size > 0:
+                loops += 1
+                neighbors = (frontier[:, None] + offsets[None, :]).ravel()
+                ok = allowed[neighbors] & (dist[neighbors] == 0) & \
+                    (labels[neighbors] == numpy.repeat(labels[frontier], 8))
+                frontier = neighbors[ok]
+                # remove duplicates without sorting
+                positions = numpy.arange(frontier.size)
+                owner[frontier] = positions
+                frontier = frontier[owner[frontier] == positions]
+                dist[frontier] = loops
+            return dist
+
+        away = bfs(high)
+        height = numpy.zeros(drainable.size, dtype=numpy.int32)
+        numpy.maximum.at(height, labels, away)
+        towards = bfs(low)
+        mask = numpy.where(away > 0, height[labels] - away + 2 * towards, 2 * towards)
+        mask = mask.reshape(nrows + 2, ncols + 2).astype(numpy.float64)
+        mask[numpy.pad(~(flats | low), 1, 'constant', constant_values=True)] = numpy.inf
+        labels = labels.reshape(nrows + 2, ncols + 2)
+        best = mask[1:-1, 1:-1].copy()
+        for d, (drow, dcol) in enumerate(zip(FlowModelConst.ccw_drow, FlowModelConst.ccw_dcol)):
+            window = (slice(1 + drow, 1 + drow + nrows), slice(1 + dcol, 1 + dcol + ncols))
+            lower = flats & (labels[window] == labels[1:-1, 1:-1]) & (mask[window] < best)
+            dirs[lower] = d
+            best[lower] = mask[window][lower]
+        return blocked
+
+    @staticmethod
+    def flow_direction_tiled(dem_file, flowdir_file, slope_file=None, alg='taudem',
+                             resolve_flats=True, tile_shape=None, halo=1, processes=1,
+                             options=None):
+        """D8 flow direction and slope of large DEM by tiles, the same as `flow_direction`.
+
+        The flow directions and slopes of tiles with halo are computed in one pass. The cells
+        which cannot be resolved within the tiles, i.e., flats crossing the edges of tiles
+        with halo, are resolved afterwards by the windows around them, which are enlarged
+        until the flats are covered. Thus, large flats crossing tiles (e.g., lakes) are read
+        as a whole, and larger `halo` or `tile_shape` could reduce such flats.
+
+        Args:
+            dem_file: filled DEM raster file.
+            flowdir_file: output D8 flow direction raster file.
+            slope_file: output slope raster file, optional.
+            alg: D8 flow direction algorithm of output codes.
+            resolve_flats: If True (default), resolve flats.
+            tile_shape: (rows, cols) of tiles, see `pygeoc.raster.TileScheduler`.
+            halo: halo width of tiles, 1 as default.
+            processes: number of worker processes, 1 as default.
+            options: GeoTiff creation options, see `RasterUtilClass.write_gtiff_file`.
+        """
+        header = RasterUtilClass.read_raster_header(dem_file)
+        kwargs = {'alg': alg, 'nodata_value': header.noDataValue,
+                  'cell_size': (abs(header.geotrans[1]), abs(header.geotrans[5])),
+                  'resolve_flats': resolve_flats}
+        out_files = [flowdir_file]
+        gdal_types = [GDT_Int16]
+        if slope_file is not None:
+            out_files.append(slope_file)
+            gdal_types.append(GDT_Float32)
+        kernel = partial(_flow_direction_tile, with_slope=slope_file is not None, **kwargs)
+        TileScheduler(kernel, halo=halo, tile_shape=tile_shape, processes=processes,
+                      with_window=True).run(dem_file, out_files, gdal_types, DEFAULT_NODATA,
+                                            options)
+        D8Util._resolve_unresolved(dem_file, flowdir_file, slope_file, **kwargs)
+
+    @staticmethod
+    def _resolve_unresolved(dem_file, flowdir_file, slope_file=None, margin=16, **kwargs):
+        """Resolve the cells left by tiles of `flow_direction_tiled` in place.
+
+        Starting from a window of `margin` cells around an unresolved cell, the flow
+        direction is computed again and the window is doubled until the cell is resolved,
+        which ends at the whole grid without cut edges at most.
+
+        Args:
+            dem_file: filled DEM raster file.
+            flowdir_file: D8 flow direction raster file, the unresolved cells are `_UNRESOLVED`.
+            slope_file: slope raster file, optional.
+            margin: initial margin of the window around an unresolved cell.
+            **kwargs: other arguments of `flow_direction`.
+        """
+        rows, cols = list(), list()
+        for win, block in RasterUtilClass.iter_blocks(flowdir_file):
+            blk_rows, blk_cols = numpy.nonzero(block == _UNRESOLVED)
+            rows.append(blk_rows + win.yoff)
+            cols.append(blk_cols + win.xoff)
+        rows = numpy.concatenate(rows)
+        cols = numpy.concatenate(cols)
+        pending = numpy.ones(rows.size, dtype=bool)
+        header = RasterUtilClass.read_raster_header(flowdir_file)
+        nrows, ncols = header.nRows, header.nCols
+        while pending.any():
+            idx = numpy.argmax(pending)
+            size = margin
+            while pending[idx]:
+                row_beg, row_end = max(0, rows[idx] - size), min(nrows, rows[idx] + size + 1)
+                col_beg, col_end = max(0, cols[idx] - size), min(ncols, cols[idx] + size + 1)
+                window = (col_beg, row_beg, col_end - col_beg, row_end - row_beg)
+                cut_edges = (row_beg > 0, row_end < nrows, col_beg > 0, col_end < ncols)
+                dem = RasterUtilClass.read_raster(dem_file, lazy=True, window=window).data
+                flowdir, slope = D8Util.flow_direction(dem, cut_edges=cut_edges,
+                                                       unresolved_value=_UNRESOLVED, **kwargs)
+                current = RasterUtilClass.read_raster(flowdir_file, lazy=True,
+                                                      window=window).data
+                resolved = (current == _UNRESOLVED) & (flowdir != _UNRESOLVED)
+                if resolved.any():
+                    RasterUtilClass.update_raster_window(
+                        flowdir_file, numpy.where(resolved, flowdir, current), col_beg, row_beg)
+                    if slope_file is not None:
+                        current = RasterUtilClass.read_raster(slope_file, lazy=True,
+                                                              window=window).data
+                        RasterUtilClass.update_raster_window(
+                            slope_file, numpy.where(resolved, slope, current), col_beg, row_beg)
+                inside = pending & (rows >= row_beg) & (rows < row_end) & \
+                    (cols >= col_beg) & (cols < col_end)
+                pending[inside] = ~resolved[rows[inside] - row_beg, cols[inside] - col_beg]
+                size *= 2
+
     @staticmethod
     def convert_code(in_file, out_file, in_alg='taudem', out_alg='arcgis', datatype=None):
         """
@@ -166,6 +557,503 @@ class D8Util(object):
             RasterUtilClass.raster_reclassify(in_file, convert_dict, out_file)
 
 
+class FlowGraph(object):
+    """Compact flow graph of grid cells in CSR (Compressed Sparse Row) format.
+
+    Cells are indexed by flat (row-major) indexes. The receivers (downstream cells) of cell `i`
+    are `receivers[receiver_ptr[i]:receiver_ptr[i + 1]]` with flow fractions in the same
+    positions of `fractions` (None for single flow direction), and the donors (upstream cells)
+    are `donors[donor_ptr[i]:donor_ptr[i + 1]]`. All index arrays are int32.
+
+    The graph could be built from D8 (`from_d8`), Dinf (`from_dinf`), and compressed MFD-md
+    (`from_mfdmd`) flow directions, and saved as `.npz` file or a directory of `.npy` files
+    which could be loaded by memory mapping (`save` and `load`).
+
+    Examples:
+        >>> g = FlowGraph.from_d8(numpy.array([[1, 7], [1, -1]]), nodata=-1)
+        >>> g.get_receivers(0), g.get_donors(3)
+        (array([1], dtype=int32), array([1, 2], dtype=int32))
+        >>> g.upstream(3)
+        array([0, 1, 2, 3], dtype=int32)
+        >>> g.topological_levels().reshape(2, 2)
+        array([[0, 1],
+               [0, 2]], dtype=int32)
+    """
+    _ARRAYS = ['receiver_ptr', 'receivers', 'donor_ptr', 'donors', 'fractions']
+
+    def __init__(self, nrows, ncols, receiver_ptr, receivers, donor_ptr, donors,
+                 fractions=None):
+        """Constructor, see `from_edges` to build the CSR arrays from flow edges."""
+        self.nrows = int(nrows)
+        self.ncols = int(ncols)
+        self.receiver_ptr = receiver_ptr
+        self.receivers = receivers
+        self.donor_ptr = donor_ptr
+        self.donors = donors
+        self.fractions = fractions
+
+    @property
+    def cell_count(self):
+        """Count of grid cells."""
+        return self.nrows * self.ncols
+
+    @property
+    def receiver_counts(self):
+        """Count of receivers of each cell."""
+        return numpy.diff(self.receiver_ptr)
+
+    @property
+    def donor_counts(self):
+        """Count of donors of each cell."""
+        return numpy.diff(self.donor_ptr)
+
+    @staticmethod
+    def from_edges(nrows, ncols, src, dst, fractions=None):
+        """Build flow graph from flow edges.
+
+        Args:
+            nrows: row count of the grid.
+            ncols: col count of the grid.
+            src: flat indexes of the cells that flow out.
+            dst: flat indexes of the receivers of `src`.
+            fractions: flow fractions of the edges, None as default for single flow direction.
+
+        Returns:
+            FlowGraph.
+        """
+        n = nrows * ncols
+        src = numpy.asarray(src, dtype=numpy.int32)
+        dst = numpy.asarray(dst, dtype=numpy.int32)
+        if src.size > numpy.iinfo(numpy.int32).max:
+            raise ValueError('The flow graph is too large to be indexed by int32!')
+        order = numpy.argsort(src, kind='stable')
+        src = src[order]
+        dst = dst[order]
+        if fractions is not None:
+            fractions = numpy.asarray(fractions, dtype=numpy.float32)[order]
+        receiver_ptr = numpy.zeros(n + 1, dtype=numpy.int32)
+        numpy.cumsum(numpy.bincount(src, minlength=n), out=receiver_ptr[1:])
+        order = numpy.argsort(dst, kind='stable')
+        donor_ptr = numpy.zeros(n + 1, dtype=numpy.int32)
+        numpy.cumsum(numpy.bincount(dst, minlength=n), out=donor_ptr[1:])
+        return FlowGraph(nrows, ncols, receiver_ptr, dst, donor_ptr, src[order], fractions)
+
+    @staticmethod
+    def _neighbor_edges(nrows, ncols, direction_masks):
+        """Get flow edges from the masks of cells flowing to each neighbor.
+
+        Args:
+            nrows: row count of the grid.
+            ncols: col count of the grid.
+            direction_masks: list of 8 flat boolean arrays by the sequence of
+                             `FlowModelConst.ccw_drow` and `FlowModelConst.ccw_dcol`.
+
+        Returns:
+            src, dst, and the direction index (0~7) of the edges within the grid.
+        """
+        rows, cols = numpy.divmod(numpy.arange(nrows * ncols, dtype=numpy.int32), ncols)
+        srcs = list()
+        dsts = list()
+        dirs = list()
+        for d, mask in enumerate(direction_masks):
+            drow = FlowModelConst.ccw_drow[d]
+            dcol = FlowModelConst.ccw_dcol[d]
+            src = numpy.flatnonzero(mask & (rows + drow >= 0) & (rows + drow < nrows) &
+                                    (cols + dcol >= 0) & (cols + dcol < ncols))
+            srcs.append(src)
+            dsts.append(src + drow * ncols + dcol)
+            dirs.append(numpy.full(src.size, d, dtype=numpy.int8))
+        return numpy.concatenate(srcs), numpy.concatenate(dsts), numpy.concatenate(dirs)
+
+    @staticmethod
+    def from_d8(flowdir, alg='taudem', nodata=None):
+        """Build flow graph from D8 flow direction.
+
+        Args:
+            flowdir: 2D array of D8 flow direction codes.
+            alg: D8 flow direction algorithm, i.e., "TauDEM", "ArcGIS", or "Whitebox".
+            nodata: nodata value of `flowdir`.
+
+        Returns:
+            FlowGraph without fractions.
+        """
+        nrows, ncols = numpy.shape(flowdir)
+        receivers = D8Util.receiver_indices(flowdir, alg, nodata)
+        src = numpy.flatnonzero(receivers != NO_RECEIVER)
+        return FlowGraph.from_edges(nrows, ncols, src, receivers[src])
+
+    @staticmethod
+    def from_dinf(angle, nodata=None, minfrac=0.01):
+        """Build flow graph from Dinf flow direction angle of TauDEM.
+
+        The flow is partitioned into two neighbors as `DinfUtil.compress_dinf`, and the angle
+        close to one neighbor according to `minfrac` is regarded as single flow direction.
+
+        Args:
+            angle: 2D array of Dinf flow direction angles (counterclockwise radian from east).
+            nodata: nodata value of `angle`.
+            minfrac: Minimum flow fraction that accounted, e.g., 0.01.
+
+        Returns:
+            FlowGraph with fractions.
+        """
+        nrows, ncols = numpy.shape(angle)
+        angle = numpy.asarray(angle, dtype=numpy.float64).ravel()
+        with numpy.errstate(invalid='ignore'):
+            valid = (angle >= 0.) & (angle <= 2. * PI)
+        if nodata is not None:
+            valid &= angle != nodata
+        quarter = PI * 0.25
+        angle = numpy.where(valid, angle, 0.)
+        first = numpy.floor(angle / quarter).astype(numpy.int32)
+        portion = angle / quarter - first  # portion of the second direction
+        first %= 8
+        frac = minfrac + DELTA / quarter
+        single_first = valid & (portion <= frac)
+        single_second = valid & (portion >= 1. - frac)
+        portion[single_first] = 0.
+        portion[single_second] = 1.
+        src1, dst1, _ = FlowGraph._neighbor_edges(
+            nrows, ncols, [valid & (first == d) & ~single_second for d in range(8)])
+        src2, dst2, _ = FlowGraph._neighbor_edges(
+            nrows, ncols, [valid & (first == (d - 1) % 8) & ~single_first for d in range(8)])
+        return FlowGraph.from_edges(nrows, ncols, numpy.concatenate([src1, src2]),
+                                    numpy.concatenate([dst1, dst2]),
+                                    numpy.concatenate([1. - portion[src1], portion[src2]]))
+
+    @staticmethod
+    def from_mfdmd(dir_code, nodata=None, fractions=None):
+        """Build flow graph from compressed multiple flow directions, e.g., MFD-md.
+
+        Args:
+            dir_code: 2D array of compressed flow direction codes, i.e., sum of the ArcGIS D8
+                      codes of all downstream directions, e.g., 129 (1 + 128) for east and
+                      northeast, see also `DinfUtil.compress_dinf`.
+            nodata: nodata value of `dir_code`.
+            fractions: list of 8 2D arrays of flow fractions to each neighbor by the sequence of
+                       `FlowModelConst.d8anglelist` (counterclockwise from east), None as
+                       default to partition flow equally.
+
+        Returns:
+            FlowGraph with fractions.
+        """
+        nrows, ncols = numpy.shape(dir_code)
+        codes = numpy.asarray(dir_code).ravel()
+        valid = (codes > 0) & (codes < 256)
+        if nodata is not None:
+            valid &= codes != nodata
+        if codes.dtype.kind == 'f':
+            valid &= codes == numpy.floor(codes)
+        codes = numpy.where(valid, codes, 0).astype(numpy.int32)
+        masks = [(codes & code) > 0 for code in FlowModelConst.d8dir_ag]
+        src, dst, dirs = FlowGraph._neighbor_edges(nrows, ncols, masks)
+        if fractions is None:
+            counts = numpy.zeros(nrows * ncols, dtype=numpy.int32)
+            for mask in masks:
+                counts += mask
+            fracs = 1. / counts[src]
+        else:
+            fractions = numpy.array([numpy.asarray(f).ravel() for f in fractions],
+                                    dtype=numpy.float32)
+            fracs = fractions[dirs, src]
+        return FlowGraph.from_edges(nrows, ncols, src, dst, fracs)
+
+    @staticmethod
+    def from_raster(flowdir_file, flow_model='d8', alg='taudem', fraction_files=None,
+                    minfrac=0.01):
+        """Build flow graph from flow direction raster file.
+
+        Args:
+            flowdir_file: flow direction raster file.
+            flow_model: 'd8', 'dinf', or 'mfdmd'.
+            alg: D8 flow direction algorithm, see `from_d8`.
+            fraction_files: list of 8 flow fraction raster files of MFD-md, see `from_mfdmd`.
+            minfrac: Minimum flow fraction of Dinf, see `from_dinf`.
+
+        Returns:
+            FlowGraph.
+        """
+        flowdir_r = RasterUtilClass.read_raster(flowdir_file, lazy=True)
+        flow_model = flow_model.lower()
+        if flow_model == 'd8':
+            return FlowGraph.from_d8(flowdir_r.data, alg, flowdir_r.noDataValue)
+        if flow_model == 'dinf':
+            return FlowGraph.from_dinf(flowdir_r.data, flowdir_r.noDataValue, minfrac)
+        if flow_model == 'mfdmd':
+            fractions = None
+            if fraction_files is not None:
+                fractions = [r.data for r in RasterUtilClass.read_rasters(fraction_files)]
+            return FlowGraph.from_mfdmd(flowdir_r.data, flowdir_r.noDataValue, fractions)
+        raise ValueError('Unsupported flow model: %s, which should be d8, dinf, or mfdmd.'
+                         % flow_model)
+
+    def save(self, path):
+        """Save flow graph to `.npz` file or a directory of `.npy` files.
+
+        Args:
+            path: file path ends with `.npz`, otherwise a directory path. The directory
+                  could be loaded by memory mapping, see `load`.
+        """
+        arrays = {'shape': numpy.array([self.nrows, self.ncols], dtype=numpy.int64)}
+        for name in FlowGraph._ARRAYS:
+            if getattr(self, name) is not None:
+                arrays[name] = getattr(self, name)
+        if path.lower().endswith('.npz'):
+            numpy.savez(path, **arrays)
+            return
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name, value in arrays.items():
+            numpy.save(os.path.join(path, name + '.npy'), value)
+
+    @staticmethod
+    def load(path, mmap=True):
+        """Load flow graph saved by `save`.
+
+        Args:
+            path: `.npz` file path or directory path.
+            mmap: If True (default), the arrays saved in directory are memory mapped
+                  as read-only.
+
+        Returns:
+            FlowGraph.
+        """
+        arrays = dict()
+        if path.lower().endswith('.npz'):
+            with numpy.load(path) as npz:
+                for name in npz.files:
+                    arrays[name] = npz[name]
+        else:
+            for name in ['shape'] + FlowGraph._ARRAYS:
+                f = os.path.join(path, name + '.npy')
+                if os.path.exists(f):
+                    arrays[name] = numpy.load(f, mmap_mode='r' if mmap else None)
+        nrows, ncols = arrays.pop('shape').tolist()
+        return FlowGraph(nrows, ncols, **arrays)
+
+    @staticmethod
+    def _gather(ptr, values, cells):
+        """Concatenate the CSR rows of `cells`."""
+        starts = ptr[cells]
+        counts = ptr[cells + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            return numpy.zeros(0, dtype=numpy.int32)
+        offsets = numpy.repeat(starts - numpy.cumsum(counts) + counts, counts)
+        return values[offsets + numpy.arange(total)]
+
+    def get_receivers(self, index):
+        """Get flat indexes of the receivers of a cell."""
+        return numpy.asarray(self.receivers[self.receiver_ptr[index]:
+                                            self.receiver_ptr[index + 1]])
+
+    def get_donors(self, index):
+        """Get flat indexes of the donors of a cell."""
+        return numpy.asarray(self.donors[self.donor_ptr[index]:self.donor_ptr[index + 1]])
+
+    def _traverse(self, ptr, values, cells):
+        """Get all cells reached from `cells` (included) by the CSR graph."""
+        visited = numpy.zeros(self.cell_count, dtype=bool)
+        frontier = numpy.unique(numpy.asarray(cells, dtype=numpy.int32).ravel())
+        visited[frontier] = True
+        while frontier.size > 0:
+            frontier = FlowGraph._gather(ptr, values, frontier)
+            frontier = numpy.unique(frontier[~visited[frontier]])
+            visited[frontier] = True
+        return numpy.flatnonzero(visited).astype(numpy.int32)
+
+    def upstream(self, cells):
+        """Get flat indexes of all upstream cells of the given cell(s), inclusive."""
+        return self._traverse(self.donor_ptr, self.donors, cells)
+
+    def downstream(self, cells):
+        """Get flat indexes of all downstream cells of the given cell(s), inclusive."""
+        return self._traverse(self.receiver_ptr, self.receivers, cells)
+
+    def topological_levels(self):
+        """Get topological levels from upstream to downstream.
+
+        Cells without donors are level 0, and each other cell is one level higher than the
+        highest level of its donors. Thus cells could be processed level by level.
+
+        Returns:
+            1D int32 array of levels, -1 for cells within or downstream of flow loops.
+        """
+        levels = numpy.full(self.cell_count, -1, dtype=numpy.int32)
+        for level, frontier in enumerate(self._iter_levels()):
+            levels[frontier] = level
+        return levels
+
+    def _iter_levels(self):
+        """Iterate flat indexes of cells level by level, see `topological_levels`."""
+        pending = self.donor_counts.astype(numpy.int32)
+        frontier = numpy.flatnonzero(pending == 0)
+        while frontier.size > 0:
+            yield frontier
+            receivers, counts = numpy.unique(FlowGraph._gather(self.receiver_ptr,
+                                                               self.receivers, frontier),
+                                             return_counts=True)
+            pending[receivers] -= counts.astype(numpy.int32)
+            frontier = receivers[pending[receivers] == 0]
+
+    def accumulate(self, values=None):
+        """Accumulate values from upstream to downstream, e.g., flow accumulation.
+
+        The accumulated value of each cell is its own value plus the accumulated values of
+        its donors (multiplied by flow fractions if available). NaN propagates to all
+        downstream cells.
+
+        Args:
+            values: 1D array of values of cells, None as default to accumulate 1 (i.e.,
+                    count of cells).
+
+        Returns:
+            1D float64 array of accumulated values, NaN for cells within or downstream of
+            flow loops (see `topological_levels`).
+        """
+        if values is None:
+            acc = numpy.ones(self.cell_count, dtype=numpy.float64)
+        else:
+            acc = numpy.array(values, dtype=numpy.float64).ravel()
+        done = numpy.zeros(self.cell_count, dtype=bool)
+        for frontier in self._iter_levels():
+            done[frontier] = True
+            counts = self.receiver_ptr[frontier + 1] - self.receiver_ptr[frontier]
+            receivers = FlowGraph._gather(self.receiver_ptr, self.receivers, frontier)
+            if receivers.size == 0:
+                continue
+            amounts = numpy.repeat(acc[frontier], counts)
+            if self.fractions is not None:
+                amounts *= FlowGraph._gather(self.receiver_ptr, self.fractions, frontier)
+            numpy.add.at(acc, receivers, amounts)
+        acc[~done] = numpy.nan
+        return acc
+
+    def topological_order(self):
+        """Get flat indexes of cells sorted from upstream to downstream, excluding the
+        cells with level -1 (see `topological_levels`)."""
+        levels = self.topological_levels()
+        order = numpy.argsort(levels, kind='stable').astype(numpy.int32)
+        return order[levels[order] >= 0]
+
+
+class DEMUtil(object):
+    """Utility functions of DEM preprocessing in-process, e.g., depression filling."""
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def fill_depressions(dem, epsilon=False, nodata_value=None, lean=False):
+        """Fill depressions of DEM by Priority-Flood (Barnes et al., 2014), like `TauDEM.pitremove`.
+
+        Cells on the grid edge or adjacent to nodata cells are seeds that drain out, and the
+        cells are flooded from the seeds in order of elevation by a priority queue, while
+        the cells within depressions are processed by a plain queue (i.e., the pit queue).
+
+        Args:
+            dem: DEM, filename(string), Raster object, or numpy.ndarray (e.g., a block).
+            epsilon: False (default) to fill depressions as flats, which could be resolved
+                     by flat resolution of flow direction later. True to raise the filled
+                     cells by the minimal increment of float (`numpy.nextafter`), i.e.,
+                     Priority-Flood+epsilon, thus all cells drain out. Or a positive
+                     increment value, which is at least the minimal increment of float.
+            nodata_value: nodata value, see `RasterUtilClass.label_connected`. NaN is
+                          also regarded as nodata.
+            lean: If True, the DEM is processed as float32 with int32 indexes, and the
+                  elevation and index of each cell in the priority queue are compacted into
+                  one integer, which reduces memory about by half. False as default.
+
+        Returns:
+            2D array of filled DEM, float32 if `lean` else float64, the nodata cells keep
+            `nodata_value`.
+
+        Examples:
+            >>> dem = numpy.array([[5, 5, 5, 5],
+            ...                    [5, 1, 2, 5],
+            ...                    [5, 3, 5, 5],
+            ...                    [5, 4, 5, 5]])
+            >>> DEMUtil.fill_depressions(dem)
+            array([[5., 5., 5., 5.],
+                   [5., 4., 4., 5.],
+                   [5., 4., 5., 5.],
+                   [5., 4., 5., 5.]])
+        """
+        data, nodata_value = RasterUtilClass._get_data_and_nodata(dem, nodata_value)
+        nrows, ncols = data.shape
+        if lean and (nrows + 2) * (ncols + 2) > numpy.iinfo(numpy.int32).max:
+            raise ValueError('The DEM is too large to be indexed by int32!')
+        dtype = numpy.float32 if lean else numpy.float64
+        # padded by one cell of nodata, thus neighbors could be accessed without bound checks
+        elev = numpy.zeros((nrows + 2, ncols + 2), dtype=dtype)
+        elev[1:-1, 1:-1] = data
+        invalid = numpy.ones((nrows + 2, ncols + 2), dtype=bool)
+        invalid[1:-1, 1:-1] = numpy.isnan(elev[1:-1, 1:-1])
+        if nodata_value is not None:
+            invalid[1:-1, 1:-1] |= data == nodata_value
+        seeds = numpy.zeros((nrows + 2, ncols + 2), dtype=bool)
+        for drow, dcol in zip(FlowModelConst.ccw_drow, FlowModelConst.ccw_dcol):
+            seeds[1:-1, 1:-1] |= invalid[1 + drow:nrows + 1 + drow, 1 + dcol:ncols + 1 + dcol]
+        seeds &= ~invalid
+        width = ncols + 2
+        offsets = [drow * width + dcol
+                   for drow, dcol in zip(FlowModelConst.ccw_drow, FlowModelConst.ccw_dcol)]
+        seeds = numpy.flatnonzero(seeds).astype(numpy.int32 if lean else numpy.int64)
+        elev = elev.ravel()
+        closed = invalid.astype(numpy.uint8).ravel()
+        closed[seeds] = 1
+        if lean:
+            # the unsigned integer of float32 bits with the same order of float32
+            bits = elev.view(numpy.uint32)
+            keys = bits[seeds].astype(numpy.uint64)
+            keys = numpy.where(keys >= 0x80000000, 0xFFFFFFFF - keys, keys + 0x80000000)
+            pqueue = ((keys << 32) | seeds.astype(numpy.uint64)).tolist()
+            bits = memoryview(bits)
+        else:
+            pqueue = list(zip(elev[seeds].tolist(), seeds.tolist()))
+        heapify(pqueue)
+        pit = deque()
+        z = memoryview(elev)
+        closed_mv = memoryview(closed)
+        inf = dtype(numpy.inf)
+        while pqueue or pit:
+            if pit and (not pqueue or epsilon is False or
+                        z[pit[0]] <= (z[pqueue[0] & 0xFFFFFFFF] if lean else pqueue[0][0])):
+                cell = pit.popleft()
+            elif lean:
+                cell = heappop(pqueue) & 0xFFFFFFFF
+            else:
+                cell = heappop(pqueue)[1]
+            zc = z[cell]
+            spill = None
+            for offset in offsets:
+                neighbor = cell + offset
+                if closed_mv[neighbor]:
+                    continue
+                closed_mv[neighbor] = 1
+                if z[neighbor] <= zc:
+                    if spill is None:
+                        if not epsilon:
+                            spill = zc
+                        else:  # at least the next float, e.g., tiny epsilon in float32
+                            spill = numpy.nextafter(dtype(zc), inf)
+                            if epsilon is not True:
+                                spill = max(spill, dtype(zc + epsilon))
+                            spill = float(spill)
+                    z[neighbor] = spill
+                    pit.append(neighbor)
+                elif lean:
+                    key = bits[neighbor]
+                    key = 0xFFFFFFFF - key if key >= 0x80000000 else key + 0x80000000
+                    heappush(pqueue, (key << 32) | neighbor)
+                else:
+                    heappush(pqueue, (z[neighbor], neighbor))
+        filled = elev.reshape(nrows + 2, ncols + 2)[1:-1, 1:-1]
+        if nodata_value is not None:
+            filled[invalid[1:-1, 1:-1]] = nodata_value
+        return filled.copy()
+
+
 class Hillslopes(object):
     """Delineate hillslope for each subbasin, include header, left, and right hillslopes.
 
@@ -215,7 +1103,7 @@ class Hillslopes(object):
                 4 (Default) - Set stream cell to 0, <name>_zero.tif
         """
         print('Delineating hillslopes (header, left, and right hillslopes)...')
-        streamr = RasterUtilClass.read_raster(stream_raster)
+        streamr = RasterUtilClass.read_raster(stream_raster, lazy=True)
         stream_data = streamr.data
         stream_nodata = streamr.noDataValue
         geotrans = streamr.geotrans
@@ -224,7 +1112,7 @@ class Hillslopes(object):
         ncols = streamr.nCols
         datatype = streamr.dataType
 
-        flowd8r = RasterUtilClass.read_raster(flow_dir_raster)
+        flowd8r = RasterUtilClass.read_raster(flow_dir_raster, lazy=True)
         flowd8_data = flowd8r.data
         flowd8_nodata = flowd8r.noDataValue
         if flowd8r.nRows != nrows or flowd8r.nCols != ncols:
@@ -475,3 +1363,25 @@ class Hillslopes(object):
             output_hillslope(4)
         else:
             output_hillslope(stream_value_method)
+
+
+def _flow_direction_tile(dem, window=None, with_slope=False, **kwargs):
+    """Kernel of `D8Util.flow_direction_tiled`, which is a module-level function for pickling.
+
+    Args:
+        dem: 2D array of DEM tile with halo.
+        window: :obj:`pygeoc.raster.RasterWindow` of the tile.
+        with_slope: If True, return the slope as well.
+        **kwargs: other arguments of `D8Util.flow_direction`.
+
+    Returns:
+        Flow direction, the cells not resolved within the tile are `_UNRESOLVED`, and slope
+        if `with_slope`.
+    """
+    cut_edges = None
+    if window is not None:
+        cut_edges = (window.read_yoff > 0, window.read_yoff + window.read_ysize < window.n_rows,
+                     window.read_xoff > 0, window.read_xoff + window.read_xsize < window.n_cols)
+    flowdir, slope = D8Util.flow_direction(dem, cut_edges=cut_edges,
+                                           unresolved_value=_UNRESOLVED, **kwargs)
+    return (flowdir, slope) if with_slope else flowdir
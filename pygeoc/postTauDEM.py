@@ -144,7 +144,7 @@ class DinfUtil(object):
             stream: Stream raster to satisfy that river cell only flow into one downstream cell
             upddinffile: Updated Dinf flow direction raster file
         """
-        dinf_r = RasterUtilClass.read_raster(dinfflowang)
+        dinf_r = RasterUtilClass.read_raster(dinfflowang, lazy=True)
         data = dinf_r.data
         xsize = dinf_r.nCols
         ysize = dinf_r.nRows
@@ -153,11 +153,11 @@ class DinfUtil(object):
         use_subbsn = False
         use_stream = False
         if subbasin is not None:
-            subbsn_r = RasterUtilClass.read_raster(subbasin)
+            subbsn_r = RasterUtilClass.read_raster(subbasin, lazy=True)
             if xsize == subbsn_r.nCols and ysize == subbsn_r.nRows:
                 use_subbsn = True
         if stream is not None:
-            stream_r = RasterUtilClass.read_raster(stream)
+            stream_r = RasterUtilClass.read_raster(stream, lazy=True)
             if xsize == stream_r.nCols and ysize == stream_r.nRows:
                 use_stream = True
 
@@ -351,12 +351,12 @@ class StreamnetUtil(object):
             subbasin_file: subbasin raster file
             out_stream_file: output stream raster file
         """
-        stream_raster = RasterUtilClass.read_raster(stream_file)
+        stream_raster = RasterUtilClass.read_raster(stream_file, lazy=True)
         stream_data = stream_raster.data
         nrows = stream_raster.nRows
         ncols = stream_raster.nCols
         nodata = stream_raster.noDataValue
-        subbain_data = RasterUtilClass.read_raster(subbasin_file).data
+        subbain_data = RasterUtilClass.read_raster(subbasin_file, lazy=True).data
         nodata_array = ones((nrows, ncols)) * DEFAULT_NODATA
         newstream_data = where((stream_data > 0) & (stream_data != nodata),
                                subbain_data, nodata_array)
@@ -12,22 +12,57 @@
      - 17-06-25 lj - check by pylint and reformat by Google style.
      - 17-07-20 lj - add GDALDataType dict, and WhiteBox GAT D8 code.
      - 17-11-21 yw - add raster_binarization, raster_erosion, raster_dilation, openning, closing.
+     - 26-10-17 ag - add block-streaming reader and writer, i.e., iter_blocks, RasterBlockWriter.
+     - 26-10-17 ag - add lazy mode of Raster without copying data.
+     - 26-10-17 ag - vectorize get_mask_from_raster and support windowed reading.
+     - 26-10-17 ag - optimize mask_raster for grids with different extents.
+     - 26-10-17 ag - lookup-table based reclassification, and add reclassification by ranges.
+     - 26-10-17 ag - add GeoTiff creation options profiles, e.g., tiled and compressed.
+     - 26-10-17 ag - vectorize write_asc_file, and add read_asc_file.
+     - 26-10-17 ag - vectorize morphological operations with configurable structuring element.
+     - 26-10-17 ag - add streaming statistics (with histogram and percentiles) and its cache.
+     - 26-10-17 ag - split_raster by in-process gdal.Warp in parallel, or by bounding box.
+     - 26-10-17 ag - add vectorized sampling by coordinates, and sampling multiple rasters.
+     - 26-10-17 ag - add RasterCalculator for block-wise map algebra.
+     - 26-10-17 ag - add union-find based connected-component labeling, i.e., label_connected.
+     - 26-10-17 ag - add opt-in LRU cache of Raster objects read by read_raster.
+     - 26-10-17 ag - support GDAL /vsimem/ paths, and add MemoryWorkspace for intermediates.
+     - 26-10-17 ag - add Cloud Optimized GeoTiff output, build_overviews, and approx statistics.
+     - 26-10-17 ag - add align_to for resampling rasters onto the grid of a reference raster.
+     - 26-10-17 ag - add streaming zonal statistics, i.e., zonal_stats.
+     - 26-10-17 ag - add TileScheduler for parallel neighborhood operations on tiles with halo.
+     - 26-10-17 ag - add read_rasters and write_gtiff_files to overlap I/O of many files by threads.
 """
 from __future__ import absolute_import, unicode_literals
 
-from future.utils import iteritems
 from builtins import range
 
+import copy
+import errno
+import json
 import os
-import subprocess
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool, cpu_count
 from io import open
 
 import numpy
 from osgeo.gdal import GDT_CInt16, GDT_CInt32, GDT_CFloat32, GDT_CFloat64
 from osgeo.gdal import GDT_UInt32, GDT_Int32, GDT_Float32, GDT_Float64
 from osgeo.gdal import GDT_Unknown, GDT_Byte, GDT_UInt16, GDT_Int16
+from osgeo.gdal import GA_ReadOnly, GA_Update
 from osgeo.gdal import GetDriverByName as gdal_GetDriverByName
 from osgeo.gdal import Open as gdal_Open
+from osgeo.gdal import ReadDir as gdal_ReadDir
+from osgeo.gdal import Unlink as gdal_Unlink
+from osgeo.gdal import VSIStatL as gdal_VSIStatL
+from osgeo.gdal import Warp as gdal_Warp
 from osgeo.ogr import Open as ogr_Open
 from osgeo.osr import SpatialReference as osr_SpatialReference
 
@@ -79,6 +114,69 @@ GDALDataType = {0: GDT_Unknown,  # Unknown or unspecified type
     
 """
 
+GDALNumpyType = {GDT_Byte: numpy.uint8,
+                 GDT_UInt16: numpy.uint16,
+                 GDT_Int16: numpy.int16,
+                 GDT_UInt32: numpy.uint32,
+                 GDT_Int32: numpy.int32,
+                 GDT_Float32: numpy.float32,
+                 GDT_Float64: numpy.float64,
+                 GDT_CInt16: numpy.complex64,
+                 GDT_CInt32: numpy.complex64,
+                 GDT_CFloat32: numpy.complex64,
+                 GDT_CFloat64: numpy.complex128
+                 }
+"""dict: numpy datatype of GDAL DataType."""
+
+BLOCK_CELLS = 1048576
+"""Minimum cells count of a block assembled from GDAL natural blocks, i.e., 1024 * 1024."""
+LOOKUP_TABLE_SIZE = 1048576
+"""Maximum size of the dense lookup table for reclassifying integer raster."""
+
+GTIFF_PROFILES = {'default': [],
+                  'tiled': ['TILED=YES', 'BIGTIFF=IF_SAFER'],
+                  'deflate': ['TILED=YES', 'COMPRESS=DEFLATE', 'PREDICTOR',
+                              'BIGTIFF=IF_SAFER', 'NUM_THREADS=ALL_CPUS'],
+                  'lzw': ['TILED=YES', 'COMPRESS=LZW', 'PREDICTOR',
+                          'BIGTIFF=IF_SAFER', 'NUM_THREADS=ALL_CPUS'],
+                  'zstd': ['TILED=YES', 'COMPRESS=ZSTD', 'PREDICTOR',
+                           'BIGTIFF=IF_SAFER', 'NUM_THREADS=ALL_CPUS']
+                  }
+"""dict: Predefined creation options profiles of GeoTiff.
+
+    The `PREDICTOR` item will be replaced by `PREDICTOR=2` for integer datatype and
+    `PREDICTOR=3` for floating point datatype. Note that `ZSTD` requires GDAL>=2.3.
+
+    +-----------+------------------------------------------------------------+
+    | Profile   | Description                                                |
+    +===========+============================================================+
+    | default   | GDAL default, i.e., striped and uncompressed               |
+    +-----------+------------------------------------------------------------+
+    | tiled     | Tiled and uncompressed, BIGTIFF if safer                   |
+    +-----------+------------------------------------------------------------+
+    | deflate   | Tiled, DEFLATE compression with predictor, multi-threaded  |
+    +-----------+------------------------------------------------------------+
+    | lzw       | Tiled, LZW compression with predictor, multi-threaded      |
+    +-----------+------------------------------------------------------------+
+    | zstd      | Tiled, ZSTD compression with predictor, multi-threaded     |
+    +-----------+------------------------------------------------------------+
+
+"""
+_GTIFF_PROFILE = 'default'  # current default profile, see `set_default_gtiff_profile`
+
+OVERVIEW_MIN_SIZE = 256
+"""Minimum rows or cols of the coarsest overview built by `RasterUtilClass.build_overviews`."""
+
+_RASTER_CACHE = None  # current RasterCache, see `RasterUtilClass.enable_raster_cache`
+
+_NON_INTEGER_TOKEN = re.compile(r'[^0-9+\-\s]')  # e.g., '.', 'e' and 'nan' in ASCII grid
+
+_TILE_CONTEXT = dict()  # kernel and datasets of the current process, see `TileScheduler`
+
+STATS_CACHE_ENV = 'PYGEOC_STATS_CACHE'
+"""Environment variable of the path of the default statistics cache file, see `RasterStatsCache`.
+"""
+
 
 class Raster(object):
     """Basic Raster Class.
@@ -108,6 +206,10 @@ class Raster(object):
         validZone (:obj:`numpy.array`): 2D boolean array that NoDataValue is False.
         validValues (:obj:`numpy.array`): 2D raster array with None in NoDataValue.
 
+    Note:
+        In the lazy mode (`lazy=True`), `data` is adopted without copy, and `validZone`
+        and `validValues` are computed on first access and then cached.
+
     Examples:
         The common usage is read raster data from a raster file (e.g., geotiff) and get the
         Raster instance.
@@ -123,11 +225,13 @@ class Raster(object):
     """
 
     def __init__(self, n_rows, n_cols, data, nodata_value=None, geotransform=None,
-                 srs=None, datatype=GDT_Float32):
+                 srs=None, datatype=GDT_Float32, lazy=False):
         """Constructor."""
         self.nRows = n_rows
         self.nCols = n_cols
-        self.data = numpy.copy(data)
+        self._data = data if lazy else numpy.copy(data)
+        self._validZone = None
+        self._validValues = None
         self.noDataValue = nodata_value
         self.geotrans = geotransform
         self.srs = srs
@@ -138,8 +242,48 @@ class Raster(object):
         self.xMax = geotransform[0] + n_cols * geotransform[1]
         self.yMax = geotransform[3]
         self.yMin = geotransform[3] + n_rows * geotransform[5]
-        self.validZone = self.data != self.noDataValue
-        self.validValues = numpy.where(self.validZone, self.data, numpy.nan)
+        if not lazy:
+            self._compute_valid()
+
+    def _compute_valid(self):
+        """Compute `validZone` and `validValues` eagerly if they are not computed yet."""
+        if self._validZone is None:
+            self._validZone = self._data != self.noDataValue
+        if self._validValues is None:
+            self._validValues = numpy.where(self._validZone, self._data, numpy.nan)
+
+    @property
+    def data(self):
+        """2D array raster data."""
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._validZone = None
+        self._validValues = None
+
+    @property
+    def validZone(self):
+        """2D boolean array that NoDataValue is False."""
+        if self._validZone is None:
+            self._validZone = self._data != self.noDataValue
+        return self._validZone
+
+    @validZone.setter
+    def validZone(self, value):
+        self._validZone = value
+
+    @property
+    def validValues(self):
+        """2D raster array with numpy.nan in NoDataValue."""
+        if self._validValues is None:
+            self._validValues = numpy.where(self.validZone, self._data, numpy.nan)
+        return self._validValues
+
+    @validValues.setter
+    def validValues(self, value):
+        self._validValues = value
 
     def get_type(self):
         """get datatype as GDALDataType.
@@ -215,6 +359,76 @@ class Raster(object):
             else:
                 return value
 
+    def get_row_col_by_xy(self, xs, ys):
+        """Get (row, col) indexes of xy coordinates in a vectorized way.
+
+        Args:
+            xs: X coordinates, scalar or array.
+            ys: Y coordinates, scalar or array with the same shape of `xs`.
+
+        Returns:
+            rows, cols: int arrays, -1 for coordinates outside the raster.
+        """
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        ys = numpy.asarray(ys, dtype=numpy.float64)
+        cols = numpy.floor((xs - self.xMin) / self.geotrans[1])
+        rows = numpy.floor((ys - self.yMax) / self.geotrans[5])
+        outside = (xs < self.xMin) | (xs > self.xMax) | (ys < self.yMin) | (ys > self.yMax) | \
+                  numpy.isnan(cols) | numpy.isnan(rows)
+        # coordinates on the right or bottom boundary belong to the last col or row
+        cols = numpy.where(outside, -1, numpy.minimum(cols, self.nCols - 1)).astype(numpy.int64)
+        rows = numpy.where(outside, -1, numpy.minimum(rows, self.nRows - 1)).astype(numpy.int64)
+        return rows, cols
+
+    def sample_rowcol(self, rows, cols, masked=False):
+        """Get raster values by arrays of (row, col) in a vectorized way.
+
+        Examples:
+            >>> rst = Raster(2, 2, numpy.array([[1., -9999.], [3., 4.]]), -9999.,
+            ...              [0., 1., 0., 2., 0., -1.])
+            >>> rst.sample_rowcol([0, 0, 1, 2], [0, 1, 1, 0]).tolist()
+            [1.0, nan, 4.0, nan]
+            >>> rst.sample_xy([0.5, 1.5, 9.], [0.5, 0.5, 0.5], masked=True).tolist()
+            [3.0, 4.0, None]
+
+        Args:
+            rows: row numbers, scalar or array. Float numbers will be rounded.
+            cols: col numbers, scalar or array with the same shape of `rows`.
+            masked: return masked array (:obj:`numpy.ma.MaskedArray`) which keeps
+                    the datatype of raster if True, otherwise (default) return float
+                    array filled with NaN for nodata or invalid (row, col).
+
+        Returns:
+            Array with the same shape of `rows`.
+        """
+        rows = numpy.round(numpy.asarray(rows)).astype(numpy.int64)
+        cols = numpy.round(numpy.asarray(cols)).astype(numpy.int64)
+        invalid = (rows < 0) | (rows >= self.nRows) | (cols < 0) | (cols >= self.nCols)
+        values = self.data[numpy.where(invalid, 0, rows), numpy.where(invalid, 0, cols)]
+        if self.noDataValue is not None:
+            invalid |= values == self.noDataValue
+        if values.dtype.kind == 'f':
+            invalid |= numpy.isnan(values)
+        if masked:
+            return numpy.ma.masked_array(values, mask=invalid)
+        values = values.astype(numpy.float64)
+        values[invalid] = numpy.nan
+        return values
+
+    def sample_xy(self, xs, ys, masked=False):
+        """Get raster values by arrays of xy coordinates in a vectorized way.
+
+        Args:
+            xs: X coordinates, scalar or array.
+            ys: Y coordinates, scalar or array with the same shape of `xs`.
+            masked: see `sample_rowcol`.
+
+        Returns:
+            Array with the same shape of `xs`.
+        """
+        rows, cols = self.get_row_col_by_xy(xs, ys)
+        return self.sample_rowcol(rows, cols, masked)
+
     def get_central_coors(self, row, col):
         """Get the coordinates of central grid.
 
@@ -246,310 +460,2289 @@ class Raster(object):
         return True if self.get_value_by_row_col(row, col) is None else False
 
 
-class RasterUtilClass(object):
-    """Utility function to handle raster data.
+class RasterWindow(object):
+    """Rectangular window of a raster block, optionally surrounded by a halo.
 
-    See Also:
-        :class:`pygeoc.raster.raster.Raster`.
+    Args:
+        xoff: col offset of the block.
+        yoff: row offset of the block.
+        xsize: col count of the block.
+        ysize: row count of the block.
+        halo: halo width (cells) read around the block, clipped by the raster extent.
+        n_rows: row count of the raster, used to clip the halo.
+        n_cols: col count of the raster, used to clip the halo.
+
+    Attributes:
+        xoff (int): col offset of the block (core region).
+        yoff (int): row offset of the block.
+        xsize (int): col count of the block.
+        ysize (int): row count of the block.
+        read_xoff (int): col offset of the region to be read, i.e., block with halo.
+        read_yoff (int): row offset of the region to be read.
+        read_xsize (int): col count of the region to be read.
+        read_ysize (int): row count of the region to be read.
+        n_rows (int): row count of the raster.
+        n_cols (int): col count of the raster.
     """
 
-    def __init__(self):
-        """Empty."""
-        pass
+    def __init__(self, xoff, yoff, xsize, ysize, halo=0, n_rows=None, n_cols=None):
+        """Constructor."""
+        self.xoff = xoff
+        self.yoff = yoff
+        self.xsize = xsize
+        self.ysize = ysize
+        if n_rows is None:
+            n_rows = yoff + ysize + halo
+        if n_cols is None:
+            n_cols = xoff + xsize + halo
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.read_xoff = max(0, xoff - halo)
+        self.read_yoff = max(0, yoff - halo)
+        self.read_xsize = min(n_cols, xoff + xsize + halo) - self.read_xoff
+        self.read_ysize = min(n_rows, yoff + ysize + halo) - self.read_yoff
+
+    def __repr__(self):
+        return 'RasterWindow(xoff=%d, yoff=%d, xsize=%d, ysize=%d)' % (self.xoff, self.yoff,
+                                                                      self.xsize, self.ysize)
+
+    def core_slice(self):
+        """Slices of the block (core region) within the array read with halo.
 
-    @staticmethod
-    def read_raster(raster_file):
-        """Read raster by GDAL.
+        Returns:
+            (row slice, col slice)
+        """
+        row_beg = self.yoff - self.read_yoff
+        col_beg = self.xoff - self.read_xoff
+        return (slice(row_beg, row_beg + self.ysize),
+                slice(col_beg, col_beg + self.xsize))
 
-        Args:
-            raster_file: raster file path.
+    def core(self, data):
+        """Get the block (core region) from the array read with halo."""
+        if data.shape == (self.ysize, self.xsize):
+            return data
+        return data[self.core_slice()]
 
-        Returns:
-            Raster object.
+
+class RasterBlockWriter(object):
+    """Write a GeoTiff file block by block, the counterpart of `RasterUtilClass.iter_blocks`.
+
+    Args:
+        f_name: output gtiff file name.
+        n_rows: Row count.
+        n_cols: Col count.
+        geotransform: geographic transformation.
+        srs: coordinate system.
+        nodata_value: nodata value.
+        gdal_type (:obj:`pygeoc.raster.GDALDataType`): output raster data type,
+                                                      GDT_Float32 as default.
+        options: profile name in `GTIFF_PROFILES` or list of GeoTiff creation options,
+                 None as default to use the default profile.
+
+    Examples:
+        >>> with RasterBlockWriter(out_file, rst.nRows, rst.nCols, rst.geotrans,
+        ...                        rst.srs, rst.noDataValue) as writer:  # doctest: +SKIP
+        ...     for win, blk in RasterUtilClass.iter_blocks(in_file, halo=1):
+        ...         writer.write(win, blk * 2.)
+    """
+
+    def __init__(self, f_name, n_rows, n_cols, geotransform, srs, nodata_value,
+                 gdal_type=GDT_Float32, options=None):
+        """Constructor, create the output dataset."""
+        self.f_name = f_name
+        self.nRows = n_rows
+        self.nCols = n_cols
+        self.noDataValue = nodata_value
+        self.ds = RasterUtilClass.create_gtiff(f_name, n_rows, n_cols, geotransform, srs,
+                                               nodata_value, gdal_type, options)
+        if self.ds is None:
+            raise IOError('Cannot create output file %s' % f_name)
+        self.band = self.ds.GetRasterBand(1)
+
+    def write(self, window, data):
+        """Write the block data of the given window, the halo (if existed) will be stripped.
+
+        Args:
+            window (:obj:`pygeoc.raster.RasterWindow`): block window.
+            data: 2D array of the block, with or without halo.
         """
-        ds = gdal_Open(raster_file)
-        band = ds.GetRasterBand(1)
-        data = band.ReadAsArray()
-        xsize = band.XSize
-        ysize = band.YSize
+        data = RasterUtilClass.replace_nan(window.core(data), self.noDataValue)
+        self.band.WriteArray(data, window.xoff, window.yoff)
 
-        nodata_value = band.GetNoDataValue()
-        geotrans = ds.GetGeoTransform()
-        dttype = band.DataType
+    def close(self):
+        """Flush data to disk and close the dataset."""
+        if self.ds is not None:
+            self.ds.FlushCache()
+        self.band = None
+        self.ds = None
 
-        srs = ds.GetSpatialRef()
-        if srs is None:
-            wkt = ds.GetProjection()
-            srs = osr_SpatialReference()
-            if wkt:
-                # print(wkt)
-                srs.ImportFromWkt(wkt)  # srs may still be empty if file has no SRS
-                # print(srs.ExportToProj4())
+    def __enter__(self):
+        return self
 
-        if nodata_value is None:
-            nodata_value = DEFAULT_NODATA
-        band = None
-        ds = None
-        return Raster(ysize, xsize, data, nodata_value, geotrans, srs, dttype)
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
-    @staticmethod
-    def get_mask_from_raster(rasterfile, outmaskfile, keep_nodata=False):
-        """Generate mask data from a given raster data.
+
+class MemoryWorkspace(object):
+    """Workspace of intermediate rasters in memory, i.e., GDAL `/vsimem/` or a RAM disk.
+
+    Rasters written by PyGeoC (e.g., `RasterUtilClass.write_gtiff_file`) can be read by
+    PyGeoC and GDAL directly from the paths of this workspace, while external programs
+    (e.g., TauDEM) cannot read `/vsimem/`, in which case use a RAM disk (e.g., `/dev/shm`)
+    instead. The rasters which are required as outputs should be persisted to disk.
+
+    Args:
+        root: None as default to use a unique directory in GDAL `/vsimem/`, or a directory
+              on RAM disk in which a unique sub-directory will be created.
+
+    Examples:
+        >>> with MemoryWorkspace() as ws:  # doctest: +SKIP
+        ...     tmp = ws.get_path('subbasin.tif')
+        ...     RasterUtilClass.raster_reclassify('subbasinTau.tif', id_map, tmp)
+        ...     StreamnetUtil.assign_stream_id_raster('stream.tif', tmp, 'streamM.tif')
+        ...     ws.persist(tmp, 'subbasinM.tif')
+    """
+
+    def __init__(self, root=None):
+        """Constructor."""
+        name = 'pygeoc_%d_%s' % (os.getpid(), uuid.uuid4().hex[:8])
+        self.in_vsimem = root is None
+        if self.in_vsimem:
+            self.root = '/vsimem/%s' % name
+        else:
+            self.root = os.path.join(os.path.abspath(root), name)
+            UtilClass.mkdir(self.root)
+
+    def get_path(self, name):
+        """Get the path of the file name in workspace."""
+        if self.in_vsimem:
+            return '%s/%s' % (self.root, os.path.basename(name))
+        return os.path.join(self.root, os.path.basename(name))
+
+    def exists(self, name):
+        """Check the existence of the file in workspace."""
+        path = name if name.startswith(self.root) else self.get_path(name)
+        if self.in_vsimem:
+            return gdal_VSIStatL(path) is not None
+        return os.path.isfile(path)
+
+    def persist(self, name, dst_file, options=None):
+        """Copy raster in workspace to disk as GeoTiff.
 
         Args:
-            rasterfile: raster file path.
-            outmaskfile: output mask file path.
+            name: file name or path in workspace.
+            dst_file: output raster file.
+            options: profile name in `GTIFF_PROFILES` or list of GeoTiff creation options,
+                     None as default to use the default profile.
 
         Returns:
-            Raster object of mask data.
+            Output raster file.
         """
-        raster_r = RasterUtilClass.read_raster(rasterfile)
-        xsize = raster_r.nCols
-        ysize = raster_r.nRows
-        nodata_value = raster_r.noDataValue
-        srs = raster_r.srs
-        x_min = raster_r.xMin
-        y_max = raster_r.yMax
-        dx = raster_r.dx
-        data = raster_r.data
+        path = name if name.startswith(self.root) else self.get_path(name)
+        src_ds = gdal_Open(path)
+        if src_ds is None:
+            raise IOError('Cannot open %s in memory workspace!' % path)
+        UtilClass.mkdir(os.path.dirname(os.path.abspath(dst_file)))
+        RasterUtilClass.invalidate_raster_cache(dst_file)
+        options = RasterUtilClass.get_creation_options(options,
+                                                       src_ds.GetRasterBand(1).DataType)
+        dst_ds = gdal_GetDriverByName(str('GTiff')).CreateCopy(dst_file, src_ds,
+                                                               options=options)
+        if dst_ds is None:
+            raise IOError('Cannot create output file %s' % dst_file)
+        dst_ds = None
+        src_ds = None
+        return dst_file
+
+    def remove(self, name):
+        """Remove the file in workspace."""
+        path = name if name.startswith(self.root) else self.get_path(name)
+        if self.in_vsimem:
+            gdal_Unlink(path)
+        elif os.path.isfile(path):
+            os.remove(path)
+
+    def cleanup(self):
+        """Remove all files in workspace, which will be released from memory."""
+        if self.in_vsimem:
+            for name in gdal_ReadDir(self.root) or []:
+                gdal_Unlink('%s/%s' % (self.root, name))
+        elif os.path.isdir(self.root):
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.cleanup()
+
+
+class RasterCache(object):
+    """Least recently used (LRU) cache of Raster objects keyed by file path.
+
+    The cached entry is valid only if the size and modified time of the file are unchanged.
+    The arrays of cached Raster objects are read-only, and a shallow copy of the cached
+    Raster object is returned by `get`, thus assigning a new `data` is allowed, while
+    modifying the array in-place raises ValueError.
 
-        if not keep_nodata:
-            i_min = ysize - 1
-            i_max = 0
-            j_min = xsize - 1
-            j_max = 0
-            for i in range(ysize):
-                for j in range(xsize):
-                    if abs(data[i][j] - nodata_value) > DELTA:
-                        i_min = min(i, i_min)
-                        i_max = max(i, i_max)
-                        j_min = min(j, j_min)
-                        j_max = max(j, j_max)
+    Args:
+        max_bytes: memory budget of arrays in bytes, 1 GB as default.
 
-            # print(i_min, i_max, j_min, j_max)
-            y_size_mask = i_max - i_min + 1
-            x_size_mask = j_max - j_min + 1
-            x_min_mask = x_min + j_min * dx
-            y_max_mask = y_max - i_min * dx
-        else:
-            y_size_mask = ysize
-            x_size_mask = xsize
-            x_min_mask = x_min
-            y_max_mask = y_max
-            i_min = 0
-            j_min = 0
-        print('%dx%d -> %dx%d' % (xsize, ysize, x_size_mask, y_size_mask))
+    Examples:
+        >>> cache = RasterUtilClass.enable_raster_cache(2 * 1024 ** 3)  # doctest: +SKIP
+        >>> rst = RasterUtilClass.read_raster('dem.tif')  # read from file  # doctest: +SKIP
+        >>> rst = RasterUtilClass.read_raster('dem.tif')  # from cache  # doctest: +SKIP
+        >>> cache.info()  # doctest: +SKIP
+        {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1, 'bytes': ..., 'max_bytes': ...}
+    """
 
-        mask = numpy.zeros((y_size_mask, x_size_mask))
+    def __init__(self, max_bytes=1073741824):
+        """Constructor, empty cache."""
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()  # path: (stamp, Raster, nbytes)
+        self._lock = threading.RLock()
 
-        for i in range(y_size_mask):
-            for j in range(x_size_mask):
-                if abs(data[i + i_min][j + j_min] - nodata_value) > DELTA:
-                    mask[i][j] = 1
-                else:
-                    mask[i][j] = DEFAULT_NODATA
+    @staticmethod
+    def get_stamp(raster_file):
+        """Get (path, (size, mtime)) of the raster file, stamp is None if not a regular file."""
+        path = os.path.abspath(raster_file)
+        if not os.path.isfile(path):
+            return path, None
+        stat = os.stat(path)
+        return path, (stat.st_size, stat.st_mtime)
 
-        mask_geotrans = [x_min_mask, dx, 0, y_max_mask, 0, -dx]
-        RasterUtilClass.write_gtiff_file(outmaskfile, y_size_mask, x_size_mask, mask,
-                                         mask_geotrans, srs, DEFAULT_NODATA, GDT_Int32)
-        return Raster(y_size_mask, x_size_mask, mask, DEFAULT_NODATA, mask_geotrans, srs)
+    @staticmethod
+    def get_nbytes(rst):
+        """Get the total bytes of arrays of Raster object."""
+        return sum(a.nbytes for a in [rst.data, rst._validZone, rst._validValues]
+                   if a is not None)
 
     @staticmethod
-    def raster_reclassify(srcfile, v_dict, dstfile, gdaltype=GDT_Float32):
-        """Reclassify raster by given classifier dict.
+    def _set_readonly(rst):
+        for a in [rst.data, rst._validZone, rst._validValues]:
+            if a is not None:
+                a.flags.writeable = False
+
+    def get(self, raster_file, lazy=True):
+        """Get the cached Raster object.
 
         Args:
-            srcfile: source raster file.
-            v_dict: classifier dict.
-            dstfile: destination file path.
-            gdaltype (:obj:`pygeoc.raster.GDALDataType`): GDT_Float32 as default.
+            raster_file: raster file path.
+            lazy: If False, the `validZone` and `validValues` will be computed and cached.
+
+        Returns:
+            A shallow copy of cached Raster object, None if not cached or out of date.
         """
-        src_r = RasterUtilClass.read_raster(srcfile)
-        src_data = src_r.data
-        dst_data = numpy.copy(src_data)
-        if gdaltype == GDT_Float32 and src_r.dataType != GDT_Float32:
-            gdaltype = src_r.dataType
-        no_data = src_r.noDataValue
-        new_no_data = DEFAULT_NODATA
-        if gdaltype in [GDT_Unknown, GDT_Byte, GDT_UInt16, GDT_UInt32]:
-            new_no_data = 0
-        if not MathClass.floatequal(new_no_data, src_r.noDataValue):
-            if src_r.noDataValue not in v_dict:
-                v_dict[src_r.noDataValue] = new_no_data
-                no_data = new_no_data
+        path, stamp = RasterCache.get_stamp(raster_file)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or stamp is None or entry[0] != stamp:
+                if entry is not None:
+                    self._remove(path)
+                self.misses += 1
+                return None
+            self.hits += 1
+            rst = entry[1]
+            self._entries.pop(path)
+            if not lazy and rst._validValues is None:
+                rst._compute_valid()
+                RasterCache._set_readonly(rst)
+                nbytes = RasterCache.get_nbytes(rst)
+                self.nbytes += nbytes - entry[2]
+                entry = (entry[0], rst, nbytes)
+            self._entries[path] = entry
+            self._evict()
+            return copy.copy(rst)
+
+    def put(self, raster_file, rst):
+        """Cache the Raster object read from the raster file.
 
-        for (k, v) in iteritems(v_dict):
-            dst_data[src_data == k] = v
-        RasterUtilClass.write_gtiff_file(dstfile, src_r.nRows, src_r.nCols, dst_data,
-                                         src_r.geotrans, src_r.srs, no_data, gdaltype)
+        Returns:
+            A shallow copy of the cached Raster object, or `rst` itself if it is not cached
+            (e.g., larger than the memory budget).
+        """
+        path, stamp = RasterCache.get_stamp(raster_file)
+        nbytes = RasterCache.get_nbytes(rst)
+        if stamp is None or nbytes > self.max_bytes:
+            return rst
+        RasterCache._set_readonly(rst)
+        with self._lock:
+            if path in self._entries:
+                self._remove(path)
+            self._entries[path] = (stamp, rst, nbytes)
+            self.nbytes += nbytes
+            self._evict()
+        return copy.copy(rst)
+
+    def _remove(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._entries:
+            path = next(iter(self._entries))
+            self._remove(path)
+            self.evictions += 1
+
+    def invalidate(self, raster_file=None):
+        """Remove the cached entry of the raster file, or all entries if `raster_file` is None."""
+        with self._lock:
+            if raster_file is None:
+                self._entries.clear()
+                self.nbytes = 0
+            else:
+                self._remove(os.path.abspath(raster_file))
 
-    @staticmethod
-    def write_gtiff_file(f_name, n_rows, n_cols, data, geotransform, srs, nodata_value,
-                         gdal_type=GDT_Float32):
-        """Output Raster to GeoTiff format file.
+    def info(self):
+        """Counters of the cache."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self.nbytes,
+                    'max_bytes': self.max_bytes}
 
-        Args:
-            f_name: output gtiff file name.
-            n_rows: Row count.
-            n_cols: Col count.
-            data: 2D array data.
-            geotransform: geographic transformation.
-            srs: coordinate system.
-            nodata_value: nodata value.
-            gdal_type (:obj:`pygeoc.raster.GDALDataType`): output raster data type,
-                                                                  GDT_Float32 as default.
-        """
-        UtilClass.mkdir(os.path.dirname(FileClass.get_file_fullpath(f_name)))
-        driver = gdal_GetDriverByName(str('GTiff'))
-        try:
-            ds = driver.Create(f_name, n_cols, n_rows, 1, gdal_type)
-        except Exception:
-            print('Cannot create output file %s' % f_name)
-            return
-        ds.SetGeoTransform(geotransform)
-        try:
-            ds.SetProjection(srs.ExportToWkt())
-        except AttributeError or Exception:
-            ds.SetProjection(srs)
-        ds.GetRasterBand(1).SetNoDataValue(nodata_value)
-        # if data contains numpy.nan, then replaced by nodata_value
-        if isinstance(data, numpy.ndarray) and data.dtype in [numpy.dtype('int'),
-                                                              numpy.dtype('float')]:
-            data = numpy.where(numpy.isnan(data), nodata_value, data)
-        ds.GetRasterBand(1).WriteArray(data)
-        ds = None
 
-    @staticmethod
-    def write_asc_file(filename, data, xsize, ysize, geotransform, nodata_value):
-        """Output Raster to ASCII file.
+class RasterStatistics(object):
+    """Block-wise accumulator of statistics, i.e., count, min, max, mean, std, and sum.
+
+    The mean and variance are updated by Welford's algorithm with the parallel merging
+    of Chan et al., thus blocks (or accumulators of other rasters) can be added in any order.
+    If the value range is given, a fixed-bins histogram is accumulated as well, and
+    percentiles are interpolated from the histogram.
+
+    Args:
+        bins: number of histogram bins, None as default to skip histogram.
+        value_range: (min, max) of the histogram, the values out of range are ignored.
+
+    Examples:
+        >>> acc = RasterStatistics(bins=4, value_range=(0, 8))
+        >>> acc.update(numpy.array([1., 2., 3.]))
+        >>> acc.update(numpy.array([[4., 5.], [6., 7.]]))
+        >>> acc.count, acc.min, acc.max, acc.mean
+        (7, 1.0, 7.0, 4.0)
+        >>> round(acc.std, 6)
+        2.0
+        >>> acc.histogram.tolist()
+        [1, 2, 2, 2]
+        >>> acc.percentiles([50])  # the precision is the bin width, i.e., 2
+        [4.5]
+    """
+
+    def __init__(self, bins=None, value_range=None):
+        """Constructor, empty accumulator."""
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.
+        self.m2 = 0.  # sum of squares of differences from the mean
+        self.bins = bins
+        self.value_range = value_range
+        self.histogram = None
+        if bins is not None:
+            if value_range is None:
+                raise ValueError('The value range is required for histogram!')
+            self.histogram = numpy.zeros(bins, dtype=numpy.int64)
+
+    def update(self, values):
+        """Accumulate valid values, e.g., the valid values of a block.
 
         Args:
-            filename: output ASCII filename.
-            data: 2D array data.
-            xsize: Col count.
-            ysize: Row count.
-            geotransform: geographic transformation.
-            nodata_value: nodata_flow value.
+            values: array of valid values, i.e., without nodata and NaN.
         """
-        UtilClass.mkdir(os.path.dirname(FileClass.get_file_fullpath(filename)))
-        header = 'NCOLS %d\n' \
-                 'NROWS %d\n' \
-                 'XLLCENTER %f\n' \
-                 'YLLCENTER %f\n' \
-                 'CELLSIZE %f\n' \
-                 'NODATA_VALUE %f\n' % (xsize, ysize, geotransform[0] + 0.5 * geotransform[1],
-                                        geotransform[3] - (ysize - 0.5) * geotransform[1],
-                                        geotransform[1], nodata_value)
+        values = numpy.asarray(values, dtype=numpy.float64).ravel()
+        n = values.size
+        if n == 0:
+            return
+        mean = values.mean()
+        m2 = numpy.square(values - mean).sum()
+        self._merge(n, float(values.min()), float(values.max()), float(mean), float(m2))
+        self.update_histogram(values)
 
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(header)
-            for i in range(0, ysize):
-                for j in range(0, xsize):
-                    f.write('%s\t' % repr(data[i][j]))
-                f.write('\n')
-        f.close()
+    def set_histogram(self, bins, value_range):
+        """Reset the histogram with the given bins and value range, e.g., of the former pass."""
+        self.bins = bins
+        self.value_range = tuple(value_range)
+        self.histogram = numpy.zeros(bins, dtype=numpy.int64)
 
-    @staticmethod
-    def raster_to_gtiff(tif, geotif, change_nodata=False, change_gdal_type=False):
-        """Converting Raster format to GeoTIFF.
+    def update_histogram(self, values):
+        """Accumulate the histogram only.
 
         Args:
-            tif: source raster file path.
-            geotif: output raster file path.
-            change_nodata: change NoDataValue to -9999 or not.
-            gdal_type (:obj:`pygeoc.raster.GDALDataType`): GDT_Float32 as default.
-            change_gdal_type: If True, output the Float32 data type.
+            values: array of valid values.
         """
-        rst_file = RasterUtilClass.read_raster(tif)
-        nodata = rst_file.noDataValue
-        if change_nodata:
-            if not MathClass.floatequal(rst_file.noDataValue, DEFAULT_NODATA):
-                nodata = DEFAULT_NODATA
-                nodata_array = numpy.ones((rst_file.nRows, rst_file.nCols)) * rst_file.noDataValue
-                nodata_check = numpy.isclose(rst_file.data, nodata_array)
-                rst_file.data[nodata_check] = DEFAULT_NODATA
-                # rst_file.data[rst_file.data == rst_file.noDataValue] = DEFAULT_NODATA
-        gdal_type = rst_file.dataType
-        if change_gdal_type:
-            gdal_type = GDT_Float32
-        RasterUtilClass.write_gtiff_file(geotif, rst_file.nRows, rst_file.nCols, rst_file.data,
-                                         rst_file.geotrans, rst_file.srs, nodata,
-                                         gdal_type)
+        if self.histogram is not None:
+            self.histogram += numpy.histogram(values, self.bins, self.value_range)[0]
 
-    @staticmethod
-    def raster_to_asc(raster_f, asc_f):
-        """Converting Raster format to ASCII raster.
+    def merge(self, other):
+        """Merge another accumulator, e.g., of another raster or computed in another process.
 
         Args:
-            raster_f: raster file.
-            asc_f: output ASCII file.
+            other (:obj:`pygeoc.raster.RasterStatistics`): the other accumulator.
         """
-        raster_r = RasterUtilClass.read_raster(raster_f)
-        RasterUtilClass.write_asc_file(asc_f, raster_r.data, raster_r.nCols, raster_r.nRows,
-                                       raster_r.geotrans, raster_r.noDataValue)
+        if other.count == 0:
+            return
+        self._merge(other.count, other.min, other.max, other.mean, other.m2)
+        if self.histogram is not None:
+            if other.histogram is None or other.bins != self.bins or \
+                    tuple(other.value_range) != tuple(self.value_range):
+                raise ValueError('Histograms with different bins cannot be merged!')
+            self.histogram += other.histogram
+
+    def _merge(self, n, minv, maxv, mean, m2):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = minv if self.min is None else min(self.min, minv)
+        self.max = maxv if self.max is None else max(self.max, maxv)
+
+    @property
+    def std(self):
+        """Population standard deviation, the same as `ComputeStatistics` of GDAL."""
+        if self.count == 0:
+            return None
+        return (self.m2 / self.count) ** 0.5
 
-    @staticmethod
-    def raster_statistics(raster_file):
-        """Get basic statistics of raster data.
+    @property
+    def sum(self):
+        """Sum of values."""
+        return self.mean * self.count
+
+    def percentiles(self, qs):
+        """Percentiles interpolated linearly within the histogram bins.
+
+        The precision is the width of bins, i.e., (max - min) / bins.
 
         Args:
-            raster_file: raster file path.
+            qs: sequence of percentiles in [0, 100].
 
         Returns:
-            min, max, mean, std.
+            list of values, None if the histogram is unavailable or empty.
         """
-        ds = gdal_Open(raster_file)
-        band = ds.GetRasterBand(1)
-        minv, maxv, meanv, std = band.ComputeStatistics(False)
-        return minv, maxv, meanv, std
-
-    @staticmethod
-    def split_raster(rs, split_shp, field_name, temp_dir):
-        """Split raster by given shapefile and field name.
+        if self.histogram is None or self.histogram.sum() == 0:
+            return None
+        edges = numpy.linspace(self.value_range[0], self.value_range[1], self.bins + 1)
+        cumsum = numpy.cumsum(self.histogram)
+        ranks = numpy.asarray(qs, dtype=numpy.float64) / 100. * cumsum[-1]
+        idx = numpy.minimum(numpy.searchsorted(cumsum, ranks, side='left'), self.bins - 1)
+        # skip the empty bins for rank 0
+        idx = numpy.maximum(idx, numpy.argmax(self.histogram > 0))
+        prev = numpy.where(idx > 0, cumsum[idx - 1], 0)
+        frac = (ranks - prev) / numpy.maximum(self.histogram[idx], 1)
+        values = edges[idx] + numpy.clip(frac, 0., 1.) * (edges[idx + 1] - edges[idx])
+        return numpy.clip(values, self.min, self.max).tolist()
+
+    def to_dict(self, percentiles=None):
+        """Summary of the statistics.
 
         Args:
-            rs: origin raster file.
-            split_shp: boundary (ESRI Shapefile) used to spilt raster.
-            field_name: field name identify the spilt value.
-            temp_dir: directory to store the spilt rasters.
+            percentiles: sequence of percentiles in [0, 100], None as default.
+
+        Returns:
+            dict with keys of count, min, max, mean, std, sum, and optional
+            histogram (with bin_edges) and percentiles (values in the same order).
         """
-        UtilClass.rmmkdir(temp_dir)
-        ds = ogr_Open(split_shp)
-        lyr = ds.GetLayer(0)
-        lyr.ResetReading()
-        ft = lyr.GetNextFeature()
-        while ft:
-            cur_field_name = ft.GetFieldAsString(field_name)
-            for r in rs:
-                cur_file_name = r.split(os.sep)[-1]
-                outraster = temp_dir + os.sep + \
-                            cur_file_name.replace('.tif', '_%s.tif' %
-                                                  cur_field_name.replace(' ', '_'))
-                subprocess.call(['gdalwarp', r, outraster, '-cutline', split_shp,
-                                 '-crop_to_cutline', '-cwhere',
-                                 "'%s'='%s'" % (field_name, cur_field_name), '-dstnodata',
-                                 '-9999'])
-            ft = lyr.GetNextFeature()
-        ds = None
+        stats = {'count': self.count, 'min': self.min, 'max': self.max,
+                 'mean': self.mean if self.count else None, 'std': self.std,
+                 'sum': self.sum}
+        if self.histogram is not None:
+            stats['histogram'] = self.histogram.tolist()
+            stats['bin_edges'] = numpy.linspace(self.value_range[0], self.value_range[1],
+                                                self.bins + 1).tolist()
+        if percentiles:
+            stats['percentiles'] = self.percentiles(percentiles) or [None] * len(percentiles)
+        return stats
+
+
+class RasterStatsCache(object):
+    """Persistent cache of raster statistics stored in a JSON file.
+
+    The entries are keyed by the absolute paths of rasters together with the computation
+    arguments, and are valid only if the size and modified time of each raster are unchanged.
+    The entries of removed rasters are pruned, and the least recently written entries are
+    dropped once there are more than `max_entries`. The cache file is updated under a lock
+    file and replaced atomically, so it can be shared by concurrent processes.
 
-    @staticmethod
-    def get_negative_dem(raw_dem, neg_dem):
-        """Get negative DEM data."""
-        origin = RasterUtilClass.read_raster(raw_dem)
-        max_v = numpy.max(origin.data)
-        temp = origin.data < 0
-        neg = numpy.where(temp, origin.noDataValue, max_v - origin.data)
-        RasterUtilClass.write_gtiff_file(neg_dem, origin.nRows, origin.nCols, neg, origin.geotrans,
-                                         origin.srs, origin.noDataValue, origin.dataType)
+    Args:
+        cache_file: JSON file path. None as default to use the value of environment
+                    `PYGEOC_STATS_CACHE`, or `~/.pygeoc/raster_stats.json`.
+        max_entries: maximum number of cached entries, 1024 as default.
 
-    @staticmethod
-    def mask_raster(in_raster, mask, out_raster):
-        """
+    Examples:
+        >>> cache = RasterStatsCache('/path/to/stats.json')  # doctest: +SKIP
+        >>> RasterUtilClass.compute_statistics('dem.tif', cache=cache)  # doctest: +SKIP
+    """
+    _lock = threading.Lock()
+    LOCK_TIMEOUT = 10.
+    """Seconds to wait for the lock file, which is regarded as stale after then."""
+
+    def __init__(self, cache_file=None, max_entries=1024):
+        """Constructor."""
+        if cache_file is None:
+            cache_file = os.environ.get(STATS_CACHE_ENV,
+                                        os.path.join(os.path.expanduser('~'), '.pygeoc',
+                                                     'raster_stats.json'))
+        self.cache_file = os.path.abspath(cache_file)
+        self.lock_file = '%s.lock' % self.cache_file
+        self.max_entries = max_entries
+
+    @staticmethod
+    def get_stamps(raster_files):
+        """Get the absolute paths and [size, mtime] of raster files."""
+        paths = [os.path.abspath(f) for f in raster_files]
+        stamps = list()
+        for p in paths:
+            stat = os.stat(p)
+            stamps.append([stat.st_size, stat.st_mtime])
+        return paths, stamps
+
+    @staticmethod
+    def get_key(paths, signature):
+        """Key of the cached entry."""
+        return '%s#%s' % ('|'.join(paths), signature)
+
+    @staticmethod
+    def replace_file(src, dst):
+        """Rename `src` to `dst` which may exist, atomically if supported."""
+        if hasattr(os, 'replace'):
+            os.replace(src, dst)
+            return
+        try:  # Python 2, `os.rename` replaces `dst` atomically on POSIX
+            os.rename(src, dst)
+        except OSError:  # Python 2 on Windows
+            if os.path.exists(dst):
+                os.remove(dst)
+            os.rename(src, dst)
+
+    def _load(self):
+        if not os.path.isfile(self.cache_file):
+            return OrderedDict()
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f, object_pairs_hook=OrderedDict)
+        except (IOError, OSError, ValueError):
+            return OrderedDict()
+
+    def _acquire_file_lock(self):
+        """Create the lock file exclusively, return False if timeout."""
+        start = time.time()
+        while True:
+            try:
+                os.close(os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    return False
+            try:
+                if time.time() - os.path.getmtime(self.lock_file) > self.LOCK_TIMEOUT:
+                    os.remove(self.lock_file)  # left by a killed process
+                    continue
+            except OSError:  # released just now
+                continue
+            if time.time() - start > self.LOCK_TIMEOUT:
+                return False
+            time.sleep(0.01)
+
+    def _release_file_lock(self):
+        try:
+            os.remove(self.lock_file)
+        except OSError:
+            pass
+
+    def _prune(self, entries):
+        """Remove the entries of removed rasters and the oldest ones beyond `max_entries`."""
+        for key, entry in list(entries.items()):
+            paths = entry.get('paths')
+            if not paths or not all(os.path.exists(p) for p in paths):
+                del entries[key]
+        while len(entries) > max(self.max_entries, 0):
+            entries.popitem(last=False)
+
+    def get(self, raster_files, signature=''):
+        """Get the cached statistics, None if not cached or out of date."""
+        paths, stamps = RasterStatsCache.get_stamps(raster_files)
+        entry = self._load().get(RasterStatsCache.get_key(paths, signature))
+        if entry is None or entry.get('stamps') != stamps:
+            return None
+        return entry.get('stats')
+
+    def put(self, raster_files, stats, signature=''):
+        """Save the statistics, the out of date entries of the same key are replaced.
+
+        Returns:
+            True if succeed, False if the cache file cannot be written.
+        """
+        paths, stamps = RasterStatsCache.get_stamps(raster_files)
+        key = RasterStatsCache.get_key(paths, signature)
+        tmp_file = '%s.%d.%s.tmp' % (self.cache_file, os.getpid(), uuid.uuid4().hex[:8])
+        with RasterStatsCache._lock:
+            try:
+                UtilClass.mkdir(os.path.dirname(self.cache_file))
+            except (IOError, OSError):
+                return False
+            if not self._acquire_file_lock():
+                return False
+            try:
+                entries = self._load()
+                entries.pop(key, None)  # move to the end as the most recent one
+                entries[key] = {'paths': paths, 'stamps': stamps, 'stats': stats}
+                self._prune(entries)
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.write('%s' % json.dumps(entries))
+                RasterStatsCache.replace_file(tmp_file, self.cache_file)
+            except (IOError, OSError):
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+                return False
+            finally:
+                self._release_file_lock()
+        return True
+
+    def clear(self):
+        """Remove the cache file."""
+        with RasterStatsCache._lock:
+            locked = self._acquire_file_lock()
+            try:
+                if os.path.isfile(self.cache_file):
+                    os.remove(self.cache_file)
+            finally:
+                if locked:
+                    self._release_file_lock()
+
+
+class RasterCalculator(object):
+    """Block-wise map algebra of rasters with the same extent.
+
+    The expression is evaluated block by block, so that the whole rasters are never loaded
+    in memory. The cells with nodata (or NaN) in any input, and the cells with invalid
+    results (i.e., NaN or infinity) are set to nodata in the output.
+
+    Args:
+        inputs: dict of names and raster file paths, e.g., {'acc': 'acc.tif', 'slp': 'slp.tif'}.
+        expression: string expression of the names of inputs, `variables`, and functions of
+                    numpy (e.g., 'log(acc / tan(slp))' or 'numpy.log(acc)'), or a callable
+                    which accepts the arrays of inputs as keyword arguments.
+        nodata_value: nodata value of output raster, `DEFAULT_NODATA` as default.
+        gdal_type (:obj:`pygeoc.raster.GDALDataType`): output raster data type,
+                                                      GDT_Float32 as default.
+        variables: dict of constants used in `expression`, None as default.
+        block_shape: (rows, cols) of the expected block, see `RasterUtilClass.get_block_shape`.
+        max_workers: maximum number of threads, 1 as default. Each thread reads by its own
+                     datasets, while the writing is serialized.
+
+    Examples:
+        >>> calc = RasterCalculator({'acc': 'acc.tif', 'slp': 'slp_radian.tif'},
+        ...                         'log(acc * cellsize / tan(slp))',
+        ...                         variables={'cellsize': 30.})  # doctest: +SKIP
+        >>> calc.run('twi.tif')  # doctest: +SKIP
+        'twi.tif'
+    """
+    _namespace = dict((k, v) for k, v in vars(numpy).items() if not k.startswith('_'))
+    _namespace.update({'numpy': numpy, 'np': numpy, '__builtins__': {}})
+
+    def __init__(self, inputs, expression, nodata_value=DEFAULT_NODATA, gdal_type=GDT_Float32,
+                 variables=None, block_shape=None, max_workers=1):
+        """Constructor, check the inputs and compile the expression."""
+        if not inputs:
+            raise ValueError('At least one input raster is required!')
+        self.inputs = dict(inputs)
+        self.names = sorted(self.inputs.keys())
+        self.nodata_value = nodata_value
+        self.gdal_type = gdal_type
+        self.dtype = GDALNumpyType.get(gdal_type, numpy.float32)
+        self.max_workers = max_workers
+        self.header = RasterUtilClass.read_raster_header(self.inputs[self.names[0]])
+        self.nodatas = dict()
+        for name in self.names:
+            header = RasterUtilClass.read_raster_header(self.inputs[name])
+            if header.nRows != self.header.nRows or header.nCols != self.header.nCols:
+                raise ValueError('The shape of %s is different from %s!' %
+                                 (self.inputs[name], self.inputs[self.names[0]]))
+            self.nodatas[name] = header.noDataValue
+        self.block_shape = RasterUtilClass.get_block_shape(self.inputs[self.names[0]],
+                                                           block_shape)
+        self.variables = dict(variables or {})
+        if callable(expression):
+            self.func = expression
+        else:
+            code = compile(expression, '<RasterCalculator>', 'eval')
+            namespace = RasterCalculator._namespace
+
+            def func(**kwargs):
+                return eval(code, namespace, kwargs)
+
+            self.func = func
+        self._local = threading.local()
+
+    def _get_bands(self):
+        """GDAL datasets are not thread-safe, thus each thread opens its own datasets."""
+        if getattr(self._local, 'bands', None) is None:
+            self._local.datasets = [gdal_Open(self.inputs[name]) for name in self.names]
+            self._local.bands = [ds.GetRasterBand(1) for ds in self._local.datasets]
+        return self._local.bands
+
+    def calculate_window(self, window):
+        """Evaluate the expression of the given window.
+
+        Args:
+            window (:obj:`pygeoc.raster.RasterWindow`): block window.
+
+        Returns:
+            2D array with the output datatype.
+        """
+        arrays = dict()
+        invalid = numpy.zeros((window.ysize, window.xsize), dtype=bool)
+        for name, band in zip(self.names, self._get_bands()):
+            data = band.ReadAsArray(window.xoff, window.yoff, window.xsize, window.ysize)
+            if self.nodatas[name] is not None:
+                invalid |= data == self.nodatas[name]
+            if data.dtype.kind == 'f':
+                invalid |= numpy.isnan(data)
+            arrays[name] = data
+        arrays.update(self.variables)
+        with numpy.errstate(all='ignore'):
+            result = numpy.asarray(self.func(**arrays))
+        if result.shape != invalid.shape:
+            result = numpy.broadcast_to(result, invalid.shape)
+        if result.dtype.kind in 'fc':
+            invalid |= ~numpy.isfinite(result)
+        return numpy.where(invalid, self.nodata_value, result).astype(self.dtype)
+
+    def run(self, out_file, options=None):
+        """Evaluate the expression and write the output raster.
+
+        Args:
+            out_file: output raster file.
+            options: profile name in `GTIFF_PROFILES` or list of GeoTiff creation options,
+                     None as default to use the default profile.
+
+        Returns:
+            Output raster file.
+        """
+        windows = RasterUtilClass.get_block_windows(self.header.nRows, self.header.nCols,
+                                                    self.block_shape)
+        lock = threading.Lock()
+        with RasterBlockWriter(out_file, self.header.nRows, self.header.nCols,
+                               self.header.geotrans, self.header.srs, self.nodata_value,
+                               self.gdal_type, options) as writer:
+            def process(window):
+                result = self.calculate_window(window)
+                with lock:
+                    writer.write(window, result)
+
+            if self.max_workers is None or self.max_workers > 1:
+                with ThreadPoolExecutor(max_workers=self.max_workers or cpu_count()) as executor:
+                    for _ in executor.map(process, windows):
+                        pass
+            else:
+                for win in windows:
+                    process(win)
+        self._local = threading.local()
+        return out_file
+
+
+class TileScheduler(object):
+    """Run a kernel on tiles (with halo) of rasters in parallel, and stitch the outputs.
+
+    Each worker process opens the input rasters by itself and reads the tiles with halo,
+    thus the input tiles are never pickled. The output tile (core region) is passed back
+    through shared memory (`multiprocessing.shared_memory` of Python3.8+, otherwise pickled)
+    and written by the main process.
+
+    Args:
+        kernel: function that accepts the 2D arrays (with halo) of input rasters as
+                positional arguments and `kernel_kwargs` as keyword arguments, and returns
+                a 2D array with or without halo, or a tuple of them for multiple outputs
+                (see `run`). It must be picklable (e.g., a module-level function or
+                `functools.partial` of it) if `processes` > 1.
+        halo: halo width (cells) around each tile, e.g., 1 for 3*3 neighborhood.
+        tile_shape: (rows, cols) of the expected tile (core region), None as default to be
+                    decided by `memory_limit` or `RasterUtilClass.get_block_shape`.
+        processes: number of worker processes, None as default to use all CPUs,
+                   1 means run sequentially in-process.
+        memory_limit: the maximum bytes of input and output arrays of a tile per worker,
+                      which determines the tile shape if `tile_shape` is not specified.
+                      Note that the temporary arrays of the kernel are not counted.
+        kernel_kwargs: dict of keyword arguments of the kernel.
+        with_window: If True, the :obj:`pygeoc.raster.RasterWindow` of the tile is passed to
+                     the kernel as keyword argument `window`, e.g., to distinguish the raster
+                     edges from the tile edges. False as default.
+
+    Examples:
+        >>> from functools import partial
+        >>> kernel = partial(RasterUtilClass.morphology, operations=['dilation'] * 2,
+        ...                  nodata_value=-9999.)
+        >>> TileScheduler(kernel, halo=2, processes=8).run('in.tif', 'out.tif')  # doctest: +SKIP
+        'out.tif'
+    """
+
+    def __init__(self, kernel, halo=0, tile_shape=None, processes=None, memory_limit=None,
+                 kernel_kwargs=None, with_window=False):
+        """Constructor."""
+        self.kernel = kernel
+        self.halo = halo
+        self.tile_shape = tile_shape
+        self.processes = processes or cpu_count()
+        self.memory_limit = memory_limit
+        self.kernel_kwargs = dict(kernel_kwargs or {})
+        self.with_window = with_window
+
+    def get_windows(self, in_rasters, out_itemsize):
+        """Split the extent of input rasters into windows of tiles.
+
+        Args:
+            in_rasters: list of input raster paths.
+            out_itemsize: bytes of the output datatype.
+
+        Returns:
+            list of :obj:`pygeoc.raster.RasterWindow`.
+        """
+        header = RasterUtilClass.read_raster_header(in_rasters[0])
+        nrows, ncols = header.nRows, header.nCols
+        tile_shape = self.tile_shape
+        if tile_shape is None and self.memory_limit is not None:
+            cell_bytes = out_itemsize
+            for f in in_rasters:
+                cell_bytes += numpy.dtype(GDALNumpyType.get(
+                    RasterUtilClass.read_raster_header(f).dataType, numpy.float64)).itemsize
+            max_cells = max(1, self.memory_limit // cell_bytes)
+            # full-width strips if possible, otherwise square tiles
+            rows = max_cells // (ncols + 2 * self.halo) - 2 * self.halo
+            if rows >= 1:
+                tile_shape = (rows, ncols)
+            else:
+                side = max(1, int(max_cells ** 0.5) - 2 * self.halo)
+                tile_shape = (side, side)
+        elif tile_shape is None:
+            tile_shape = RasterUtilClass.get_block_shape(in_rasters[0])
+        for f in in_rasters[1:]:
+            other = RasterUtilClass.read_raster_header(f)
+            if other.nRows != nrows or other.nCols != ncols:
+                raise ValueError('The shape of %s is different from %s!' % (f, in_rasters[0]))
+        return RasterUtilClass.get_block_windows(nrows, ncols, tile_shape, self.halo)
+
+    def run(self, in_rasters, out_raster, gdal_type=None, nodata_value=None, options=None):
+        """Run the kernel on all tiles and write the output raster.
+
+        Args:
+            in_rasters: input raster path or list of paths with the same extent.
+            out_raster: output raster path, or list of paths if the kernel returns a tuple
+                        of arrays, i.e., one array for each output.
+            gdal_type (:obj:`pygeoc.raster.GDALDataType`): output raster data type, or list
+                                                          for each output, None as default
+                                                          to use the first input.
+            nodata_value: nodata value of output, or list for each output, None as default
+                          to use the first input.
+            options: profile name in `GTIFF_PROFILES` or list of GeoTiff creation options,
+                     None as default to use the default profile.
+
+        Returns:
+            Output raster path, or list of paths.
+        """
+        if is_string(in_rasters):
+            in_rasters = [in_rasters]
+        out_rasters = [out_raster] if is_string(out_raster) else list(out_raster)
+        count = len(out_rasters)
+        if not isinstance(gdal_type, (list, tuple)):
+            gdal_type = [gdal_type] * count
+        if not isinstance(nodata_value, (list, tuple)):
+            nodata_value = [nodata_value] * count
+        header = RasterUtilClass.read_raster_header(in_rasters[0])
+        gdal_types = [header.dataType if t is None else t for t in gdal_type]
+        nodata_values = [header.noDataValue if v is None else v for v in nodata_value]
+        out_dtypes = [numpy.dtype(GDALNumpyType.get(t, numpy.float64)) for t in gdal_types]
+        windows = self.get_windows(in_rasters, sum(dtype.itemsize for dtype in out_dtypes))
+        shm_prefix = 'pgc%s' % uuid.uuid4().hex[:8]
+        context = (self.kernel, list(in_rasters), self.kernel_kwargs,
+                   [dtype.str for dtype in out_dtypes], self.with_window, shm_prefix)
+        writers = list()
+        try:
+            for f, out_type, out_nodata in zip(out_rasters, gdal_types, nodata_values):
+                writers.append(RasterBlockWriter(f, header.nRows, header.nCols, header.geotrans,
+                                                 header.srs, out_nodata, out_type, options))
+            if self.processes > 1 and len(windows) > 1:
+                pool = Pool(min(self.processes, len(windows)), initializer=_tile_worker_init,
+                            initargs=(context,))
+                try:
+                    for window, results in pool.imap_unordered(_tile_worker, windows):
+                        for writer, result in zip(writers, results):
+                            writer.write(window, _tile_result_to_array(result))
+                except BaseException:
+                    # stop the workers, then release the shared memory of unconsumed tiles
+                    pool.terminate()
+                    pool.join()
+                    _release_tile_results(shm_prefix, windows, count)
+                    raise
+                pool.close()
+                pool.join()
+            else:
+                _tile_worker_init(context, use_shared_memory=False)
+                try:
+                    for window in windows:
+                        window, results = _tile_worker(window)
+                        for writer, result in zip(writers, results):
+                            writer.write(window, result)
+                finally:
+                    _tile_worker_init(None)
+        finally:
+            for writer in writers:
+                writer.close()
+        return out_raster
+
+
+class RasterUtilClass(object):
+    """Utility function to handle raster data.
+
+    See Also:
+        :class:`pygeoc.raster.raster.Raster`.
+    """
+
+    def __init__(self):
+        """Empty."""
+        pass
+
+    @staticmethod
+    def read_raster(raster_file, lazy=False, window=None):
+        """Read raster by GDAL.
+
+        Args:
+            raster_file: raster file path.
+            lazy: If True, `validZone` and `validValues` of the returned Raster object
+                  are computed on first access, which is recommended when only
+                  `data` is needed. False as default.
+            window: (xoff, yoff, xsize, ysize) to read only part of the raster,
+                    and the geotransform of the returned Raster will be updated.
+                    None as default to read the whole raster.
+
+        Returns:
+            Raster object. If the raster cache is enabled (see `enable_raster_cache`), the
+            arrays of the Raster object read without `window` are read-only.
+        """
+        cache = _RASTER_CACHE
+        if cache is not None and window is None:
+            rst = cache.get(raster_file, lazy)
+            if rst is not None:
+                return rst
+        ds = gdal_Open(raster_file)
+        band = ds.GetRasterBand(1)
+        if window is None:
+            data = band.ReadAsArray()
+            xsize = band.XSize
+            ysize = band.YSize
+        else:
+            xoff, yoff, xsize, ysize = window
+            data = band.ReadAsArray(xoff, yoff, xsize, ysize)
+        nodata_value, geotrans, srs, dttype = RasterUtilClass._get_properties(ds, band)
+        if window is not None:
+            geotrans = [geotrans[0] + xoff * geotrans[1] + yoff * geotrans[2], geotrans[1],
+                        geotrans[2], geotrans[3] + xoff * geotrans[4] + yoff * geotrans[5],
+                        geotrans[4], geotrans[5]]
+        band = None
+        ds = None
+        # The array read by GDAL is newly allocated, so there is no need to copy.
+        rst = Raster(ysize, xsize, data, nodata_value, geotrans, srs, dttype, lazy=True)
+        if not lazy:
+            rst._compute_valid()
+        if cache is not None and window is None:
+            rst = cache.put(raster_file, rst)
+        return rst
+
+    @staticmethod
+    def read_rasters(raster_files, lazy=False, max_workers=None):
+        """Read multiple raster files using a thread pool to overlap I/O.
+
+        Args:
+            raster_files: list of raster file paths.
+            lazy: see `read_raster`.
+            max_workers: maximum number of threads, see `_thread_map`.
+
+        Returns:
+            List of Raster objects in the same order of `raster_files`.
+        """
+        return RasterUtilClass._thread_map(RasterUtilClass.read_raster,
+                                           [(f, lazy) for f in raster_files], max_workers)
+
+    @staticmethod
+    def enable_raster_cache(max_bytes=1073741824):
+        """Enable the process-wide LRU cache of Raster objects read by `read_raster`.
+
+        Args:
+            max_bytes: memory budget of arrays in bytes, 1 GB as default.
+
+        Returns:
+            The enabled :obj:`pygeoc.raster.RasterCache`, the existed one will be reused
+            with the updated memory budget.
+        """
+        global _RASTER_CACHE
+        if _RASTER_CACHE is None:
+            _RASTER_CACHE = RasterCache(max_bytes)
+        else:
+            with _RASTER_CACHE._lock:
+                _RASTER_CACHE.max_bytes = max_bytes
+                _RASTER_CACHE._evict()
+        return _RASTER_CACHE
+
+    @staticmethod
+    def disable_raster_cache():
+        """Disable and clear the raster cache.
+
+        Returns:
+            The disabled :obj:`pygeoc.raster.RasterCache` (for the counters) or None.
+        """
+        global _RASTER_CACHE
+        cache = _RASTER_CACHE
+        _RASTER_CACHE = None
+        if cache is not None:
+            cache.invalidate()
+        return cache
+
+    @staticmethod
+    def get_raster_cache():
+        """Get the current raster cache, None if not enabled."""
+        return _RASTER_CACHE
+
+    @staticmethod
+    def invalidate_raster_cache(raster_file):
+        """Remove the cached raster file (if existed), e.g., before it is overwritten."""
+        cache = _RASTER_CACHE
+        if cache is not None:
+            cache.invalidate(raster_file)
+
+    @staticmethod
+    def read_raster_header(raster_file):
+        """Read raster properties by GDAL without reading the data.
+
+        Args:
+            raster_file: raster file path.
+
+        Returns:
+            Raster object whose `data` is None.
+        """
+        ds = gdal_Open(raster_file)
+        band = ds.GetRasterBand(1)
+        xsize = band.XSize
+        ysize = band.YSize
+        nodata_value, geotrans, srs, dttype = RasterUtilClass._get_properties(ds, band)
+        band = None
+        ds = None
+        return Raster(ysize, xsize, None, nodata_value, geotrans, srs, dttype, lazy=True)
+
+    @staticmethod
+    def sample_raster(raster_file, xs, ys, masked=False):
+        """Sample raster file by xy coordinates, only the bounding window of points is read.
+
+        Args:
+            raster_file: raster file path.
+            xs: X coordinates, scalar or array.
+            ys: Y coordinates, scalar or array with the same shape of `xs`.
+            masked: see `Raster.sample_rowcol`.
+
+        Returns:
+            Array with the same shape of `xs`.
+        """
+        header = RasterUtilClass.read_raster_header(raster_file)
+        rows, cols = header.get_row_col_by_xy(xs, ys)
+        inside = rows >= 0
+        if not inside.any():
+            header.data = numpy.zeros((1, 1), dtype=numpy.float64)
+            return header.sample_rowcol(rows, cols, masked)
+        row_min, row_max = rows[inside].min(), rows[inside].max()
+        col_min, col_max = cols[inside].min(), cols[inside].max()
+        rst = RasterUtilClass.read_raster(raster_file, lazy=True,
+                                          window=(int(col_min), int(row_min),
+                                                  int(col_max - col_min + 1),
+                                                  int(row_max - row_min + 1)))
+        return rst.sample_rowcol(numpy.where(inside, rows - row_min, -1),
+                                 numpy.where(inside, cols - col_min, -1), masked)
+
+    @staticmethod
+    def sample_rasters(raster_files, xs, ys, max_workers=None, masked=False):
+        """Sample multiple raster files by the same xy coordinates using a thread pool.
+
+        Args:
+            raster_files: list of raster file paths.
+            xs: X coordinates, scalar or array.
+            ys: Y coordinates, scalar or array with the same shape of `xs`.
+            max_workers: maximum number of threads, see `_thread_map`.
+            masked: see `Raster.sample_rowcol`.
+
+        Returns:
+            List of arrays in the same order of `raster_files`.
+        """
+        return RasterUtilClass._thread_map(RasterUtilClass.sample_raster,
+                                           [(f, xs, ys, masked) for f in raster_files],
+                                           max_workers)
+
+    @staticmethod
+    def _thread_map(func, args_list, max_workers=None):
+        """Call `func` with each tuple of arguments by a thread pool, since GDAL I/O and most
+        numpy operations release the GIL.
+
+        Args:
+            func: function to be called.
+            args_list: list of argument tuples.
+            max_workers: maximum number of threads, None as default to use
+                         `min(32, cpu_count() + 4)`, 1 means call sequentially.
+
+        Returns:
+            List of the returned values in the same order of `args_list`.
+        """
+        if max_workers == 1 or len(args_list) <= 1:
+            return [func(*args) for args in args_list]
+        if max_workers is None:
+            # The default of Python3.8+, the Python2 backport of futures requires max_workers
+            max_workers = min(32, cpu_count() + 4)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(args_list))) as executor:
+            futures = [executor.submit(func, *args) for args in args_list]
+            return [future.result() for future in futures]
+
+    @staticmethod
+    def _get_properties(ds, band):
+        """Get nodata value, geotransform, spatial reference, and datatype of a raster band."""
+        nodata_value = band.GetNoDataValue()
+        geotrans = ds.GetGeoTransform()
+        dttype = band.DataType
+
+        srs = ds.GetSpatialRef()
+        if srs is None:
+            wkt = ds.GetProjection()
+            srs = osr_SpatialReference()
+            if wkt:
+                # print(wkt)
+                srs.ImportFromWkt(wkt)  # srs may still be empty if file has no SRS
+                # print(srs.ExportToProj4())
+
+        if nodata_value is None:
+            nodata_value = DEFAULT_NODATA
+        return nodata_value, geotrans, srs, dttype
+
+    @staticmethod
+    def get_block_shape(raster_file, block_shape=None, band_num=1):
+        """Get the block shape aligned to the natural block size of GDAL.
+
+        If `block_shape` is not specified, the natural blocks (e.g., strips or tiles) are
+        assembled along rows until the block contains at least `BLOCK_CELLS` cells.
+        Otherwise, the given shape is rounded to multiples of the natural block size.
+
+        Args:
+            raster_file: raster file path.
+            block_shape: (rows, cols) of the expected block, None as default.
+            band_num: band number, 1 as default.
+
+        Returns:
+            (rows, cols) of the block.
+        """
+        ds = gdal_Open(raster_file)
+        band = ds.GetRasterBand(band_num)
+        nblk_x, nblk_y = band.GetBlockSize()
+        nrows = band.YSize
+        ncols = band.XSize
+        band = None
+        ds = None
+        if block_shape is None:
+            blk_rows = nblk_y * max(1, BLOCK_CELLS // (nblk_x * nblk_y))
+            blk_cols = nblk_x
+        else:
+            blk_rows = nblk_y * max(1, int(round(float(block_shape[0]) / nblk_y)))
+            blk_cols = nblk_x * max(1, int(round(float(block_shape[1]) / nblk_x)))
+        return min(blk_rows, nrows), min(blk_cols, ncols)
+
+    @staticmethod
+    def get_block_windows(n_rows, n_cols, block_shape, halo=0):
+        """Split a raster into block windows by row-major order.
+
+        Examples:
+            >>> wins = RasterUtilClass.get_block_windows(5, 4, (2, 4), halo=1)
+            >>> [(w.yoff, w.ysize, w.read_yoff, w.read_ysize) for w in wins]
+            [(0, 2, 0, 3), (2, 2, 1, 4), (4, 1, 3, 2)]
+
+        Args:
+            n_rows: Row count of the raster.
+            n_cols: Col count of the raster.
+            block_shape: (rows, cols) of each block.
+            halo: halo width (cells) around each block, 0 as default.
+
+        Returns:
+            list of :obj:`pygeoc.raster.RasterWindow`.
+        """
+        blk_rows, blk_cols = block_shape
+        windows = list()
+        for yoff in range(0, n_rows, blk_rows):
+            for xoff in range(0, n_cols, blk_cols):
+                windows.append(RasterWindow(xoff, yoff,
+                                            min(blk_cols, n_cols - xoff),
+                                            min(blk_rows, n_rows - yoff),
+                                            halo, n_rows, n_cols))
+        return windows
+
+    @staticmethod
+    def iter_blocks(raster_file, block_shape=None, halo=0, band_num=1):
+        """Read raster block by block, so that the whole raster is never loaded in memory.
+
+        Args:
+            raster_file: raster file path.
+            block_shape: (rows, cols) of the expected block, see `get_block_shape`.
+            halo: halo width (cells) read around each block, e.g., 1 for 3*3 neighbors.
+            band_num: band number, 1 as default.
+
+        Yields:
+            (:obj:`pygeoc.raster.RasterWindow`, 2D array of the block with halo).
+        """
+        block_shape = RasterUtilClass.get_block_shape(raster_file, block_shape, band_num)
+        ds = gdal_Open(raster_file)
+        band = ds.GetRasterBand(band_num)
+        for win in RasterUtilClass.get_block_windows(band.YSize, band.XSize, block_shape, halo):
+            yield win, band.ReadAsArray(win.read_xoff, win.read_yoff,
+                                        win.read_xsize, win.read_ysize)
+        band = None
+        ds = None
+
+    @staticmethod
+    def write_blocks(f_name, blocks, n_rows, n_cols, geotransform, srs, nodata_value,
+                     gdal_type=GDT_Float32, options=None):
+        """Output blocks, e.g., processed from `iter_blocks`, to GeoTiff format file.
+
+        Args:
+            f_name: output gtiff file name.
+            blocks: iterable of (:obj:`pygeoc.raster.RasterWindow`, 2D array).
+            n_rows: Row count.
+            n_cols: Col count.
+            geotransform: geographic transformation.
+            srs: coordinate system.
+            nodata_value: nodata value.
+            gdal_type (:obj:`pygeoc.raster.GDALDataType`): output raster data type,
+                                                          GDT_Float32 as default.
+            options: profile name in `GTIFF_PROFILES` or list of GeoTiff creation options,
+                     None as default to use the default profile.
+        """
+        with RasterBlockWriter(f_name, n_rows, n_cols, geotransform, srs, nodata_value,
+                               gdal_type, options) as writer:
+            for win, data in blocks:
+                writer.write(win, data)
+
+    @staticmethod
+    def update_raster_window(raster_file, data, xoff, yoff, band_num=1):
+        """Overwrite the window of an existing raster file from (xoff, yoff) by `data`.
+
+        Args:
+            raster_file: raster file path.
+            data: 2D array, NaN is replaced by the nodata value of the raster.
+            xoff: col offset of the window.
+            yoff: row offset of the window.
+            band_num: band number, 1 as default.
+        """
+        RasterUtilClass.invalidate_raster_cache(raster_file)
+        ds = gdal_Open(raster_file, GA_Update)
+        if ds is None:
+            raise IOError('Cannot open %s in update mode!' % raster_file)
+        band = ds.GetRasterBand(band_num)
+        if band.GetNoDataValue() is not None:
+            data = RasterUtilClass.replace_nan(data, band.GetNoDataValue())
+        band.WriteArray(data, xoff, yoff)
+        ds.FlushCache()
+        band = None
+        ds = None
+
+    @staticmethod
+    def get_mask_from_raster(rasterfile, outmaskfile, keep_nodata=False, windowed=False):
+        """Generate mask data from a given raster data.
+
+        Args:
+            rasterfile: raster file path.
+            outmaskfile: output mask file path.
+            keep_nodata: If True, keep the extent of the raster, otherwise crop the
+                         mask by the bounding box of valid cells. False as default.
+            windowed: If True, scan the raster block by block to get the bounding box,
+                      and then read back only the cropped extent. False as default.
+
+        Returns:
+            Raster object of mask data.
+        """
+        if windowed:
+            raster_r = RasterUtilClass.read_raster_header(rasterfile)
+        else:
+            raster_r = RasterUtilClass.read_raster(rasterfile, lazy=True)
+        xsize = raster_r.nCols
+        ysize = raster_r.nRows
+        nodata_value = raster_r.noDataValue
+        srs = raster_r.srs
+        x_min = raster_r.xMin
+        y_max = raster_r.yMax
+        dx = raster_r.dx
+
+        if not keep_nodata:
+            if windowed:
+                valid_rows = numpy.zeros(ysize, dtype=bool)
+                valid_cols = numpy.zeros(xsize, dtype=bool)
+                for win, blk in RasterUtilClass.iter_blocks(rasterfile):
+                    blk_valid = numpy.abs(blk - nodata_value) > DELTA
+                    valid_rows[win.yoff:win.yoff + win.ysize] |= blk_valid.any(axis=1)
+                    valid_cols[win.xoff:win.xoff + win.xsize] |= blk_valid.any(axis=0)
+            else:
+                valid = numpy.abs(raster_r.data - nodata_value) > DELTA
+                valid_rows = valid.any(axis=1)
+                valid_cols = valid.any(axis=0)
+            if not valid_rows.any():
+                raise ValueError('There is no valid cell in %s!' % rasterfile)
+            i_min, i_max = numpy.flatnonzero(valid_rows)[[0, -1]]
+            j_min, j_max = numpy.flatnonzero(valid_cols)[[0, -1]]
+
+            # print(i_min, i_max, j_min, j_max)
+            y_size_mask = int(i_max - i_min + 1)
+            x_size_mask = int(j_max - j_min + 1)
+            x_min_mask = x_min + j_min * dx
+            y_max_mask = y_max - i_min * dx
+        else:
+            y_size_mask = ysize
+            x_size_mask = xsize
+            x_min_mask = x_min
+            y_max_mask = y_max
+            i_min = 0
+            j_min = 0
+        print('%dx%d -> %dx%d' % (xsize, ysize, x_size_mask, y_size_mask))
+
+        if windowed:
+            data = RasterUtilClass.read_raster(rasterfile, lazy=True,
+                                               window=(int(j_min), int(i_min),
+                                                       x_size_mask, y_size_mask)).data
+        else:
+            data = raster_r.data[i_min:i_min + y_size_mask, j_min:j_min + x_size_mask]
+        mask = numpy.where(numpy.abs(data - nodata_value) > DELTA,
+                           1, int(DEFAULT_NODATA)).astype(numpy.int32)
+
+        mask_geotrans = [x_min_mask, dx, 0, y_max_mask, 0, -dx]
+        RasterUtilClass.write_gtiff_file(outmaskfile, y_size_mask, x_size_mask, mask,
+                                         mask_geotrans, srs, DEFAULT_NODATA, GDT_Int32)
+        return Raster(y_size_mask, x_size_mask, mask, DEFAULT_NODATA, mask_geotrans, srs,
+                      GDT_Int32, lazy=True)
+
+    @staticmethod
+    def raster_reclassify(srcfile, v_dict, dstfile, gdaltype=GDT_Float32, streaming=False):
+        """Reclassify raster by given classifier dict.
+
+        Args:
+            srcfile: source raster file.
+            v_dict: classifier dict.
+            dstfile: destination file path.
+            gdaltype (:obj:`pygeoc.raster.GDALDataType`): GDT_Float32 as default.
+            streaming: If True, reclassify block by block with bounded memory.
+
+        See Also:
+            :func:`pygeoc.raster.RasterUtilClass.reclassify_data`
+        """
+        if streaming:
+            src_r = RasterUtilClass.read_raster_header(srcfile)
+        else:
+            src_r = RasterUtilClass.read_raster(srcfile, lazy=True)
+        if gdaltype == GDT_Float32 and src_r.dataType != GDT_Float32:
+            gdaltype = src_r.dataType
+        no_data = src_r.noDataValue
+        new_no_data = DEFAULT_NODATA
+        if gdaltype in [GDT_Unknown, GDT_Byte, GDT_UInt16, GDT_UInt32]:
+            new_no_data = 0
+        v_dict = dict(v_dict)  # do not modify the classifier dict of the caller
+        if not MathClass.floatequal(new_no_data, src_r.noDataValue):
+            if src_r.noDataValue not in v_dict:
+                v_dict[src_r.noDataValue] = new_no_data
+                no_data = new_no_data
+
+        if streaming:
+            blocks = ((win, RasterUtilClass.reclassify_data(blk, v_dict))
+                      for win, blk in RasterUtilClass.iter_blocks(srcfile))
+            RasterUtilClass.write_blocks(dstfile, blocks, src_r.nRows, src_r.nCols,
+                                         src_r.geotrans, src_r.srs, no_data, gdaltype)
+        else:
+            dst_data = RasterUtilClass.reclassify_data(src_r.data, v_dict)
+            RasterUtilClass.write_gtiff_file(dstfile, src_r.nRows, src_r.nCols, dst_data,
+                                             src_r.geotrans, src_r.srs, no_data, gdaltype)
+
+    @staticmethod
+    def raster_reclassify_by_intervals(srcfile, intervals, dstfile, gdaltype=GDT_Float32,
+                                       streaming=False):
+        """Reclassify raster by given value ranges.
+
+        Args:
+            srcfile: source raster file.
+            intervals: list of (lower, upper, value), i.e., lower <= cell < upper -> value.
+            dstfile: destination file path.
+            gdaltype (:obj:`pygeoc.raster.GDALDataType`): GDT_Float32 as default.
+            streaming: If True, reclassify block by block with bounded memory.
+
+        See Also:
+            :func:`pygeoc.raster.RasterUtilClass.reclassify_data_by_intervals`
+        """
+        if streaming:
+            src_r = RasterUtilClass.read_raster_header(srcfile)
+        else:
+            src_r = RasterUtilClass.read_raster(srcfile, lazy=True)
+        no_data = DEFAULT_NODATA
+        if gdaltype in [GDT_Unknown, GDT_Byte, GDT_UInt16, GDT_UInt32]:
+            no_data = 0
+        if streaming:
+            blocks = ((win, RasterUtilClass.reclassify_data_by_intervals(blk, intervals,
+                                                                          src_r.noDataValue,
+                                                                          no_data))
+                      for win, blk in RasterUtilClass.iter_blocks(srcfile))
+            RasterUtilClass.write_blocks(dstfile, blocks, src_r.nRows, src_r.nCols,
+                                         src_r.geotrans, src_r.srs, no_data, gdaltype)
+        else:
+            dst_data = RasterUtilClass.reclassify_data_by_intervals(src_r.data, intervals,
+                                                                    src_r.noDataValue, no_data)
+            RasterUtilClass.write_gtiff_file(dstfile, src_r.nRows, src_r.nCols, dst_data,
+                                             src_r.geotrans, src_r.srs, no_data, gdaltype)
+
+    @staticmethod
+    def reclassify_data(data, v_dict):
+        """Reclassify array by given classifier dict in one pass, values not in the dict are kept.
+
+        A dense lookup table is used for integer data whose value domain (including the keys)
+        is not larger than `LOOKUP_TABLE_SIZE`, otherwise the keys are sorted and located by
+        `numpy.searchsorted`.
+
+        Examples:
+            >>> data = numpy.array([[1, 2], [3, -9999]])
+            >>> RasterUtilClass.reclassify_data(data, {1: 10, 3: 30})
+            array([[   10,     2],
+                   [   30, -9999]])
+            >>> RasterUtilClass.reclassify_data(data * 0.5, {0.5: 10, 1.5: 30}).tolist()
+            [[10.0, 1.0], [30.0, -4999.5]]
+
+        Args:
+            data: 2D array.
+            v_dict: classifier dict.
+
+        Returns:
+            Reclassified array with the same datatype of `data`.
+        """
+        data = numpy.asarray(data)
+        if not v_dict:
+            return numpy.copy(data)
+        keys = numpy.array(list(v_dict.keys()), dtype=numpy.float64)
+        values = numpy.array(list(v_dict.values()), dtype=numpy.float64)
+        if data.dtype.kind in 'iu' and data.size > 0 and numpy.all(keys == numpy.floor(keys)):
+            low = int(min(keys.min(), data.min()))
+            high = int(max(keys.max(), data.max()))
+            if high - low < LOOKUP_TABLE_SIZE:
+                lut = numpy.arange(low, high + 1, dtype=numpy.int64).astype(data.dtype)
+                lut[keys.astype(numpy.int64) - low] = values.astype(data.dtype)
+                return lut[numpy.subtract(data, low, dtype=numpy.int64)]
+        if data.dtype.kind == 'f':
+            keys = keys.astype(data.dtype)  # compare in the precision of data
+        order = numpy.argsort(keys)
+        keys = keys[order]
+        values = values[order]
+        idx = numpy.searchsorted(keys, data)
+        numpy.clip(idx, 0, len(keys) - 1, out=idx)
+        matched = keys[idx] == data
+        dst_data = numpy.copy(data)
+        dst_data[matched] = values[idx[matched]].astype(data.dtype)
+        return dst_data
+
+    @staticmethod
+    def reclassify_data_by_intervals(data, intervals, nodata_value, new_nodata=DEFAULT_NODATA):
+        """Reclassify array by value ranges, cells not in any range are set to `new_nodata`.
+
+        Examples:
+            >>> data = numpy.array([[1., 2.5], [5., -9999.]])
+            >>> RasterUtilClass.reclassify_data_by_intervals(data, [(0, 2, 1), (2, 5, 2)],
+            ...                                              -9999.).tolist()
+            [[1.0, 2.0], [-9999.0, -9999.0]]
+
+        Args:
+            data: 2D array.
+            intervals: list of (lower, upper, value), i.e., lower <= cell < upper -> value.
+                       The ranges should not be overlapped.
+            nodata_value: nodata value of `data`.
+            new_nodata: nodata value of the output array.
+
+        Returns:
+            Reclassified float array.
+        """
+        if not intervals:
+            raise ValueError('At least one reclassified range is required!')
+        intervals = sorted(intervals, key=lambda x: x[0])
+        lowers = numpy.array([itv[0] for itv in intervals], dtype=numpy.float64)
+        uppers = numpy.array([itv[1] for itv in intervals], dtype=numpy.float64)
+        values = numpy.array([itv[2] for itv in intervals], dtype=numpy.float64)
+        if numpy.any(uppers[:-1] > lowers[1:]):
+            raise ValueError('The reclassified ranges should not be overlapped!')
+        idx = numpy.searchsorted(lowers, data, side='right') - 1
+        inside = idx >= 0
+        numpy.clip(idx, 0, len(intervals) - 1, out=idx)
+        inside &= data < uppers[idx]
+        inside &= data != nodata_value
+        return numpy.where(inside, values[idx], new_nodata)
+
+    @staticmethod
+    def write_gtiff_file(f_name, n_rows, n_cols, data, geotransform, srs, nodata_value,
+                         gdal_type=GDT_Float32, options=None, cog=False):
+        """Output Raster to GeoTiff format file.
+
+        Args:
+            f_name: output gtiff file name.
+            n_rows: Row count.
+            n_cols: Col count.
+            data: 2D array data.
+            geotransform: geographic transformation.
+            srs: coordinate system.
+            nodata_value: nodata value.
+            gdal_type (:obj:`pygeoc.raster.GDALDataType`): output raster data type,
+                                                                  GDT_Float32 as default.
+            options: profile name in `GTIFF_PROFILES` (e.g., 'deflate') or list of GeoTiff
+                     creation options, None as default to use the default profile.
+            cog: If True, write Cloud Optimized GeoTiff with internal overviews, and raise
+                 IOError if the COG cannot be created.
+        """
+        if cog:
+            ds = RasterUtilClass.create_gtiff('', n_rows, n_cols, geotransform, srs,
+                                              nodata_value, gdal_type, driver='MEM')
+        else:
+            ds = RasterUtilClass.create_gtiff(f_name, n_rows, n_cols, geotransform, srs,
+                                              nodata_value, gdal_type, options)
+        if ds is None:
+            print('Cannot create output file %s' % f_name)
+            return
+        ds.GetRasterBand(1).WriteArray(RasterUtilClass.replace_nan(data, nodata_value))
+        if cog:
+            if not FileClass.is_vsi_path(f_name):
+                UtilClass.mkdir(os.path.dirname(FileClass.get_file_fullpath(f_name)))
+                RasterUtilClass.invalidate_raster_cache(f_name)
+            if not RasterUtilClass.create_cog(ds, f_name, gdal_type, options):
+                ds = None
+                raise IOError('Cannot create output file %s' % f_name)
+        ds = None
+
+    @staticmethod
+    def write_gtiff_files(f_names, n_rows, n_cols, data_list, geotransform, srs, nodata_value,
+                          gdal_type=GDT_Float32, options=None, max_workers=None):
+        """Output multiple arrays with the same grid to GeoTiff files using a thread pool.
+
+        Args:
+            f_names: list of output gtiff file names.
+            n_rows: Row count.
+            n_cols: Col count.
+            data_list: list of 2D arrays in the same order of `f_names`.
+            geotransform: geographic transformation.
+            srs: coordinate system.
+            nodata_value: nodata value, or list of nodata values of each file.
+            gdal_type (:obj:`pygeoc.raster.GDALDataType`): output raster data type, or list of
+                                                          data types, GDT_Float32 as default.
+            options: see `write_gtiff_file`.
+            max_workers: maximum number of threads, see `_thread_map`.
+        """
+        if len(f_names) != len(data_list):
+            raise ValueError('The count of file names and arrays must be the same.')
+        if not isinstance(nodata_value, (list, tuple)):
+            nodata_value = [nodata_value] * len(f_names)
+        if not isinstance(gdal_type, (list, tuple)):
+            gdal_type = [gdal_type] * len(f_names)
+        RasterUtilClass._thread_map(RasterUtilClass.write_gtiff_file,
+                                    [(f, n_rows, n_cols, data, geotransform, srs, nodata, dtype,
+                                      options)
+                                     for f, data, nodata, dtype in zip(f_names, data_list,
+                                                                       nodata_value, gdal_type)],
+                                    max_workers)
+
+    @staticmethod
+    def create_gtiff(f_name, n_rows, n_cols, geotransform, srs, nodata_value,
+                     gdal_type=GDT_Float32, options=None, driver='GTiff'):
+        """Create an empty single band GeoTiff dataset.
+
+        The `driver` can be 'MEM' to create an in-memory dataset, e.g., as the source
+        of `create_cog`, in which case `f_name` and `options` are ignored.
+
+        Returns:
+            GDAL dataset in update mode, None if failed.
+        """
+        if driver == 'MEM':
+            f_name = ''
+            options = []
+        else:
+            if not FileClass.is_vsi_path(f_name):
+                UtilClass.mkdir(os.path.dirname(FileClass.get_file_fullpath(f_name)))
+                RasterUtilClass.invalidate_raster_cache(f_name)
+            options = RasterUtilClass.get_creation_options(options, gdal_type)
+        drv = gdal_GetDriverByName(str(driver))
+        try:
+            ds = drv.Create(f_name, n_cols, n_rows, 1, gdal_type, options=options)
+        except Exception:
+            return None
+        if ds is None:
+            return None
+        ds.SetGeoTransform(geotransform)
+        try:
+            ds.SetProjection(srs.ExportToWkt())
+        except AttributeError or Exception:
+            ds.SetProjection(srs)
+        ds.GetRasterBand(1).SetNoDataValue(nodata_value)
+        return ds
+
+    @staticmethod
+    def get_creation_options(options=None, gdal_type=GDT_Float32):
+        """Get GeoTiff creation options.
+
+        Examples:
+            >>> RasterUtilClass.get_creation_options('lzw', GDT_Int32)
+            ['TILED=YES', 'COMPRESS=LZW', 'PREDICTOR=2', 'BIGTIFF=IF_SAFER', 'NUM_THREADS=ALL_CPUS']
+            >>> RasterUtilClass.get_creation_options(['COMPRESS=DEFLATE'])
+            ['COMPRESS=DEFLATE']
+
+        Args:
+            options: profile name in `GTIFF_PROFILES` or list of GeoTiff creation options,
+                     None as default to use the default profile.
+            gdal_type (:obj:`pygeoc.raster.GDALDataType`): raster data type to determine the
+                                                          predictor, GDT_Float32 as default.
+
+        Returns:
+            list of creation options.
+        """
+        if options is None:
+            options = _GTIFF_PROFILE
+        if is_string(options):
+            if options.lower() not in GTIFF_PROFILES:
+                raise ValueError('The GeoTiff profile should be one of %s' %
+                                 ', '.join(sorted(GTIFF_PROFILES.keys())))
+            options = GTIFF_PROFILES.get(options.lower())
+        predictor = 'PREDICTOR=3' if gdal_type in [GDT_Float32, GDT_Float64] else 'PREDICTOR=2'
+        return [str(predictor if opt == 'PREDICTOR' else opt) for opt in options]
+
+    @staticmethod
+    def set_default_gtiff_profile(profile):
+        """Set the default GeoTiff creation options used by all writing functions.
+
+        Args:
+            profile: profile name in `GTIFF_PROFILES` or list of GeoTiff creation options.
+
+        Returns:
+            The previous default profile, which can be used to restore the setting.
+        """
+        global _GTIFF_PROFILE
+        RasterUtilClass.get_creation_options(profile)  # validate the profile
+        previous = _GTIFF_PROFILE
+        _GTIFF_PROFILE = profile
+        return previous
+
+    @staticmethod
+    def replace_nan(data, nodata_value):
+        """If data contains numpy.nan, then replaced by nodata_value."""
+        if isinstance(data, numpy.ndarray) and data.dtype.kind == 'f':
+            return numpy.where(numpy.isnan(data), nodata_value, data)
+        return data
+
+    @staticmethod
+    def write_asc_file(filename, data, xsize, ysize, geotransform, nodata_value,
+                       precision=None):
+        """Output Raster to ASCII file.
+
+        Args:
+            filename: output ASCII filename.
+            data: 2D array data.
+            xsize: Col count.
+            ysize: Row count.
+            geotransform: geographic transformation.
+            nodata_value: nodata_flow value, `DEFAULT_NODATA` is written if it is None.
+            precision: decimal places of floating point values. None as default to write
+                       9 significant digits for float32 and 15 for float64.
+                       Integer values are always written as integers.
+        """
+        UtilClass.mkdir(os.path.dirname(FileClass.get_file_fullpath(filename)))
+        RasterUtilClass.invalidate_raster_cache(filename)
+        if nodata_value is None:
+            nodata_value = DEFAULT_NODATA
+        data = RasterUtilClass.replace_nan(numpy.asarray(data), nodata_value)
+        is_int = data.dtype.kind in 'iub' and numpy.isfinite(nodata_value) and \
+            nodata_value == int(nodata_value)
+        # the NODATA_VALUE of float grid is written with '.', see `read_asc_file`
+        header = 'NCOLS %d\n' \
+                 'NROWS %d\n' \
+                 'XLLCENTER %f\n' \
+                 'YLLCENTER %f\n' \
+                 'CELLSIZE %f\n' \
+                 'NODATA_VALUE %s\n' % (xsize, ysize, geotransform[0] + 0.5 * geotransform[1],
+                                        geotransform[3] - (ysize - 0.5) * geotransform[1],
+                                        geotransform[1], '%d' % nodata_value if is_int
+                                        else '%f' % nodata_value)
+        if data.dtype.kind in 'iub':
+            fmt = '%d'
+        elif precision is not None:
+            fmt = '%%.%df' % precision
+        elif data.dtype.itemsize <= 4:
+            fmt = '%.9g'
+        else:
+            fmt = '%.15g'
+        # format a chunk of rows at once, which is much faster than writing cell by cell
+        row_fmt = ' '.join([fmt] * xsize) + '\n'
+        chunk_rows = max(1, BLOCK_CELLS // max(1, 16 * xsize))
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(header)
+            for i in range(0, ysize, chunk_rows):
+                chunk = data[i:i + chunk_rows]
+                f.write((row_fmt * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+    @staticmethod
+    def read_asc_file(filename):
+        """Read ESRI ASCII grid file.
+
+        Args:
+            filename: input ASCII filename.
+
+        Returns:
+            Raster object, the datatype is GDT_Int32 if all values (including NODATA_VALUE)
+            are written as integers, e.g., `1` rather than `1.0`, otherwise GDT_Float32.
+        """
+        header = dict()
+        with open(filename, 'r', encoding='utf-8') as f:
+            while True:
+                pos = f.tell()
+                line = f.readline()
+                items = line.split()
+                if not line or (items and not items[0][0].isalpha()):
+                    f.seek(pos)
+                    break
+                if len(items) >= 2:
+                    header[items[0].lower()] = items[1]
+            body = f.read()
+        ncols = int(header['ncols'])
+        nrows = int(header['nrows'])
+        dx = float(header['cellsize'])
+        nodata_token = header.get('nodata_value', '')
+        nodata_value = float(nodata_token) if nodata_token else DEFAULT_NODATA
+        if 'xllcenter' in header:
+            x_min = float(header['xllcenter']) - 0.5 * dx
+        else:
+            x_min = float(header['xllcorner'])
+        if 'yllcenter' in header:
+            y_min = float(header['yllcenter']) - 0.5 * dx
+        else:
+            y_min = float(header['yllcorner'])
+        data = numpy.array(body.split(), dtype=numpy.float64)
+        if data.size != nrows * ncols:
+            raise ValueError('%s should have %d values, but %d were read!' %
+                             (filename, nrows * ncols, data.size))
+        data = data.reshape((nrows, ncols))
+        # Integer grid only if all the tokens are written as integers, e.g., no '1.0'.
+        if _NON_INTEGER_TOKEN.search(body) or _NON_INTEGER_TOKEN.search(nodata_token):
+            data = data.astype(numpy.float32)
+            datatype = GDT_Float32
+        else:
+            data = data.astype(numpy.int32)
+            datatype = GDT_Int32
+        geotrans = [x_min, dx, 0., y_min + nrows * dx, 0., -dx]
+        return Raster(nrows, ncols, data, nodata_value, geotrans, osr_SpatialReference(),
+                      datatype, lazy=True)
+
+    @staticmethod
+    def raster_to_gtiff(tif, geotif, change_nodata=False, change_gdal_type=False):
+        """Converting Raster format to GeoTIFF.
+
+        Args:
+            tif: source raster file path.
+            geotif: output raster file path.
+            change_nodata: change NoDataValue to -9999 or not.
+            gdal_type (:obj:`pygeoc.raster.GDALDataType`): GDT_Float32 as default.
+            change_gdal_type: If True, output the Float32 data type.
+        """
+        rst_file = RasterUtilClass.read_raster(tif, lazy=True)
+        nodata = rst_file.noDataValue
+        data = rst_file.data
+        if change_nodata:
+            if not MathClass.floatequal(rst_file.noDataValue, DEFAULT_NODATA):
+                nodata = DEFAULT_NODATA
+                # Do not modify in-place since the data may be shared by raster cache
+                data = numpy.where(numpy.isclose(data, rst_file.noDataValue),
+                                   DEFAULT_NODATA, data).astype(data.dtype)
+        gdal_type = rst_file.dataType
+        if change_gdal_type:
+            gdal_type = GDT_Float32
+        RasterUtilClass.write_gtiff_file(geotif, rst_file.nRows, rst_file.nCols, data,
+                                         rst_file.geotrans, rst_file.srs, nodata,
+                                         gdal_type)
+
+    @staticmethod
+    def raster_to_asc(raster_f, asc_f, precision=None):
+        """Converting Raster format to ASCII raster.
+
+        Args:
+            raster_f: raster file.
+            asc_f: output ASCII file.
+            precision: decimal places of floating point values, see `write_asc_file`.
+        """
+        raster_r = RasterUtilClass.read_raster(raster_f, lazy=True)
+        RasterUtilClass.write_asc_file(asc_f, raster_r.data, raster_r.nCols, raster_r.nRows,
+                                       raster_r.geotrans, raster_r.noDataValue, precision)
+
+    @staticmethod
+    def iter_valid_values(raster_files, band_num=1, block_shape=None, approx=False):
+        """Iterate valid values (i.e., neither nodata nor NaN) of rasters block by block.
+
+        Args:
+            raster_files: raster file path or list of raster file paths.
+            band_num: band number, 1 as default.
+            block_shape: (rows, cols) of the expected block, see `get_block_shape`.
+            approx: If True, read the overview (see `read_overview`) rather than blocks.
+
+        Yields:
+            1D array of valid values of each block.
+        """
+        if is_string(raster_files):
+            raster_files = [raster_files]
+        for raster_file in raster_files:
+            ds = gdal_Open(raster_file)
+            nodata = ds.GetRasterBand(band_num).GetNoDataValue()
+            ds = None
+            if approx:
+                blocks = [RasterUtilClass.read_overview(raster_file, band_num=band_num)]
+            else:
+                blocks = (blk for _, blk in RasterUtilClass.iter_blocks(raster_file, block_shape,
+                                                                       band_num=band_num))
+            for blk in blocks:
+                valid = numpy.ones(blk.shape, dtype=bool) if nodata is None else blk != nodata
+                if blk.dtype.kind == 'f':
+                    valid &= ~numpy.isnan(blk)
+                yield blk[valid]
+
+    @staticmethod
+    def read_overview(raster_file, max_cells=BLOCK_CELLS, band_num=1):
+        """Read the finest overview with at most `max_cells` cells as a quick look.
+
+        If there is no overview (see `build_overviews`) or even the coarsest overview has more
+        than `max_cells` cells, the raster (or the coarsest overview) is read by decimation.
+
+        Args:
+            raster_file: raster file path.
+            max_cells: maximum cells count of the returned array, `BLOCK_CELLS` as default.
+            band_num: band number, 1 as default.
+
+        Returns:
+            2D array.
+        """
+        ds = gdal_Open(raster_file)
+        band = ds.GetRasterBand(band_num)
+        selected = band
+        if band.XSize * band.YSize > max_cells and band.GetOverviewCount() > 0:
+            overviews = [band.GetOverview(i) for i in range(band.GetOverviewCount())]
+            overviews.sort(key=lambda ovr: ovr.XSize * ovr.YSize)
+            selected = overviews[0]
+            for ovr in overviews:
+                if ovr.XSize * ovr.YSize <= max_cells:
+                    selected = ovr
+        if selected.XSize * selected.YSize <= max_cells:
+            data = selected.ReadAsArray()
+        else:
+            factor = (float(selected.XSize * selected.YSize) / max(max_cells, 1)) ** 0.5
+            data = selected.ReadAsArray(0, 0, selected.XSize, selected.YSize,
+                                        buf_xsize=max(1, int(selected.XSize / factor)),
+                                        buf_ysize=max(1, int(selected.YSize / factor)))
+        selected = None
+        band = None
+        ds = None
+        return data
+
+    @staticmethod
+    def build_overviews(raster_file, levels=None, resampling='AVERAGE', external=False):
+        """Build overviews (i.e., pyramids) of raster.
+
+        Args:
+            raster_file: raster file path.
+            levels: list of decimation factors, e.g., [2, 4, 8]. None as default to use
+                    powers of 2 until the overview is smaller than `OVERVIEW_MIN_SIZE`.
+            resampling: 'NEAREST', 'AVERAGE' (default), 'MODE', etc. Use 'NEAREST' or 'MODE'
+                        for categorical rasters such as flow direction and subbasin.
+            external: If True, build external overviews (.ovr) without modifying the raster.
+
+        Returns:
+            list of decimation factors.
+        """
+        ds = gdal_Open(raster_file, GA_ReadOnly if external else GA_Update)
+        if ds is None:
+            raise IOError('Cannot open %s!' % raster_file)
+        if levels is None:
+            levels = list()
+            factor = 2
+            while min(ds.RasterXSize, ds.RasterYSize) // factor >= OVERVIEW_MIN_SIZE:
+                levels.append(factor)
+                factor *= 2
+            if not levels:
+                levels = [2]
+        ds.BuildOverviews(str(resampling.upper()), levels)
+        ds = None
+        RasterUtilClass.invalidate_raster_cache(raster_file)
+        return levels
+
+    @staticmethod
+    def create_cog(src_ds, f_name, gdal_type=GDT_Float32, options=None, resampling='AVERAGE'):
+        """Copy dataset as Cloud Optimized GeoTiff (COG) with internal overviews.
+
+        The COG driver (GDAL>=3.1) is preferred, otherwise the overviews are built on the
+        source dataset and copied by GTiff driver with `COPY_SRC_OVERVIEWS=YES`.
+
+        Args:
+            src_ds: source GDAL dataset, e.g., in MEM driver.
+            f_name: output COG file name.
+            gdal_type (:obj:`pygeoc.raster.GDALDataType`): datatype for predictor option.
+            options: profile name in `GTIFF_PROFILES` or list of GeoTiff creation options,
+                     None as default to use the default profile.
+            resampling: resampling method of overviews, 'AVERAGE' as default.
+
+        Returns:
+            True if succeed.
+        """
+        options = RasterUtilClass.get_creation_options(options, gdal_type)
+        driver = gdal_GetDriverByName(str('COG'))
+        if driver is not None:
+            cog_options = list()
+            for opt in options:
+                key = opt.split('=')[0].upper()
+                if key in ['TILED', 'BLOCKXSIZE', 'BLOCKYSIZE', 'INTERLEAVE']:
+                    continue
+                cog_options.append('PREDICTOR=YES' if key == 'PREDICTOR' else opt)
+            cog_options.append(str('RESAMPLING=%s' % resampling.upper()))
+        else:
+            driver = gdal_GetDriverByName(str('GTiff'))
+            cog_options = [opt for opt in options if not opt.upper().startswith('TILED')]
+            cog_options += ['TILED=YES', 'COPY_SRC_OVERVIEWS=YES']
+            factor = 2
+            levels = list()
+            while min(src_ds.RasterXSize, src_ds.RasterYSize) // factor >= OVERVIEW_MIN_SIZE:
+                levels.append(factor)
+                factor *= 2
+            src_ds.BuildOverviews(str(resampling.upper()), levels or [2])
+        dst_ds = driver.CreateCopy(f_name, src_ds, options=[str(opt) for opt in cog_options])
+        if dst_ds is None:
+            return False
+        dst_ds = None
+        return True
+
+    @staticmethod
+    def compute_statistics(raster_files, bins=None, percentiles=None, band_num=1,
+                           block_shape=None, cache=None, approx=False):
+        """Compute statistics of one or more rasters by streaming blocks.
+
+        The whole raster is never loaded in memory. If histogram or percentiles are required,
+        the rasters are scanned twice, i.e., value range firstly, then the histogram.
+
+        Args:
+            raster_files: raster file path, or list of raster file paths to compute the
+                          statistics of all valid values of them (e.g., tiles).
+            bins: number of histogram bins, None as default. If `percentiles` is specified,
+                  1000 bins will be used by default.
+            percentiles: sequence of percentiles in [0, 100], e.g., [5, 50, 95].
+            band_num: band number, 1 as default.
+            block_shape: (rows, cols) of the expected block, see `get_block_shape`.
+            cache: True to use the default `RasterStatsCache`, or an instance of it,
+                   None (default) or False to compute without cache.
+            approx: If True, compute from the overview (see `read_overview`) for a quick look.
+
+        Returns:
+            dict, see `RasterStatistics.to_dict`.
+        """
+        if is_string(raster_files):
+            raster_files = [raster_files]
+        if percentiles and bins is None:
+            bins = 1000
+        if cache is True:
+            cache = RasterStatsCache()
+        signature = 'band=%d;bins=%s;percentiles=%s' % (band_num, repr(bins),
+                                                         repr([float(q) for q in
+                                                               percentiles or []]))
+        if approx:
+            signature += ';approx'
+        if cache:
+            stats = cache.get(raster_files, signature)
+            if stats is not None:
+                return stats
+        acc = RasterStatistics()
+        for values in RasterUtilClass.iter_valid_values(raster_files, band_num, block_shape,
+                                                        approx):
+            acc.update(values)
+        if bins is not None and acc.count > 0:
+            value_range = (acc.min, acc.max)
+            if acc.min == acc.max:
+                value_range = (acc.min - 0.5, acc.max + 0.5)
+            acc.set_histogram(bins, value_range)
+            for values in RasterUtilClass.iter_valid_values(raster_files, band_num,
+                                                            block_shape, approx):
+                acc.update_histogram(values)
+        stats = acc.to_dict(percentiles)
+        if cache:
+            cache.put(raster_files, stats, signature)
+        return stats
+
+    @staticmethod
+    def zonal_stats(zone_raster, value_rasters, stats=('count', 'sum', 'mean', 'min', 'max'),
+                    block_shape=None):
+        """Statistics of value rasters in each zone (e.g., subbasin or hillslope) in one pass.
+
+        The rasters are read block by block. In each block, the cells are grouped by the
+        sorted zone IDs, and the statistics are computed by `numpy.bincount` and
+        `numpy.ufunc.reduceat`, then merged into the table of all zones.
+
+        Args:
+            zone_raster: zone raster file path, e.g., subbasinTauM.tif. Cells with nodata
+                         are excluded.
+            value_rasters: value raster file path, list of paths, or dict of names and paths.
+                           All rasters should have the same extent with the zone raster.
+            stats: statistics to be computed, including 'count', 'sum', 'mean', 'min',
+                   'max', and 'std' (population standard deviation).
+            block_shape: (rows, cols) of the expected block, see `get_block_shape`.
+
+        Returns:
+            dict of 1D arrays, i.e., 'zone' (sorted zone IDs) and '<name>_<stat>', where name
+            is the key of `value_rasters` dict or the core file name of value raster.
+            Statistics of zones without valid values are NaN, except 'count' is 0.
+        """
+        for stat in stats:
+            if stat not in ['count', 'sum', 'mean', 'min', 'max', 'std']:
+                raise ValueError('Unsupported statistics: %s!' % stat)
+        if is_string(value_rasters):
+            value_rasters = [value_rasters]
+        if isinstance(value_rasters, dict):
+            names = list(value_rasters.keys())
+            paths = [value_rasters[k] for k in names]
+        else:
+            paths = list(value_rasters)
+            names = [FileClass.get_core_name_without_suffix(f) for f in paths]
+        zone_header = RasterUtilClass.read_raster_header(zone_raster)
+        value_nodatas = list()
+        for path in paths:
+            header = RasterUtilClass.read_raster_header(path)
+            if header.nRows != zone_header.nRows or header.nCols != zone_header.nCols:
+                raise ValueError('The shape of %s is different from %s!' % (path, zone_raster))
+            value_nodatas.append(header.noDataValue)
+        zones = numpy.zeros(0, dtype=numpy.float64)
+        # count, mean, m2, min, max of each value raster
+        accs = [[numpy.zeros(0, dtype=numpy.int64)] + [numpy.zeros(0)] * 4 for _ in paths]
+        block_shape = RasterUtilClass.get_block_shape(zone_raster, block_shape)
+        zone_ds = gdal_Open(zone_raster)
+        zone_band = zone_ds.GetRasterBand(1)
+        value_dss = [gdal_Open(path) for path in paths]
+        value_bands = [ds.GetRasterBand(1) for ds in value_dss]
+        for win in RasterUtilClass.get_block_windows(zone_header.nRows, zone_header.nCols,
+                                                     block_shape):
+            zone_blk = zone_band.ReadAsArray(win.xoff, win.yoff, win.xsize, win.ysize)
+            zone_valid = zone_blk != zone_header.noDataValue
+            if zone_blk.dtype.kind == 'f':
+                zone_valid &= ~numpy.isnan(zone_blk)
+            if not zone_valid.any():
+                continue
+            blk_zones, inverse = numpy.unique(zone_blk[zone_valid], return_inverse=True)
+            inverse = inverse.reshape(-1)
+            if numpy.setdiff1d(blk_zones, zones, assume_unique=True).size > 0:
+                new_zones = numpy.union1d(zones, blk_zones)
+                pos = numpy.searchsorted(new_zones, zones)
+                for acc in accs:
+                    for k, init in enumerate([0, 0., 0., numpy.inf, -numpy.inf]):
+                        expanded = numpy.full(new_zones.size, init, dtype=acc[k].dtype)
+                        expanded[pos] = acc[k]
+                        acc[k] = expanded
+                zones = new_zones
+            pos = numpy.searchsorted(zones, blk_zones)
+            for band, nodata, acc in zip(value_bands, value_nodatas, accs):
+                values = band.ReadAsArray(win.xoff, win.yoff, win.xsize,
+                                          win.ysize)[zone_valid].astype(numpy.float64)
+                groups = inverse
+                valid = ~numpy.isnan(values)
+                if nodata is not None:
+                    valid &= values != nodata
+                if not valid.all():
+                    values = values[valid]
+                    groups = groups[valid]
+                if values.size == 0:
+                    continue
+                nzones = blk_zones.size
+                cnt = numpy.bincount(groups, minlength=nzones)
+                has = cnt > 0
+                mean = numpy.bincount(groups, weights=values, minlength=nzones)
+                mean[has] /= cnt[has]
+                m2 = numpy.bincount(groups, weights=numpy.square(values - mean[groups]),
+                                    minlength=nzones)
+                order = numpy.argsort(groups, kind='mergesort')
+                sorted_values = values[order]
+                starts = numpy.searchsorted(groups[order], numpy.flatnonzero(has))
+                minv = numpy.full(nzones, numpy.inf)
+                maxv = numpy.full(nzones, -numpy.inf)
+                minv[has] = numpy.minimum.reduceat(sorted_values, starts)
+                maxv[has] = numpy.maximum.reduceat(sorted_values, starts)
+                # merge into the accumulators of all zones, see `RasterStatistics`
+                old_cnt = acc[0][pos]
+                total = old_cnt + cnt
+                nonzero = total > 0
+                delta = mean - acc[1][pos]
+                ratio = numpy.zeros(nzones)
+                ratio[nonzero] = cnt[nonzero] / total[nonzero].astype(numpy.float64)
+                acc[1][pos] += delta * ratio
+                acc[2][pos] += m2 + delta * delta * old_cnt * ratio
+                acc[0][pos] = total
+                acc[3][pos] = numpy.minimum(acc[3][pos], minv)
+                acc[4][pos] = numpy.maximum(acc[4][pos], maxv)
+        zone_band = None
+        zone_ds = None
+        value_bands = None
+        value_dss = None
+        if zone_header.dataType in [GDT_Byte, GDT_UInt16, GDT_Int16, GDT_UInt32, GDT_Int32]:
+            zones = zones.astype(numpy.int64)
+        table = {'zone': zones}
+        for name, (cnt, mean, m2, minv, maxv) in zip(names, accs):
+            empty = cnt == 0
+            for stat in stats:
+                if stat == 'count':
+                    table['%s_count' % name] = cnt
+                    continue
+                elif stat == 'sum':
+                    values = mean * cnt
+                elif stat == 'mean':
+                    values = mean.copy()
+                elif stat == 'min':
+                    values = minv.copy()
+                elif stat == 'max':
+                    values = maxv.copy()
+                else:
+                    values = numpy.sqrt(m2 / numpy.maximum(cnt, 1))
+                values[empty] = numpy.nan
+                table['%s_%s' % (name, stat)] = values
+        return table
+
+    @staticmethod
+    def raster_statistics(raster_file, cache=False, approx=False):
+        """Get basic statistics of raster data.
+
+        Args:
+            raster_file: raster file path.
+            cache: True to use the default `RasterStatsCache`, or an instance of it,
+                   False (default) to compute without cache.
+            approx: If True, compute from the overview for a quick look, which is fast
+                    for huge raster with overviews, see `build_overviews`.
+
+        Returns:
+            min, max, mean, std.
+        """
+        stats = RasterUtilClass.compute_statistics(raster_file, cache=cache, approx=approx)
+        return stats['min'], stats['max'], stats['mean'], stats['std']
+
+    @staticmethod
+    def split_raster(rs, split_shp, field_name, temp_dir, processes=1, crop_to_bbox=False):
+        """Split raster by given shapefile and field name.
+
+        Each pair of feature and raster is warped by `gdal.Warp` in-process with the cutline
+        filtered by SQL where clause, and the pairs are distributed to a process pool.
+
+        Args:
+            rs: origin raster files.
+            split_shp: boundary (ESRI Shapefile) used to spilt raster.
+            field_name: field name identify the spilt value.
+            temp_dir: directory to store the spilt rasters.
+            processes: number of processes, 1 (default) means run sequentially in-process.
+            crop_to_bbox: crop raster by the bounding box of each feature through windowed
+                          reading rather than the cutline, which is much faster when
+                          the cells outside the feature polygon are acceptable.
+
+        Returns:
+            list of output raster files which are created successfully, e.g., the rasters
+            not intersecting with a feature are excluded.
+        """
+        UtilClass.rmmkdir(temp_dir)
+        if is_string(rs):
+            rs = [rs]
+        # resolved in this process since the default profile is not inherited by spawned
+        # workers, and the predictor depends on the datatype of each raster
+        options = dict((r, RasterUtilClass.get_creation_options(
+            None, RasterUtilClass.read_raster_header(r).dataType)) for r in rs)
+        ds = ogr_Open(split_shp)
+        lyr = ds.GetLayer(0)
+        lyr.ResetReading()
+        tasks = list()
+        ft = lyr.GetNextFeature()
+        while ft:
+            cur_field_name = ft.GetFieldAsString(field_name)
+            envelope = None
+            if crop_to_bbox:
+                envelope = tuple(ft.GetGeometryRef().GetEnvelope())
+            for r in rs:
+                cur_file_name = r.split(os.sep)[-1]
+                outraster = temp_dir + os.sep + \
+                            cur_file_name.replace('.tif', '_%s.tif' %
+                                                  cur_field_name.replace(' ', '_'))
+                tasks.append((r, outraster, split_shp, field_name, cur_field_name, envelope,
+                              options[r]))
+            ft = lyr.GetNextFeature()
+        ds = None
+        if processes > 1 and len(tasks) > 1:
+            pool = Pool(processes)
+            try:
+                results = pool.map(_split_raster_worker, tasks,
+                                   chunksize=max(1, len(tasks) // (processes * 4)))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_split_raster_worker(task) for task in tasks]
+        return [task[1] for task, succeed in zip(tasks, results) if succeed]
+
+    @staticmethod
+    def crop_raster_by_extent(in_raster, out_raster, extent, nodata_value=DEFAULT_NODATA,
+                              options=None):
+        """Crop raster by the given extent through windowed reading.
+
+        Args:
+            in_raster: input raster file.
+            out_raster: output raster file.
+            extent: (min_x, max_x, min_y, max_y), e.g., `ogr.Geometry.GetEnvelope()`.
+            nodata_value: nodata value of the output raster, the nodata of input will be
+                          replaced by it if the datatype of input can represent it.
+            options: GeoTiff creation options, see `write_gtiff_file`.
+
+        Returns:
+            True if succeed, False if the extent does not intersect with the raster.
+        """
+        header = RasterUtilClass.read_raster_header(in_raster)
+        min_x, max_x, min_y, max_y = extent
+        dx, dy = header.geotrans[1], header.geotrans[5]
+        col_min = int(numpy.floor((min_x - header.xMin) / dx))
+        col_max = int(numpy.ceil((max_x - header.xMin) / dx))
+        row_min = int(numpy.floor((max_y - header.yMax) / dy))
+        row_max = int(numpy.ceil((min_y - header.yMax) / dy))
+        col_min, row_min = max(col_min, 0), max(row_min, 0)
+        col_max, row_max = min(col_max, header.nCols), min(row_max, header.nRows)
+        if col_min >= col_max or row_min >= row_max:
+            return False
+        rst = RasterUtilClass.read_raster(in_raster, lazy=True,
+                                          window=(col_min, row_min, col_max - col_min,
+                                                  row_max - row_min))
+        data = rst.data
+        dtype = data.dtype
+        if dtype.kind == 'f' or (dtype.kind == 'i' and numpy.iinfo(dtype).min <= nodata_value):
+            if rst.noDataValue is not None:
+                data = numpy.where(data == rst.noDataValue, nodata_value, data).astype(dtype)
+        else:
+            nodata_value = rst.noDataValue
+        RasterUtilClass.write_gtiff_file(out_raster, rst.nRows, rst.nCols, data, rst.geotrans,
+                                         rst.srs, nodata_value, rst.dataType, options)
+        return True
+
+    @staticmethod
+    def get_negative_dem(raw_dem, neg_dem):
+        """Get negative DEM data."""
+        origin = RasterUtilClass.read_raster_header(raw_dem)
+        max_v = RasterUtilClass.compute_statistics(raw_dem)['max']
+        RasterCalculator({'dem': raw_dem}, 'where(dem < 0, nodata, max_v - dem)',
+                         origin.noDataValue, origin.dataType,
+                         variables={'max_v': max_v, 'nodata': origin.noDataValue}).run(neg_dem)
+
+    @staticmethod
+    def mask_raster(in_raster, mask, out_raster, max_workers=1):
+        """
         Mask raster data.
         Args:
             in_raster: list or one raster
             mask: Mask raster data
             out_raster: list or one raster
+            max_workers: maximum number of threads to mask rasters concurrently,
+                         1 as default, see `_thread_map`.
 
         """
         if is_string(in_raster) and is_string(out_raster):
@@ -558,31 +2751,343 @@ class RasterUtilClass(object):
         if len(in_raster) != len(out_raster):
             raise RuntimeError('input raster and output raster must have the same size.')
 
-        maskr = RasterUtilClass.read_raster(mask)
+        maskr = RasterUtilClass.read_raster(mask, lazy=True)
+        temp = maskr.data == maskr.noDataValue
+        RasterUtilClass._thread_map(RasterUtilClass._mask_raster_file,
+                                    [(inr, outr, maskr, temp)
+                                     for inr, outr in zip(in_raster, out_raster)],
+                                    max_workers)
+
+    @staticmethod
+    def _mask_raster_file(inr, outr, maskr, temp):
+        """Mask one raster file by the mask Raster and its nodata cells `temp`."""
         rows = maskr.nRows
         cols = maskr.nCols
-        maskdata = maskr.data
-        temp = maskdata == maskr.noDataValue
-        for inr, outr in zip(in_raster, out_raster):
-            origin = RasterUtilClass.read_raster(inr)
-            if origin.nRows == rows and origin.nCols == cols:
-                masked = numpy.where(temp, origin.noDataValue, origin.data)
+        origin = RasterUtilClass.read_raster_header(inr)
+        if origin.nRows == rows and origin.nCols == cols:
+            origin = RasterUtilClass.read_raster(inr, lazy=True)
+            masked = numpy.where(temp, origin.noDataValue, origin.data)
+        else:
+            masked = numpy.ones((rows, cols)) * origin.noDataValue
+            offset = RasterUtilClass.get_grid_offset(maskr, origin)
+            if offset is not None:
+                # grids share the cell size, read the overlapped window only
+                row_off, col_off = offset
+                row_beg = max(0, -row_off)
+                row_end = min(rows, origin.nRows - row_off)
+                col_beg = max(0, -col_off)
+                col_end = min(cols, origin.nCols - col_off)
+                if row_beg < row_end and col_beg < col_end:
+                    window = (col_beg + col_off, row_beg + row_off,
+                              col_end - col_beg, row_end - row_beg)
+                    origin = RasterUtilClass.read_raster(inr, lazy=True, window=window)
+                    masked[row_beg:row_end, col_beg:col_end] = origin.data
+            else:
+                # misaligned grids, resample by the nearest cell of each cell center
+                origin = RasterUtilClass.read_raster(inr, lazy=True)
+                row_idx, col_idx = RasterUtilClass.get_nearest_indexes(maskr, origin)
+                valid_rows = row_idx >= 0
+                valid_cols = col_idx >= 0
+                masked[numpy.ix_(valid_rows, valid_cols)] = \
+                    origin.data[numpy.ix_(row_idx[valid_rows], col_idx[valid_cols])]
+            masked[temp] = origin.noDataValue
+        RasterUtilClass.write_gtiff_file(outr, rows, cols, masked,
+                                         maskr.geotrans, maskr.srs,
+                                         origin.noDataValue, origin.dataType)
+
+    @staticmethod
+    def get_grid_offset(dst, src):
+        """Get the row and col offset of the destination grid in the source grid.
+
+        Examples:
+            >>> dst = Raster(2, 2, None, -9999., [12., 2., 0, 46., 0, -2.], lazy=True)
+            >>> src = Raster(9, 8, None, -9999., [10., 2., 0, 50., 0, -2.], lazy=True)
+            >>> RasterUtilClass.get_grid_offset(dst, src)
+            (2, 1)
+            >>> dst.xMin = 11.
+            >>> RasterUtilClass.get_grid_offset(dst, src) is None
+            True
+
+        Args:
+            dst: destination Raster object, `data` is not required.
+            src: source Raster object, `data` is not required.
+
+        Returns:
+            (row_offset, col_offset) if the two grids share the same cell size and are
+            aligned, otherwise None.
+        """
+        if not MathClass.floatequal(dst.dx, src.dx) or \
+                not MathClass.floatequal(dst.geotrans[5], src.geotrans[5]):
+            return None
+        col_off = (dst.xMin - src.xMin) / src.dx
+        row_off = (src.yMax - dst.yMax) / src.dx
+        if abs(col_off - round(col_off)) > DELTA or abs(row_off - round(row_off)) > DELTA:
+            return None
+        return int(round(row_off)), int(round(col_off))
+
+    @staticmethod
+    def get_nearest_indexes(dst, src):
+        """Get the row and col indexes of source cells that covers the destination cell centers.
+
+        Args:
+            dst: destination Raster object, `data` is not required.
+            src: source Raster object, `data` is not required.
+
+        Returns:
+            1D arrays of row indexes and col indexes, -1 for cell centers out of the source.
+        """
+        ys = dst.yMax - (numpy.arange(dst.nRows) + 0.5) * dst.dx
+        xs = dst.xMin + (numpy.arange(dst.nCols) + 0.5) * dst.dx
+        row_idx = src.nRows - numpy.ceil((ys - src.yMin) / src.dx).astype(numpy.int64)
+        col_idx = numpy.floor((xs - src.xMin) / src.dx).astype(numpy.int64)
+        row_idx[(ys < src.yMin) | (ys > src.yMax) | (row_idx < 0) | (row_idx >= src.nRows)] = -1
+        col_idx[(xs < src.xMin) | (xs > src.xMax) | (col_idx < 0) | (col_idx >= src.nCols)] = -1
+        return row_idx, col_idx
+
+    @staticmethod
+    def align_to(reference, inputs, outputs=None, method='nearest', engine=None,
+                 memory_limit=None, options=None):
+        """Align (i.e., resample) rasters onto the grid of the reference raster.
+
+        Two engines are available:
+
+        - 'numpy': the index math is vectorized by numpy, which requires the same
+          spatial reference and north-up geotransform of the inputs and reference.
+          Only the window of input covering the reference extent is read.
+        - 'gdal': `gdal.Warp` in-process with multithreaded warping and memory limit,
+          which supports reprojection.
+
+        Args:
+            reference: reference raster file path or Raster object (`data` is not required),
+                       of which the geometry is read only once.
+            inputs: raster file path or list of raster file paths.
+            outputs: output raster file path or list of paths with the same length of
+                     `inputs`. None as default to return Raster objects in memory.
+            method: resampling method, 'nearest' (default), 'bilinear', 'mode', or 'average'.
+                    The cells with nodata are ignored in 'bilinear', 'mode', and 'average'.
+            engine: 'numpy', 'gdal', or None (default) to use 'numpy' if possible.
+            memory_limit: working memory limit (MB) of `gdal.Warp`, None as default.
+            options: profile name in `GTIFF_PROFILES` or list of GeoTiff creation options,
+                     None as default to use the default profile.
+
+        Returns:
+            Output path or Raster object, or a list of them if `inputs` is a list.
+        """
+        method = method.lower()
+        if method not in ['nearest', 'bilinear', 'mode', 'average']:
+            raise ValueError('The resampling method should be nearest, bilinear, mode, '
+                             'or average!')
+        if is_string(reference):
+            reference = RasterUtilClass.read_raster_header(reference)
+        single = is_string(inputs)
+        if single:
+            inputs = [inputs]
+            outputs = None if outputs is None else [outputs]
+        if outputs is not None and len(inputs) != len(outputs):
+            raise ValueError('Inputs and outputs must have the same size!')
+        ref_wkt = RasterUtilClass._get_wkt(reference.srs)
+        results = list()
+        for i, inr in enumerate(inputs):
+            outr = None if outputs is None else outputs[i]
+            header = RasterUtilClass.read_raster_header(inr)
+            cur_engine = engine
+            if cur_engine is None:
+                cur_engine = 'numpy'
+                if header.geotrans[2] != 0 or header.geotrans[4] != 0 or \
+                        reference.geotrans[2] != 0 or reference.geotrans[4] != 0:
+                    cur_engine = 'gdal'
+                else:
+                    wkt = RasterUtilClass._get_wkt(header.srs)
+                    if wkt and ref_wkt and not header.srs.IsSame(reference.srs):
+                        cur_engine = 'gdal'
+            if cur_engine == 'gdal':
+                rst = RasterUtilClass._warp_to(reference, inr, outr, method, header,
+                                               memory_limit, options)
             else:
-                masked = numpy.ones((rows, cols)) * origin.noDataValue
-                # TODO, the following loop should be optimized by numpy or numba
-                for i in range(rows):
-                    for j in range(cols):
-                        if maskdata[i][j] == maskr.noDataValue:
-                            continue
-                        # get the center point coordinate of current cell
-                        tempx, tempy = maskr.get_central_coors(i, j)
-                        tempv = origin.get_value_by_xy(tempx, tempy)
-                        if tempv is None:
-                            continue
-                        masked[i][j] = tempv
-            RasterUtilClass.write_gtiff_file(outr, maskr.nRows, maskr.nCols, masked,
-                                             maskr.geotrans, maskr.srs,
-                                             origin.noDataValue, origin.dataType)
+                window = RasterUtilClass.get_overlap_window(reference, header)
+                if window is None:
+                    data = numpy.full((reference.nRows, reference.nCols),
+                                      header.noDataValue, dtype=GDALNumpyType.get(
+                                          header.dataType, numpy.float64))
+                else:
+                    src = RasterUtilClass.read_raster(inr, lazy=True, window=window)
+                    data = RasterUtilClass.resample_data(reference, src, method)
+                rst = Raster(reference.nRows, reference.nCols, data, header.noDataValue,
+                             list(reference.geotrans), reference.srs, header.dataType,
+                             lazy=True)
+                if outr is not None:
+                    RasterUtilClass.write_gtiff_file(outr, rst.nRows, rst.nCols, rst.data,
+                                                     rst.geotrans, rst.srs, rst.noDataValue,
+                                                     rst.dataType, options)
+            results.append(rst if outr is None else outr)
+        return results[0] if single else results
+
+    @staticmethod
+    def _get_wkt(srs):
+        """WKT of spatial reference object or string, '' if unknown."""
+        if srs is None:
+            return ''
+        if is_string(srs):
+            return srs
+        try:
+            return srs.ExportToWkt() or ''
+        except Exception:
+            return ''
+
+    @staticmethod
+    def _warp_to(reference, in_raster, out_raster, method, header, memory_limit, options):
+        """Resample by `gdal.Warp`, return the out_raster or Raster object."""
+        kwargs = {'outputBounds': (reference.xMin, reference.yMin,
+                                   reference.xMax, reference.yMax),
+                  'width': reference.nCols, 'height': reference.nRows,
+                  'resampleAlg': str(method), 'dstNodata': header.noDataValue,
+                  'multithread': True, 'warpOptions': [str('NUM_THREADS=ALL_CPUS')]}
+        ref_wkt = RasterUtilClass._get_wkt(reference.srs)
+        if ref_wkt:
+            kwargs['dstSRS'] = ref_wkt
+        if memory_limit is not None:
+            kwargs['warpMemoryLimit'] = memory_limit
+        if out_raster is None:
+            ds = gdal_Warp('', in_raster, format=str('MEM'), **kwargs)
+            if ds is None:
+                raise IOError('Failed to warp %s!' % in_raster)
+            data = ds.GetRasterBand(1).ReadAsArray()
+            ds = None
+            return Raster(reference.nRows, reference.nCols, data, header.noDataValue,
+                          list(reference.geotrans), reference.srs, header.dataType, lazy=True)
+        if not FileClass.is_vsi_path(out_raster):
+            UtilClass.mkdir(os.path.dirname(FileClass.get_file_fullpath(out_raster)))
+            RasterUtilClass.invalidate_raster_cache(out_raster)
+        kwargs['creationOptions'] = RasterUtilClass.get_creation_options(options,
+                                                                         header.dataType)
+        ds = gdal_Warp(out_raster, in_raster, format=str('GTiff'), **kwargs)
+        ds = None
+        return out_raster
+
+    @staticmethod
+    def get_overlap_window(dst, src, margin=1):
+        """Get the window of source raster that covers the extent of destination raster.
+
+        Args:
+            dst: destination Raster object, `data` is not required.
+            src: source Raster object, `data` is not required.
+            margin: cells extended around the window, e.g., for bilinear interpolation.
+
+        Returns:
+            (xoff, yoff, xsize, ysize) of the source, None if not overlapped.
+        """
+        col_beg = int(numpy.floor((dst.xMin - src.xMin) / src.geotrans[1])) - margin
+        col_end = int(numpy.ceil((dst.xMax - src.xMin) / src.geotrans[1])) + margin
+        row_beg = int(numpy.floor((dst.yMax - src.yMax) / src.geotrans[5])) - margin
+        row_end = int(numpy.ceil((dst.yMin - src.yMax) / src.geotrans[5])) + margin
+        col_beg, row_beg = max(col_beg, 0), max(row_beg, 0)
+        col_end, row_end = min(col_end, src.nCols), min(row_end, src.nRows)
+        if col_beg >= col_end or row_beg >= row_end:
+            return None
+        return col_beg, row_beg, col_end - col_beg, row_end - row_beg
+
+    @staticmethod
+    def resample_data(dst, src, method='nearest'):
+        """Resample the data of source raster onto the grid of destination raster by numpy.
+
+        Both of the grids should be north-up and in the same spatial reference.
+
+        Examples:
+            >>> src = Raster(2, 2, numpy.array([[1., 2.], [3., -9999.]]), -9999.,
+            ...              [0., 2., 0, 4., 0, -2.], lazy=True)
+            >>> dst = Raster(4, 4, None, -9999., [0., 1., 0, 4., 0, -1.], lazy=True)
+            >>> RasterUtilClass.resample_data(dst, src, 'nearest')[1:3].tolist()
+            [[1.0, 1.0, 2.0, 2.0], [3.0, 3.0, -9999.0, -9999.0]]
+            >>> RasterUtilClass.resample_data(dst, src, 'bilinear')[0].tolist()
+            [1.0, 1.25, 1.75, 2.0]
+            >>> dst = Raster(1, 1, None, -9999., [0., 4., 0, 4., 0, -4.], lazy=True)
+            >>> RasterUtilClass.resample_data(dst, src, 'average').tolist()
+            [[2.0]]
+
+        Args:
+            dst: destination Raster object, `data` is not required.
+            src: source Raster object.
+            method: 'nearest' (default), 'bilinear', 'mode', or 'average'.
+
+        Returns:
+            2D array with the shape of destination and the datatype of source.
+        """
+        data = src.data
+        nodata = src.noDataValue
+        sgt = src.geotrans
+        xs = dst.geotrans[0] + (numpy.arange(dst.nCols) + 0.5) * dst.geotrans[1]
+        ys = dst.geotrans[3] + (numpy.arange(dst.nRows) + 0.5) * dst.geotrans[5]
+        fcols = (xs - sgt[0]) / sgt[1]
+        frows = (ys - sgt[3]) / sgt[5]
+        inside_cols = (fcols >= 0) & (fcols <= src.nCols)
+        inside_rows = (frows >= 0) & (frows <= src.nRows)
+        cols = numpy.clip(numpy.floor(fcols).astype(numpy.int64), 0, src.nCols - 1)
+        rows = numpy.clip(numpy.floor(frows).astype(numpy.int64), 0, src.nRows - 1)
+        # nearest is the fallback of other methods, e.g., for cells without source centers
+        result = data[numpy.ix_(rows, cols)]
+        result[~(inside_rows[:, None] & inside_cols[None, :])] = nodata
+        if method == 'nearest':
+            return result
+        valid = data != nodata
+        if data.dtype.kind == 'f':
+            valid &= ~numpy.isnan(data)
+        if method == 'bilinear':
+            fcols = numpy.clip(fcols - 0.5, 0, src.nCols - 1)
+            frows = numpy.clip(frows - 0.5, 0, src.nRows - 1)
+            c0 = numpy.minimum(numpy.floor(fcols).astype(numpy.int64), src.nCols - 1)
+            r0 = numpy.minimum(numpy.floor(frows).astype(numpy.int64), src.nRows - 1)
+            c1 = numpy.minimum(c0 + 1, src.nCols - 1)
+            r1 = numpy.minimum(r0 + 1, src.nRows - 1)
+            wc = fcols - c0
+            wr = frows - r0
+            total = numpy.zeros(result.shape)
+            weights = numpy.zeros(result.shape)
+            for ridx, rw in [(r0, 1. - wr), (r1, wr)]:
+                for cidx, cw in [(c0, 1. - wc), (c1, wc)]:
+                    w = rw[:, None] * cw[None, :] * valid[numpy.ix_(ridx, cidx)]
+                    total += w * numpy.where(w > 0, data[numpy.ix_(ridx, cidx)], 0)
+                    weights += w
+            interpolated = weights > 0
+            values = total[interpolated] / weights[interpolated]
+            if data.dtype.kind != 'f':
+                values = numpy.round(values)
+            result[interpolated] = values.astype(data.dtype)
+            result[~interpolated & (result != nodata)] = nodata
+            result[~(inside_rows[:, None] & inside_cols[None, :])] = nodata
+            return result
+        # average or mode, aggregate the source cells whose centers fall in destination cells
+        src_xs = sgt[0] + (numpy.arange(src.nCols) + 0.5) * sgt[1]
+        src_ys = sgt[3] + (numpy.arange(src.nRows) + 0.5) * sgt[5]
+        dcols = numpy.floor((src_xs - dst.geotrans[0]) / dst.geotrans[1]).astype(numpy.int64)
+        drows = numpy.floor((src_ys - dst.geotrans[3]) / dst.geotrans[5]).astype(numpy.int64)
+        valid &= ((drows >= 0) & (drows < dst.nRows))[:, None]
+        valid &= ((dcols >= 0) & (dcols < dst.nCols))[None, :]
+        flat = (drows[:, None] * dst.nCols + dcols[None, :])[valid]
+        values = data[valid]
+        ncells = dst.nRows * dst.nCols
+        counts = numpy.bincount(flat, minlength=ncells)
+        covered = counts > 0
+        result = result.reshape(-1)
+        if method == 'average':
+            sums = numpy.bincount(flat, weights=values, minlength=ncells)
+            means = sums[covered] / counts[covered]
+            if data.dtype.kind != 'f':
+                means = numpy.round(means)
+            result[covered] = means.astype(data.dtype)
+        else:
+            order = numpy.lexsort((values, flat))
+            flat = flat[order]
+            values = values[order]
+            starts = numpy.flatnonzero(numpy.concatenate(([True], (flat[1:] != flat[:-1]) |
+                                                           (values[1:] != values[:-1]))))
+            pair_counts = numpy.diff(numpy.append(starts, flat.size))
+            pair_flat = flat[starts]
+            pair_values = values[starts]
+            # the most frequent value of each cell, the smallest one if equally frequent
+            order = numpy.lexsort((pair_values, -pair_counts, pair_flat))
+            first = numpy.concatenate(([True], pair_flat[order][1:] != pair_flat[order][:-1]))
+            result[pair_flat[order][first]] = pair_values[order][first]
+        return result.reshape(dst.nRows, dst.nCols)
 
     @staticmethod
     def raster_binarization(given_value, rasterfilename):
@@ -599,147 +3104,537 @@ class RasterUtilClass(object):
         Returns:
             binary_raster: Raster after binarization.
         """
-        origin_raster = RasterUtilClass.read_raster(rasterfilename)
+        origin_raster = RasterUtilClass.read_raster(rasterfilename, lazy=True)
         binary_raster = numpy.where(origin_raster.data == given_value, 1, 0)
         return binary_raster
 
     @staticmethod
-    def raster_erosion(rasterfile):
+    def get_structuring_element(shape='square', radius=1):
+        """Get structuring element of morphological operations.
+
+        Examples:
+            >>> RasterUtilClass.get_structuring_element('cross').astype(int)
+            array([[0, 1, 0],
+                   [1, 1, 1],
+                   [0, 1, 0]])
+            >>> RasterUtilClass.get_structuring_element('disk', 2).astype(int)
+            array([[0, 0, 1, 0, 0],
+                   [0, 1, 1, 1, 0],
+                   [1, 1, 1, 1, 1],
+                   [0, 1, 1, 1, 0],
+                   [0, 0, 1, 0, 0]])
+
+        Args:
+            shape: 'square' (default, i.e., 8-neighborhood when radius is 1),
+                   'cross' (i.e., 4-neighborhood when radius is 1), or 'disk'.
+            radius: radius in cells, 1 as default.
+
+        Returns:
+            2D boolean array with the shape of (2 * radius + 1, 2 * radius + 1).
+        """
+        drow, dcol = numpy.mgrid[-radius:radius + 1, -radius:radius + 1]
+        shape = shape.lower()
+        if shape == 'square':
+            return numpy.ones(drow.shape, dtype=bool)
+        elif shape == 'cross':
+            return (drow == 0) | (dcol == 0)
+        elif shape == 'disk':
+            return drow ** 2 + dcol ** 2 <= radius ** 2
+        raise ValueError('The structuring element should be one of square, cross, and disk!')
+
+    @staticmethod
+    def _get_data_and_nodata(rasterfile, nodata_value=None):
+        """Get the 2D array and nodata value from filename, Raster object, or numpy.ndarray."""
+        if is_string(rasterfile):
+            rasterfile = RasterUtilClass.read_raster(str(rasterfile), lazy=True)
+        if isinstance(rasterfile, Raster):
+            if nodata_value is None:
+                nodata_value = rasterfile.noDataValue
+            return rasterfile.data, nodata_value
+        elif isinstance(rasterfile, numpy.ndarray):
+            return rasterfile, nodata_value
+        raise TypeError('Your rasterfile has a wrong type. Type must be string or '
+                        'numpy.array or class Raster in pygeoc.')
+
+    @staticmethod
+    def morphology(data, operations, structure=None, nodata_value=None):
+        """Sequential morphological erosion and dilation based on sliding windows.
+
+        The padded buffer is allocated once and reused by all the operations. For each
+        operation, the minimum (erosion) or maximum (dilation) over the structuring element
+        is computed by shifted array views rather than loops over cells, and a full
+        rectangular structuring element is decomposed into rows and cols.
+
+        Examples:
+            >>> data = numpy.array([[0, 0, 0, 0, 0],
+            ...                     [0, 1, 1, 1, 0],
+            ...                     [0, 1, 1, 1, 0],
+            ...                     [0, 1, 1, 1, 1]])
+            >>> RasterUtilClass.morphology(data, ['erosion'])
+            array([[0, 0, 0, 0, 0],
+                   [0, 0, 0, 0, 0],
+                   [0, 0, 1, 0, 0],
+                   [0, 0, 1, 0, 0]])
+            >>> RasterUtilClass.morphology(data, ['erosion', 'dilation'])
+            array([[0, 0, 0, 0, 0],
+                   [0, 1, 1, 1, 0],
+                   [0, 1, 1, 1, 0],
+                   [0, 1, 1, 1, 0]])
+
+        Args:
+            data: 2D array.
+            operations: list of 'erosion' and 'dilation'.
+            structure: 2D boolean array of structuring element with odd rows and cols,
+                       see `get_structuring_element`. None as default for 3*3 square.
+            nodata_value: cells equal to nodata are skipped in the neighborhood and
+                          kept as nodata. None as default to consider all cells as valid.
+
+        Returns:
+            2D array with the same datatype as `data`.
+        """
+        data = numpy.asarray(data)
+        src_dtype = data.dtype
+        if structure is None:
+            structure = RasterUtilClass.get_structuring_element('square', 1)
+        structure = numpy.asarray(structure, dtype=bool)
+        nrows, ncols = data.shape
+        rrad = structure.shape[0] // 2
+        crad = structure.shape[1] // 2
+        if data.dtype.kind == 'f':
+            upper, lower = numpy.inf, -numpy.inf
+        elif data.dtype.kind == 'b':
+            data = data.astype(numpy.uint8)
+            upper, lower = 1, 0
+        else:
+            upper, lower = numpy.iinfo(data.dtype).max, numpy.iinfo(data.dtype).min
+        invalid = None
+        if nodata_value is not None:
+            invalid = data == nodata_value
+        separable = structure.all()
+        offsets = numpy.argwhere(structure)
+        padded = numpy.empty((nrows + 2 * rrad, ncols + 2 * crad), dtype=data.dtype)
+        interior = padded[rrad:rrad + nrows, crad:crad + ncols]
+        result = data
+        for operation in operations:
+            if operation == 'erosion':
+                fill, reduce_func = upper, numpy.minimum
+            elif operation == 'dilation':
+                fill, reduce_func = lower, numpy.maximum
+            else:
+                raise ValueError('Morphological operation should be erosion or dilation!')
+            padded.fill(fill)
+            interior[:] = result
+            if invalid is not None:
+                interior[invalid] = fill
+            if separable:
+                temp = padded[:, 0:ncols].copy()
+                for dc in range(1, structure.shape[1]):
+                    reduce_func(temp, padded[:, dc:dc + ncols], out=temp)
+                result = temp[0:nrows].copy()
+                for dr in range(1, structure.shape[0]):
+                    reduce_func(result, temp[dr:dr + nrows], out=result)
+            else:
+                result = padded[offsets[0][0]:offsets[0][0] + nrows,
+                                offsets[0][1]:offsets[0][1] + ncols].copy()
+                for dr, dc in offsets[1:]:
+                    reduce_func(result, padded[dr:dr + nrows, dc:dc + ncols], out=result)
+            if invalid is not None:
+                result[invalid] = nodata_value
+        if result is data:
+            result = numpy.copy(data)
+        return result.astype(src_dtype, copy=False)
+
+    @staticmethod
+    def raster_erosion(rasterfile, structure=None, nodata_value=None, iterations=1):
         """Erode the raster image.
 
-         Find the min pixel's value in 8-neighborhood. Then change the compute
-         pixel's value into the min pixel's value.
+         Find the min pixel's value in the neighborhood defined by structuring element (e.g.,
+         8-neighborhood by default). Then change the compute pixel's value into the min
+         pixel's value.
 
         Args:
             rasterfile: input original raster image, type can be filename(string,
             like "test1.tif"), rasterfile(class Raster) or numpy.ndarray.
+            structure: structuring element, see `get_structuring_element`. 3*3 square as default.
+            nodata_value: nodata value, which is the nodata of raster by default if the input is
+                          filename or Raster, otherwise None means no nodata.
+            iterations: times of erosion, 1 as default.
 
         Returns:
             erosion_raster: raster image after erosion, type is numpy.ndarray.
         """
-        if is_string(rasterfile):
-            origin_raster = RasterUtilClass.read_raster(str(rasterfile))
-        elif isinstance(rasterfile, Raster):
-            origin_raster = rasterfile.data
-        elif isinstance(rasterfile, numpy.ndarray):
-            origin_raster = rasterfile
-        else:
-            return "Your rasterfile has a wrong type. Type must be string or " \
-                   "numpy.array or class Raster in pygeoc."
-        max_value_raster = origin_raster.max()
-        erosion_raster = numpy.zeros((origin_raster.shape[0], origin_raster.shape[1]))
-        # In order to compute the raster edges, we need to expand the original
-        # raster's rows and cols. We need to add the edges whose pixels' value is
-        # the max pixel's value in raster.
-        add_row = numpy.full((1, origin_raster.shape[1]), max_value_raster)
-        temp_origin_raster = numpy.vstack((numpy.vstack((add_row, origin_raster)), add_row))
-        add_col = numpy.full((origin_raster.shape[0] + 2, 1), max_value_raster)
-        expand_origin_raster = numpy.hstack((numpy.hstack((add_col, temp_origin_raster)), add_col))
-        # Erode the raster.
-        for i in range(origin_raster.shape[0]):
-            for j in range(origin_raster.shape[1]):
-                min_pixel_value = max_value_raster
-                # Find the min pixel value in the 8-neighborhood.
-                for k in range(3):
-                    for l in range(3):
-                        if expand_origin_raster[i + k, j + l] <= min_pixel_value:
-                            min_pixel_value = expand_origin_raster[i + k, j + l]
-                            # After this loop, we get the min pixel's value of the
-                            # 8-neighborhood. Then we change the compute pixel's value into
-                            # the min pixel's value.
-                    erosion_raster[i, j] = min_pixel_value
-        # Return the result.
-        return erosion_raster
-
-    @staticmethod
-    def raster_dilation(rasterfile):
+        data, nodata_value = RasterUtilClass._get_data_and_nodata(rasterfile, nodata_value)
+        return RasterUtilClass.morphology(data, ['erosion'] * iterations, structure,
+                                          nodata_value)
+
+    @staticmethod
+    def raster_dilation(rasterfile, structure=None, nodata_value=None, iterations=1):
         """Dilate the raster image.
 
-         Find the max pixel's value in 8-neighborhood. Then change the compute
-         pixel's value into the max pixel's value.
+         Find the max pixel's value in the neighborhood defined by structuring element (e.g.,
+         8-neighborhood by default). Then change the compute pixel's value into the max
+         pixel's value.
 
         Args:
             rasterfile: input original raster image, type can be filename(string,
             like "test1.tif"), rasterfile(class Raster) or numpy.ndarray.
+            structure: structuring element, see `get_structuring_element`. 3*3 square as default.
+            nodata_value: nodata value, which is the nodata of raster by default if the input is
+                          filename or Raster, otherwise None means no nodata.
+            iterations: times of dilation, 1 as default.
 
         Returns:
             dilation_raster: raster image after dilation, type is numpy.ndarray.
         """
-        if is_string(rasterfile):
-            origin_raster = RasterUtilClass.read_raster(str(rasterfile))
-        elif isinstance(rasterfile, Raster):
-            origin_raster = rasterfile.data
-        elif isinstance(rasterfile, numpy.ndarray):
-            origin_raster = rasterfile
-        else:
-            return 'Your rasterfile has a wrong type. Type must be string or ' \
-                   'numpy.array or class Raster in pygeoc.'
-        min_value_raster = origin_raster.min()
-        dilation_raster = numpy.zeros((origin_raster.shape[0], origin_raster.shape[1]))
-        # In order to compute the raster edges, we need to expand the original
-        # raster's rows and cols. We need to add the edges whose pixels' value is
-        # the max pixel's value in raster.
-        add_row = numpy.full((1, origin_raster.shape[1]), min_value_raster)
-        temp_origin_raster = numpy.vstack((numpy.vstack((add_row, origin_raster)), add_row))
-        add_col = numpy.full((origin_raster.shape[0] + 2, 1), min_value_raster)
-        expand_origin_raster = numpy.hstack((numpy.hstack((add_col, temp_origin_raster)), add_col))
-        # Dilate the raster.
-        for i in range(origin_raster.shape[0]):
-            for j in range(origin_raster.shape[1]):
-                max_pixel_value = min_value_raster
-                # Find the max pixel value in the 8-neighborhood.
-                for k in range(3):
-                    for l in range(3):
-                        if expand_origin_raster[i + k, j + l] >= max_pixel_value:
-                            max_pixel_value = expand_origin_raster[i + k, j + l]
-                            # After this loop, we get the max pixel's value of the
-                            # 8-neighborhood. Then we change the compute pixel's value into
-                            # the max pixel's value.
-                    dilation_raster[i, j] = max_pixel_value
-        # Return the result.
-        return dilation_raster
-
-    @staticmethod
-    def openning(input_rasterfilename, times):
+        data, nodata_value = RasterUtilClass._get_data_and_nodata(rasterfile, nodata_value)
+        return RasterUtilClass.morphology(data, ['dilation'] * iterations, structure,
+                                          nodata_value)
+
+    @staticmethod
+    def openning(input_rasterfilename, times, structure=None, nodata_value=None):
         """Do openning.
 
         Openning: Erode firstly, then Dilate.
 
         Args:
-            input_rasterfilename: input original raster image filename.
+            input_rasterfilename: input original raster image filename, Raster, or numpy.ndarray.
             times: Erode and Dilate times.
+            structure: structuring element, see `get_structuring_element`. 3*3 square as default.
+            nodata_value: nodata value, see `raster_erosion`.
 
         Returns:
             openning_raster: raster image after open.
         """
-        input_raster = RasterUtilClass.read_raster(input_rasterfilename)
-        openning_raster = input_raster
-        for i in range(times):
-            openning_raster = RasterUtilClass.raster_erosion(openning_raster)
-        for i in range(times):
-            openning_raster = RasterUtilClass.raster_dilation(openning_raster)
-        return openning_raster
+        data, nodata_value = RasterUtilClass._get_data_and_nodata(input_rasterfilename,
+                                                                   nodata_value)
+        return RasterUtilClass.morphology(data, ['erosion'] * times + ['dilation'] * times,
+                                          structure, nodata_value)
 
     @staticmethod
-    def closing(input_rasterfilename, times):
+    def closing(input_rasterfilename, times, structure=None, nodata_value=None):
         """Do closing.
 
         Closing: Dilate firstly, then Erode.
 
         Args:
-            input_rasterfilename: input original raster image filename.
+            input_rasterfilename: input original raster image filename, Raster, or numpy.ndarray.
             times: Erode and Dilate times.
+            structure: structuring element, see `get_structuring_element`. 3*3 square as default.
+            nodata_value: nodata value, see `raster_erosion`.
 
         Returns:
             closing_raster: raster image after close.
         """
-        input_raster = RasterUtilClass.read_raster(input_rasterfilename)
-        closing_raster = input_raster
-        for i in range(times):
-            closing_raster = RasterUtilClass.raster_dilation(closing_raster)
-        for i in range(times):
-            closing_raster = RasterUtilClass.raster_erosion(closing_raster)
-        return closing_raster
+        data, nodata_value = RasterUtilClass._get_data_and_nodata(input_rasterfilename,
+                                                                   nodata_value)
+        return RasterUtilClass.morphology(data, ['dilation'] * times + ['erosion'] * times,
+                                          structure, nodata_value)
+
+    @staticmethod
+    def label_connected(raster, value=None, connectivity=8, nodata_value=None,
+                        tile_rows=None, processes=1):
+        """Label connected components (i.e., regions) of raster.
+
+        The cells are connected if they are neighbors (4- or 8-neighborhood) and share
+        the same value. The components are found by vectorized union-find on the edges of
+        neighboring cells, and labeled from 1 in the raster scan order of their first cells.
+
+        For large raster, the raster can be split into strips (of `tile_rows` rows) which
+        are labeled independently (in parallel if `processes` > 1), then the labels are merged
+        across strip borders. The result is the same as labeling the whole raster.
+
+        Examples:
+            >>> data = numpy.array([[1, 1, 0, 2],
+            ...                     [0, 1, 0, 2],
+            ...                     [2, 0, 1, 0]])
+            >>> labels, table = RasterUtilClass.label_connected(data, value=1)
+            >>> labels.tolist()
+            [[1, 1, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0]]
+            >>> labels, table = RasterUtilClass.label_connected(data, connectivity=4,
+            ...                                                 nodata_value=0)
+            >>> labels.tolist()
+            [[1, 1, 0, 2], [0, 1, 0, 2], [3, 0, 4, 0]]
+            >>> table['count'].tolist(), table['row_max'].tolist()
+            ([3, 2, 1, 1], [1, 1, 2, 2])
+
+        Args:
+            raster: filename(string), Raster object, or numpy.ndarray.
+            value: the value of cells to be labeled, None as default to label all valid cells.
+            connectivity: 8 (default) or 4.
+            nodata_value: nodata value, which is the nodata of raster by default if the input
+                          is filename or Raster, otherwise None means no nodata.
+            tile_rows: rows of each strip, None as default to label the whole raster at once.
+            processes: number of processes to label strips, 1 as default.
+
+        Returns:
+            labels: 2D int32 array, 0 for cells not labeled.
+            table: dict of 1D arrays of each label, i.e., 'label', 'count', 'row_min',
+                   'row_max', 'col_min', and 'col_max'.
+        """
+        if connectivity not in [4, 8]:
+            raise ValueError('The connectivity should be 4 or 8!')
+        data, nodata_value = RasterUtilClass._get_data_and_nodata(raster, nodata_value)
+        nrows = data.shape[0]
+        if tile_rows is None or tile_rows >= nrows:
+            labels, _ = _label_connected_worker((data, value, connectivity, nodata_value))
+        else:
+            strips = [(data[r:r + tile_rows], value, connectivity, nodata_value)
+                      for r in range(0, nrows, tile_rows)]
+            if processes > 1:
+                pool = Pool(processes)
+                try:
+                    results = pool.map(_label_connected_worker, strips)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                results = [_label_connected_worker(strip) for strip in strips]
+            offsets = numpy.cumsum([0] + [n for _, n in results])
+            labels = numpy.concatenate([numpy.where(lab > 0, lab + offset, 0)
+                                        for (lab, _), offset in zip(results, offsets[:-1])])
+            # merge labels across the borders of strips
+            src_labels, dst_labels = list(), list()
+            for r in range(tile_rows, nrows, tile_rows):
+                a, b = _get_connected_edges(data[r - 1:r + 1], labels[r - 1:r + 1],
+                                            connectivity, across_rows_only=True)
+                src_labels.append(a)
+                dst_labels.append(b)
+            roots = _get_union_roots(int(offsets[-1]) + 1, numpy.concatenate(src_labels),
+                                     numpy.concatenate(dst_labels))
+            # the root is the minimum label of each merged set, thus keep the scan order
+            _, new_labels = numpy.unique(roots, return_inverse=True)
+            labels = new_labels.reshape(-1)[labels].astype(numpy.int32)
+        return labels, RasterUtilClass.get_label_table(labels)
+
+    @staticmethod
+    def get_label_table(labels):
+        """Get the size and bounding box of each label.
+
+        Args:
+            labels: 2D array of labels, 0 (or negative) for cells not labeled.
+
+        Returns:
+            dict of 1D arrays of each label, i.e., 'label', 'count', 'row_min',
+            'row_max', 'col_min', and 'col_max'.
+        """
+        rows, cols = numpy.nonzero(labels > 0)
+        lab = labels[rows, cols]
+        order = numpy.argsort(lab, kind='mergesort')
+        lab, rows, cols = lab[order], rows[order], cols[order]
+        table = {'label': numpy.unique(lab)}
+        starts = numpy.searchsorted(lab, table['label'])
+        table['count'] = numpy.diff(numpy.append(starts, lab.size))
+        if lab.size == 0:
+            for k in ['row_min', 'row_max', 'col_min', 'col_max']:
+                table[k] = numpy.zeros(0, dtype=numpy.int64)
+            return table
+        table['row_min'] = numpy.minimum.reduceat(rows, starts)
+        table['row_max'] = numpy.maximum.reduceat(rows, starts)
+        table['col_min'] = numpy.minimum.reduceat(cols, starts)
+        table['col_max'] = numpy.maximum.reduceat(cols, starts)
+        return table
+
+
+def _split_raster_worker(args):
+    """Split one raster by one feature, which is a module-level function for pickling.
+
+    Args:
+        args: (raster, out_raster, split_shp, field_name, field_value, envelope, options),
+              the envelope is None to warp by cutline, otherwise crop by the envelope.
+              The options are the resolved GeoTiff creation options of the output.
+
+    Returns:
+        True if the output raster is created, otherwise False.
+    """
+    r, outraster, split_shp, field_name, field_value, envelope, options = args
+    if envelope is not None:
+        return RasterUtilClass.crop_raster_by_extent(r, outraster, envelope, options=options)
+    where = '"%s" = \'%s\'' % (field_name, field_value.replace("'", "''"))
+    ds = gdal_Warp(outraster, r, cutlineDSName=split_shp, cutlineWhere=where,
+                   cropToCutline=True, dstNodata=DEFAULT_NODATA, creationOptions=options)
+    if ds is None:
+        return False
+    ds = None
+    return True
+
+
+def _get_connected_edges(data, index, connectivity, across_rows_only=False):
+    """Get the pairs of indexes of neighboring cells which share the same value.
+
+    Args:
+        data: 2D array of values.
+        index: 2D array of indexes of cells with the same shape of `data`, negative (or 0
+               if `across_rows_only`) for cells not to be connected.
+        connectivity: 8 or 4.
+        across_rows_only: only connect cells between adjacent rows, i.e., the borders.
+
+    Returns:
+        Two 1D arrays of indexes.
+    """
+    nrows, ncols = data.shape
+    offsets = [(1, 0)]
+    if not across_rows_only:
+        offsets.append((0, 1))
+    if connectivity == 8:
+        offsets += [(1, 1), (1, -1)]
+    threshold = 0 if across_rows_only else -1
+    src_idx, dst_idx = list(), list()
+    for dr, dc in offsets:
+        src = (slice(0, nrows - dr), slice(max(0, -dc), ncols - max(0, dc)))
+        dst = (slice(dr, nrows), slice(max(0, dc), ncols - max(0, -dc)))
+        mask = (index[src] > threshold) & (index[dst] > threshold) & (data[src] == data[dst])
+        src_idx.append(index[src][mask])
+        dst_idx.append(index[dst][mask])
+    return numpy.concatenate(src_idx), numpy.concatenate(dst_idx)
+
+
+def _get_union_roots(n, src, dst):
+    """Vectorized union-find of `n` elements by hooking and pointer jumping.
+
+    Args:
+        n: number of elements, i.e., from 0 to n - 1.
+        src: 1D array of indexes of edges.
+        dst: 1D array of indexes of edges.
+
+    Returns:
+        1D array of roots of elements, the root is the minimum index of each set.
+    """
+    roots = numpy.arange(n, dtype=numpy.int64)
+    while True:
+        ra = roots[src]
+        rb = roots[dst]
+        unmerged = ra != rb
+        if not unmerged.any():
+            break
+        ra = ra[unmerged]
+        rb = rb[unmerged]
+        src = src[unmerged]
+        dst = dst[unmerged]
+        # hook the larger root to the smaller one
+        numpy.minimum.at(roots, numpy.maximum(ra, rb), numpy.minimum(ra, rb))
+        # pointer jumping to flatten the trees
+        while True:
+            jumped = roots[roots]
+            if numpy.array_equal(jumped, roots):
+                break
+            roots = jumped
+    return roots
+
+
+def _label_connected_worker(args):
+    """Label connected components of 2D array, which is a module-level function for pickling.
+
+    Args:
+        args: (data, value, connectivity, nodata_value), see `RasterUtilClass.label_connected`.
+
+    Returns:
+        (2D int32 array of labels from 1, number of labels)
+    """
+    data, value, connectivity, nodata_value = args
+    if value is not None:
+        valid = data == value
+    else:
+        valid = numpy.ones(data.shape, dtype=bool)
+        if nodata_value is not None:
+            valid &= data != nodata_value
+        if data.dtype.kind == 'f':
+            valid &= ~numpy.isnan(data)
+    ncells = int(numpy.count_nonzero(valid))
+    index = numpy.full(data.shape, -1, dtype=numpy.int64)
+    index[valid] = numpy.arange(ncells)
+    src, dst = _get_connected_edges(data, index, connectivity)
+    roots = _get_union_roots(ncells, src, dst)
+    uniques, labels = numpy.unique(roots, return_inverse=True)
+    label_data = numpy.zeros(data.shape, dtype=numpy.int32)
+    label_data[valid] = labels.reshape(-1) + 1
+    return label_data, len(uniques)
+
+
+def _tile_worker_init(context, use_shared_memory=True):
+    """Initialize the kernel and inputs of the worker process, see `TileScheduler`."""
+    _TILE_CONTEXT.clear()  # release the datasets opened before
+    if context is None:
+        return
+    kernel, in_rasters, kernel_kwargs, out_dtypes, with_window, shm_prefix = context
+    # On Windows, the shared memory is freed once the worker closes it before returning
+    _TILE_CONTEXT.update({'kernel': kernel, 'kwargs': kernel_kwargs,
+                          'with_window': with_window,
+                          'dtypes': [numpy.dtype(dtype) for dtype in out_dtypes],
+                          'datasets': [gdal_Open(f) for f in in_rasters],
+                          'shm_prefix': shm_prefix,
+                          'shared': (use_shared_memory and sys.version_info >= (3, 8) and
+                                     os.name != 'nt')})
+
+
+def _tile_worker(window):
+    """Run kernel on the tile, which is a module-level function for pickling.
+
+    Returns:
+        (window, results), each result is the output array of core region if shared memory
+        is unavailable, otherwise (name, shape, dtype) of the shared memory block.
+    """
+    blocks = [ds.GetRasterBand(1).ReadAsArray(window.read_xoff, window.read_yoff,
+                                              window.read_xsize, window.read_ysize)
+              for ds in _TILE_CONTEXT['datasets']]
+    kwargs = _TILE_CONTEXT['kwargs']
+    if _TILE_CONTEXT['with_window']:
+        kwargs = dict(kwargs, window=window)
+    dtypes = _TILE_CONTEXT['dtypes']
+    results = _TILE_CONTEXT['kernel'](*blocks, **kwargs)
+    if len(dtypes) == 1:
+        results = [results]
+    elif len(results) != len(dtypes):
+        raise ValueError('The kernel should return %d arrays!' % len(dtypes))
+    outputs = list()
+    for k, (result, dtype) in enumerate(zip(results, dtypes)):
+        result = numpy.asarray(window.core(numpy.asarray(result)), dtype=dtype)
+        if not _TILE_CONTEXT['shared'] or result.nbytes == 0:
+            outputs.append(result)
+            continue
+        from multiprocessing import shared_memory, resource_tracker
+        shm = shared_memory.SharedMemory(create=True, size=result.nbytes,
+                                         name=_tile_shm_name(_TILE_CONTEXT['shm_prefix'],
+                                                             window, k))
+        # the block is owned (unlinked) by the main process, do not track it in the worker
+        resource_tracker.unregister(getattr(shm, '_name', '/' + shm.name), 'shared_memory')
+        numpy.ndarray(result.shape, dtype=result.dtype, buffer=shm.buf)[:] = result
+        outputs.append((shm.name, result.shape, result.dtype.str))
+        shm.close()
+    return window, outputs
+
+
+def _tile_shm_name(prefix, window, k=0):
+    """Name of the shared memory block of the k-th output of the tile, unique in one run."""
+    return '%s_%d_%d_%d' % (prefix, window.yoff, window.xoff, k)
+
+
+def _release_tile_results(prefix, windows, count=1):
+    """Unlink the shared memory blocks of tiles that are left by the stopped workers."""
+    if sys.version_info < (3, 8):
+        return
+    from multiprocessing import shared_memory
+    for window in windows:
+        for k in range(count):
+            try:
+                shm = shared_memory.SharedMemory(name=_tile_shm_name(prefix, window, k))
+            except (OSError, ValueError):  # not created, or consumed already
+                continue
+            shm.close()
+            shm.unlink()
+
+
+def _tile_result_to_array(result):
+    """Get the output array from the result of `_tile_worker`, the shared memory is released."""
+    if isinstance(result, numpy.ndarray):
+        return result
+    from multiprocessing import shared_memory
+    name, shape, dtype = result
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return numpy.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
 
 
 if __name__ == '__main__':
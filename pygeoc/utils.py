@@ -9,12 +9,14 @@
      - 16-07-01 lj - reorganized for pygeoc.
      - 17-06-25 lj - check by pylint and reformat by Google style.
      - 18-10-31 lj - add type hints according to typing package.
+     - 26-10-17 ag - add FileClass.is_vsi_path for GDAL virtual file systems.
 """
 from __future__ import division, unicode_literals
 from future.utils import iteritems
 
 import argparse
 from configparser import ConfigParser
+import errno
 import glob
 import os
 import platform
@@ -1002,6 +1004,19 @@ class FileClass(object):
         else:
             return True
 
+    @staticmethod
+    def is_vsi_path(filename):
+        # type: (AnyStr) -> bool
+        """Check if the path is of GDAL virtual file systems, e.g., `/vsimem/`.
+
+        Examples:
+            >>> FileClass.is_vsi_path('/vsimem/pygeoc/dem.tif')
+            True
+            >>> FileClass.is_vsi_path('/data/dem.tif')
+            False
+        """
+        return is_string(filename) and filename.replace('\\', '/').startswith('/vsi')
+
     @staticmethod
     def is_dir_exists(dirpath):
         # type: (AnyStr) -> bool
@@ -1382,9 +1397,13 @@ class UtilClass(object):
     @staticmethod
     def mkdir(dir_path):
         # type: (AnyStr) -> None
-        """Make directory if not existed"""
+        """Make directory if not existed, which is safe to be called concurrently."""
         if not os.path.isdir(dir_path) or not os.path.exists(dir_path):
-            os.makedirs(dir_path)
+            try:
+                os.makedirs(dir_path)
+            except OSError as e:  # created by another thread or process meanwhile
+                if e.errno != errno.EEXIST or not os.path.isdir(dir_path):
+                    raise
 
     @staticmethod
     def rmmkdir(dir_path):
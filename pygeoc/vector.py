@@ -9,6 +9,7 @@
      - 12-04-12 jz - origin version
      - 16-07-01 lj - reorganized for pygeoc
      - 17-06-25 lj - check by pylint and reformat by Google style
+     - 26-10-17 ag - support raster in GDAL virtual file systems in raster2shp
 """
 from __future__ import absolute_import, unicode_literals
 import os
@@ -37,7 +38,8 @@ class VectorUtilClass(object):
                    band_num=1, mask='default'):
         """Convert raster to ESRI shapefile"""
         FileClass.remove_files(vectorshp)
-        FileClass.check_file_exists(rasterfile)
+        if not FileClass.is_vsi_path(rasterfile):
+            FileClass.check_file_exists(rasterfile)
         # this allows GDAL to throw Python Exceptions
         gdal.UseExceptions()
         src_ds = gdal.Open(rasterfile)
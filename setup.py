@@ -117,7 +117,8 @@ setup(
             'typing;python_version<"3.5"',
             'future',
             'six',
-            'configparser;python_version<"3"'
+            'configparser;python_version<"3"',
+            'futures;python_version<"3"'
         ],
 
         # List additional groups of dependencies here (e.g. development
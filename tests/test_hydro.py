@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Tests of pygeoc.hydro
+
+    @author: agent
+
+    @changlog:
+    - 26-10-17 ag - origin version.
+"""
+import numpy
+import pytest
+
+pytest.importorskip('osgeo')
+
+from pygeoc.hydro import FlowModelConst, D8Util, FlowGraph, DEMUtil, NO_RECEIVER
+from pygeoc.postTauDEM import DinfUtil
+from pygeoc.raster import RasterUtilClass
+from pygeoc.utils import PI
+
+
+@pytest.mark.parametrize('alg', ['taudem', 'ArcGIS', 'whitebox'])
+def test_receiver_indices(alg):
+    codes = FlowModelConst.d8_dirs[alg.lower()]
+    flowdir = numpy.array(codes * 6, dtype=numpy.float32).reshape(6, 8)
+    numpy.random.RandomState(0).shuffle(flowdir.ravel())
+    flowdir[2][3] = -9999.
+    flowdir[4][4] = 3.5
+    receivers = D8Util.receiver_indices(flowdir, alg, nodata=-9999.)
+    assert receivers.dtype == numpy.int32
+    for idx, receiver in enumerate(receivers):
+        row, col = divmod(idx, 8)
+        if idx in (2 * 8 + 3, 4 * 8 + 4):
+            assert receiver == NO_RECEIVER
+            continue
+        drow, dcol = D8Util.downstream_index(flowdir[row][col], row, col, alg)
+        if 0 <= drow < 6 and 0 <= dcol < 8:
+            assert receiver == drow * 8 + dcol
+        else:
+            assert receiver == NO_RECEIVER
+
+
+def test_flow_graph_d8():
+    flowdir = numpy.array([[8, 7, 6, 7],
+                           [1, 8, 7, 5],
+                           [1, 1, 7, -1],
+                           [3, 1, 1, 1]])
+    graph = FlowGraph.from_d8(flowdir, nodata=-1)
+    receivers = D8Util.receiver_indices(flowdir, nodata=-1)
+    for idx, receiver in enumerate(receivers):
+        expected = [] if receiver == NO_RECEIVER else [receiver]
+        assert graph.get_receivers(idx).tolist() == expected
+        assert sorted(graph.get_donors(idx).tolist()) == \
+            numpy.flatnonzero(receivers == idx).tolist()
+    assert graph.donor_counts.sum() == 14
+    assert graph.upstream(2 * 4 + 2).tolist() == [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 12]
+    assert graph.downstream(0).tolist() == [0, 5, 10, 14, 15]
+    levels = graph.topological_levels()
+    assert levels[14] == levels[10] + 1 == levels[6] + 2
+    order = graph.topological_order()
+    position = numpy.argsort(order)
+    src = numpy.flatnonzero(receivers != NO_RECEIVER)
+    assert (position[src] < position[receivers[src]]).all()
+
+
+def test_flow_graph_dinf():
+    angle = numpy.random.RandomState(1).uniform(0., 2. * PI, (5, 6))
+    angle[1][1] = FlowModelConst.nw + 0.001
+    angle[3][2] = -1.
+    graph = FlowGraph.from_dinf(angle, nodata=-1.)
+    for idx in range(30):
+        row, col = divmod(idx, 6)
+        if angle[row][col] < 0:
+            assert graph.get_receivers(idx).size == 0
+            continue
+        expected = dict()
+        _, code, weight = DinfUtil.compress_dinf(angle[row][col], -1.)
+        for k, (drow, dcol) in enumerate(DinfUtil.downstream_index_dinf(angle[row][col],
+                                                                         row, col)):
+            if 0 <= drow < 5 and 0 <= dcol < 6:
+                expected[drow * 6 + dcol] = weight if k == 0 else 1. - weight
+        begin, end = graph.receiver_ptr[idx], graph.receiver_ptr[idx + 1]
+        actual = dict(zip(graph.receivers[begin:end].tolist(),
+                          graph.fractions[begin:end].tolist()))
+        assert sorted(actual) == sorted(expected)
+        for receiver, fraction in expected.items():
+            assert actual[receiver] == pytest.approx(fraction, abs=1e-6)
+    assert graph.get_receivers(6 + 1).tolist() == [0]
+
+
+def test_flow_graph_mfdmd_and_save(tmp_path):
+    codes = numpy.array([[1 + 2 + 4, 4, 0],
+                         [1 + 128, 2 + 8, 8],
+                         [-9999, 1, 1]])
+    graph = FlowGraph.from_mfdmd(codes, nodata=-9999)
+    assert graph.get_receivers(0).tolist() == [1, 3, 4]
+    assert graph.fractions[graph.receiver_ptr[0]] == pytest.approx(1. / 3.)
+    assert graph.get_receivers(4).tolist() == [6, 8]
+    assert graph.get_receivers(3).tolist() == [4, 1]  # by counterclockwise from east
+    fractions = [numpy.full((3, 3), 0.1 * (d + 1)) for d in range(8)]
+    graph = FlowGraph.from_mfdmd(codes, nodata=-9999, fractions=fractions)
+    begin, end = graph.receiver_ptr[0], graph.receiver_ptr[1]
+    assert graph.fractions[begin:end].tolist() == pytest.approx([0.1, 0.7, 0.8])
+    for path in [str(tmp_path / 'graph.npz'), str(tmp_path / 'graph')]:
+        graph.save(path)
+        loaded = FlowGraph.load(path)
+        assert (loaded.nrows, loaded.ncols) == (3, 3)
+        for name in ['receiver_ptr', 'receivers', 'donor_ptr', 'donors', 'fractions']:
+            numpy.testing.assert_array_equal(getattr(loaded, name), getattr(graph, name))
+        assert loaded.upstream(8).tolist() == graph.upstream(8).tolist() == [0, 1, 3, 4, 5, 7, 8]
+    assert isinstance(FlowGraph.load(str(tmp_path / 'graph')).donors, numpy.memmap)
+
+
+def random_d8(nrows, ncols, seed):
+    """D8 flow direction (TauDEM code) of steepest descent on random elevation."""
+    dem = numpy.random.RandomState(seed).rand(nrows, ncols)
+    flowdir = numpy.zeros((nrows, ncols), dtype=numpy.int16)
+    for row in range(nrows):
+        for col in range(ncols):
+            lowest = dem[row][col]
+            for d, code in enumerate(FlowModelConst.d8dir_td):
+                nrow = row + FlowModelConst.ccw_drow[d]
+                ncol = col + FlowModelConst.ccw_dcol[d]
+                if 0 <= nrow < nrows and 0 <= ncol < ncols and dem[nrow][ncol] < lowest:
+                    lowest = dem[nrow][ncol]
+                    flowdir[row][col] = code
+    return flowdir
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_flow_accumulation(seed):
+    flowdir = random_d8(9, 11, seed)
+    flowdir[4][5] = -1
+    weight = numpy.random.RandomState(seed).rand(9, 11)
+    weight[7][2] = numpy.nan
+    receivers = D8Util.receiver_indices(flowdir, nodata=-1)
+    for contamination in [False, True]:
+        acc = D8Util.flow_accumulation(flowdir, weight=weight, nodata_value=-1,
+                                       edge_contamination=contamination)
+        expected = numpy.zeros(99)
+        unknown = numpy.zeros(99, dtype=bool)
+        for idx in range(99):
+            row, col = divmod(idx, 11)
+            if flowdir[row][col] == -1:
+                continue
+            bad = numpy.isnan(weight[row][col])
+            if contamination:
+                bad |= row in (0, 8) or col in (0, 10) or (abs(row - 4) <= 1 and
+                                                          abs(col - 5) <= 1)
+            while idx != NO_RECEIVER:
+                expected[idx] += weight[row][col]
+                unknown[idx] |= bad
+                idx = receivers[idx]
+        expected[unknown] = -9999.
+        expected[4 * 11 + 5] = -9999.
+        numpy.testing.assert_allclose(acc.ravel(), expected)
+    outlet = numpy.argmax(D8Util.flow_accumulation(flowdir, nodata_value=-1,
+                                                   edge_contamination=False))
+    acc = D8Util.flow_accumulation(flowdir, outlets=[divmod(outlet, 11)], nodata_value=-1,
+                                   edge_contamination=False)
+    upstream = FlowGraph.from_d8(flowdir, nodata=-1).upstream(outlet)
+    assert acc.ravel()[outlet] == upstream.size
+    assert (acc.ravel()[upstream] > 0).all()
+    assert (numpy.delete(acc.ravel(), upstream) == -9999.).all()
+
+
+@pytest.mark.parametrize('lean', [False, True])
+def test_fill_depressions(lean):
+    dem = numpy.array([[9, 9, 9, 9, 9, 9],
+                       [9, 2, 3, 9, 1, 9],
+                       [9, 4, 9, 9, 9, 9],
+                       [9, 6, 9, 0, 2, -1],
+                       [9, 5, 9, 9, 9, 9]], dtype=numpy.float32)
+    filled = DEMUtil.fill_depressions(dem, nodata_value=-1, lean=lean)
+    assert filled.dtype == (numpy.float32 if lean else numpy.float64)
+    expected = dem.copy()
+    expected[1:3, 1:3] = [[6, 6], [6, 9]]
+    expected[1][4] = 9
+    expected[3][3] = 2
+    numpy.testing.assert_array_equal(filled, expected)
+    filled = DEMUtil.fill_depressions(dem, epsilon=True, nodata_value=-1, lean=lean)
+    assert filled[2][1] == numpy.nextafter(filled[3][1], filled.dtype.type(10))
+    assert filled[4][1] < filled[3][1] < filled[2][1] < min(filled[1][1], filled[1][2])
+    assert filled[1][4] > 9 and filled[3][3] > filled[3][4] == 2
+    # increment smaller than the precision of float32
+    filled = DEMUtil.fill_depressions(dem, epsilon=1e-9, nodata_value=-1, lean=lean)
+    assert filled[4][1] < filled[3][1] < filled[2][1] and filled[1][4] > 9
+
+
+@pytest.mark.parametrize('alg', ['taudem', 'arcgis'])
+def test_flow_direction(tmp_path, alg):
+    dem = numpy.random.RandomState(3).randint(0, 4, (17, 13)).astype(numpy.float64)
+    dem[8][6] = -9999.
+    dem = DEMUtil.fill_depressions(dem, nodata_value=-9999.)
+    flowdir, slope = D8Util.flow_direction(dem, alg, nodata_value=-9999., cell_size=2.)
+    assert flowdir[8][6] == slope[8][6] == -9999.
+    assert (flowdir != -9999).sum() == 17 * 13 - 1
+    # all cells drain out without loops, and never flow upslope
+    graph = FlowGraph.from_d8(flowdir, alg, nodata=-9999)
+    assert (graph.topological_levels() >= 0).all()
+    receivers = D8Util.receiver_indices(flowdir, alg, nodata=-9999)
+    src = numpy.flatnonzero(receivers != NO_RECEIVER)
+    assert (dem.ravel()[receivers[src]] <= dem.ravel()[src]).all()
+    row, col = numpy.unravel_index(numpy.argmax(slope), slope.shape)
+    drow, dcol = D8Util.downstream_index(flowdir[row][col], row, col, alg)
+    assert slope[row][col] == (dem[row][col] - dem[drow][dcol]) / (2. * numpy.hypot(
+        drow - row, dcol - col))
+    # tiled: the same, including the flats crossing tiles
+    dem_file = str(tmp_path / 'dem.tif')
+    RasterUtilClass.write_gtiff_file(dem_file, 17, 13, dem, [0., 2., 0., 34., 0., -2.], '',
+                                     -9999.)
+    for tile_shape, halo, processes in [((5, 4), 1, 1), ((6, 13), 2, 2), ((4, 3), 0, 1),
+                                        ((17, 13), 1, 1)]:
+        D8Util.flow_direction_tiled(dem_file, str(tmp_path / 'd8.tif'),
+                                    str(tmp_path / 'slp.tif'), alg, tile_shape=tile_shape,
+                                    halo=halo, processes=processes)
+        numpy.testing.assert_array_equal(
+            RasterUtilClass.read_raster(str(tmp_path / 'd8.tif')).data, flowdir)
+        numpy.testing.assert_allclose(RasterUtilClass.read_raster(str(tmp_path / 'slp.tif')).data,
+                                      slope, rtol=1e-6)
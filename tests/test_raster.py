@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+"""Tests of RasterUtilClass in pygeoc.raster
+
+    @author: agent
+
+    @changlog:
+    - 26-10-17 ag - origin version.
+"""
+import os
+import time
+from functools import partial
+
+import numpy
+import pytest
+
+pytest.importorskip('osgeo')
+
+from pygeoc.raster import RasterUtilClass, RasterStatsCache, MemoryWorkspace, TileScheduler
+from pygeoc.raster import GDT_Float32
+
+GEOTRANS = [0., 1., 0., 7., 0., -1.]
+
+
+def write_tif(path, data, nodata=-9999., gdal_type=GDT_Float32):
+    RasterUtilClass.write_gtiff_file(str(path), data.shape[0], data.shape[1], data,
+                                     GEOTRANS, '', nodata, gdal_type)
+    return str(path)
+
+
+def test_block_windows():
+    wins = RasterUtilClass.get_block_windows(7, 5, (3, 2), halo=1)
+    assert len(wins) == 9
+    assert sum(w.xsize * w.ysize for w in wins) == 35
+    assert (wins[4].read_xoff, wins[4].read_yoff) == (1, 2)
+    assert (wins[4].read_xsize, wins[4].read_ysize) == (4, 5)
+
+
+def test_iter_and_write_blocks(tmp_path):
+    data = numpy.arange(35.).reshape(7, 5)
+    src = write_tif(tmp_path / 'src.tif', data)
+    dst = str(tmp_path / 'dst.tif')
+    blocks = ((win, blk + 1.) for win, blk in RasterUtilClass.iter_blocks(src, (3, 5), halo=1))
+    RasterUtilClass.write_blocks(dst, blocks, 7, 5, GEOTRANS, '', -9999.)
+    assert os.path.exists(dst)
+    numpy.testing.assert_array_equal(RasterUtilClass.read_raster(dst).data, data + 1.)
+
+
+def test_read_raster_lazy(tmp_path):
+    data = numpy.array([[1., -9999.], [3., 4.]])
+    src = write_tif(tmp_path / 'lazy.tif', data)
+    rst = RasterUtilClass.read_raster(src, lazy=True)
+    numpy.testing.assert_array_equal(rst.validZone, [[True, False], [True, True]])
+    assert numpy.isnan(rst.validValues[0][1])
+    assert rst.get_average() == pytest.approx(8. / 3.)
+    rst.data = numpy.ones((2, 2))
+    assert rst.validZone.all()
+
+
+@pytest.mark.parametrize('windowed', [False, True])
+def test_get_mask_from_raster(tmp_path, windowed):
+    data = numpy.full((7, 5), -9999.)
+    data[2:5, 1:3] = 1.
+    data[3][1] = -9999.
+    src = write_tif(tmp_path / 'valid.tif', data)
+    mask = RasterUtilClass.get_mask_from_raster(src, str(tmp_path / 'mask.tif'),
+                                                windowed=windowed)
+    assert (mask.nRows, mask.nCols) == (3, 2)
+    assert mask.geotrans == [1., 1., 0, 5., 0, -1.]
+    numpy.testing.assert_array_equal(mask.data, [[1, 1], [-9999, 1], [1, 1]])
+    part = RasterUtilClass.read_raster(src, window=(1, 2, 2, 3))
+    numpy.testing.assert_array_equal(part.data, data[2:5, 1:3])
+
+
+def test_mask_raster_different_extent(tmp_path):
+    data = numpy.arange(35.).reshape(7, 5)
+    src = write_tif(tmp_path / 'origin.tif', data)
+    mask = numpy.ones((3, 4))
+    mask[0][0] = -9999.
+    mask_file = str(tmp_path / 'mask.tif')
+    # aligned grid: shifted by one row and two cols, partly out of the origin raster
+    RasterUtilClass.write_gtiff_file(mask_file, 3, 4, mask, [2., 1., 0, 6., 0, -1.], '', -9999.)
+    out = str(tmp_path / 'masked.tif')
+    RasterUtilClass.mask_raster(src, mask_file, out)
+    expected = numpy.full((3, 4), -9999.)
+    expected[:, :3] = data[1:4, 2:5]
+    expected[0][0] = -9999.
+    numpy.testing.assert_array_equal(RasterUtilClass.read_raster(out).data, expected)
+    # misaligned grid with half cell size
+    RasterUtilClass.write_gtiff_file(mask_file, 3, 4, mask, [0., .5, 0, 7., 0, -.5], '', -9999.)
+    RasterUtilClass.mask_raster(src, mask_file, out)
+    expected = data[numpy.ix_([0, 0, 1], [0, 0, 1, 1])]
+    expected[0][0] = -9999.
+    numpy.testing.assert_array_equal(RasterUtilClass.read_raster(out).data, expected)
+
+
+@pytest.mark.parametrize('max_workers', [None, 1])
+def test_read_write_rasters(tmp_path, max_workers):
+    arrays = [numpy.full((3, 4), i, dtype=numpy.float32) for i in range(5)]
+    files = [str(tmp_path / 'layers' / ('layer%d.tif' % i)) for i in range(5)]  # same new dir
+    RasterUtilClass.write_gtiff_files(files, 3, 4, arrays, GEOTRANS, '',
+                                      [-9999., -9999., 2., -9999., -9999.],
+                                      max_workers=max_workers)
+    rasters = RasterUtilClass.read_rasters(files, max_workers=max_workers)
+    assert [r.data[0][0] for r in rasters] == list(range(5))
+    assert not rasters[2].validZone.any()
+    mask = numpy.ones((3, 4))
+    mask[1][1] = -9999.
+    mask_file = write_tif(tmp_path / 'mask.tif', mask)
+    outs = [str(tmp_path / ('masked%d.tif' % i)) for i in range(5)]
+    RasterUtilClass.mask_raster(files, mask_file, outs, max_workers=max_workers)
+    masked = RasterUtilClass.read_rasters(outs, max_workers=max_workers)
+    assert [r.data[1][1] for r in masked] == [-9999., -9999., 2., -9999., -9999.]
+    assert [r.data[2][3] for r in masked] == list(range(5))
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_raster_reclassify(tmp_path, streaming):
+    data = numpy.array([[1., 2., 3.], [4., 2., -9999.]])
+    src = write_tif(tmp_path / 'class.tif', data)
+    v_dict = {1: 10, 2: 20, 4: 40}
+    dst = str(tmp_path / 'reclass.tif')
+    RasterUtilClass.raster_reclassify(src, v_dict, dst, streaming=streaming)
+    assert v_dict == {1: 10, 2: 20, 4: 40}
+    numpy.testing.assert_array_equal(RasterUtilClass.read_raster(dst).data,
+                                     [[10., 20., 3.], [40., 20., -9999.]])
+    RasterUtilClass.raster_reclassify_by_intervals(src, [(1, 3, 1), (3, 10, 2)], dst,
+                                                   streaming=streaming)
+    numpy.testing.assert_array_equal(RasterUtilClass.read_raster(dst).data,
+                                     [[1., 1., 2.], [2., 1., -9999.]])
+    with pytest.raises(ValueError):
+        RasterUtilClass.reclassify_data_by_intervals(data, [], -9999.)
+
+
+def test_reclassify_data_lookup_and_sorted():
+    data = numpy.arange(-7, 20433, 7, dtype=numpy.int32).reshape(20, -1)
+    v_dict = dict((k, k * 2) for k in range(0, 20000, 14))
+    expected = numpy.where((data % 14 == 0) & (data < 20000), data * 2, data)
+    numpy.testing.assert_array_equal(RasterUtilClass.reclassify_data(data, v_dict), expected)
+    numpy.testing.assert_array_equal(RasterUtilClass.reclassify_data(data * 1., v_dict),
+                                     expected * 1.)
+
+
+def test_gtiff_creation_options():
+    from pygeoc.raster import GDT_Int16
+    assert RasterUtilClass.get_creation_options('default') == []
+    assert 'PREDICTOR=3' in RasterUtilClass.get_creation_options('deflate', GDT_Float32)
+    assert 'PREDICTOR=2' in RasterUtilClass.get_creation_options('zstd', GDT_Int16)
+    with pytest.raises(ValueError):
+        RasterUtilClass.get_creation_options('unknown')
+    previous = RasterUtilClass.set_default_gtiff_profile('lzw')
+    try:
+        assert 'COMPRESS=LZW' in RasterUtilClass.get_creation_options()
+    finally:
+        RasterUtilClass.set_default_gtiff_profile(previous)
+    assert RasterUtilClass.get_creation_options() == []
+
+
+def test_asc_file_roundtrip(tmp_path):
+    data = numpy.array([[1.5, 2.25, -9999.], [0.125, 3., 4.]], dtype=numpy.float32)
+    asc = str(tmp_path / 'grid.asc')
+    RasterUtilClass.write_asc_file(asc, data, 3, 2, GEOTRANS, -9999.)
+    rst = RasterUtilClass.read_asc_file(asc)
+    assert (rst.nRows, rst.nCols) == (2, 3)
+    assert rst.geotrans == GEOTRANS
+    numpy.testing.assert_array_equal(rst.data, data)
+    RasterUtilClass.write_asc_file(asc, numpy.arange(6).reshape(2, 3), 3, 2, GEOTRANS, -9999)
+    rst = RasterUtilClass.read_asc_file(asc)
+    assert rst.data.dtype == numpy.int32
+    numpy.testing.assert_array_equal(rst.data, [[0, 1, 2], [3, 4, 5]])
+    # float grid of integral values
+    RasterUtilClass.write_asc_file(asc, numpy.arange(6.).reshape(2, 3), 3, 2, GEOTRANS, -9999)
+    assert RasterUtilClass.read_asc_file(asc).data.dtype == numpy.float32
+    # nodata which is not an integral number
+    for nodata in [None, numpy.nan]:
+        RasterUtilClass.write_asc_file(asc, numpy.arange(6).reshape(2, 3), 3, 2, GEOTRANS,
+                                       nodata)
+        numpy.testing.assert_array_equal(RasterUtilClass.read_asc_file(asc).data,
+                                         [[0, 1, 2], [3, 4, 5]])
+
+
+def test_morphology(tmp_path):
+    data = numpy.zeros((6, 6), dtype=numpy.int16)
+    data[1:5, 1:5] = 1
+    data[0][0] = -1
+    cross = RasterUtilClass.get_structuring_element('cross')
+    eroded = RasterUtilClass.raster_erosion(data, cross, nodata_value=-1)
+    assert eroded.dtype == numpy.int16
+    assert eroded[0][0] == -1 and eroded[2:4, 2:4].all() and eroded.sum() == 4 - 1
+    dilated = RasterUtilClass.raster_dilation(data, iterations=2)
+    assert (dilated == 1).all()
+    src = write_tif(tmp_path / 'morph.tif', data * 1., nodata=-1.)
+    numpy.testing.assert_array_equal(RasterUtilClass.openning(src, 1), data)
+    holed = data.copy()
+    holed[2][3] = 0
+    numpy.testing.assert_array_equal(RasterUtilClass.closing(holed, 1, cross, -1)[1:5, 1:5], 1)
+
+
+def test_compute_statistics_and_cache(tmp_path):
+    data = numpy.arange(100.).reshape(10, 10)
+    data[0][0] = -9999.
+    src = write_tif(tmp_path / 'stats.tif', data)
+    values = data.ravel()[1:]
+    stats = RasterUtilClass.compute_statistics(src, percentiles=[50], block_shape=(3, 10))
+    assert stats['count'] == 99
+    assert (stats['min'], stats['max']) == (1., 99.)
+    assert stats['mean'] == pytest.approx(values.mean())
+    assert stats['std'] == pytest.approx(values.std())
+    assert sum(stats['histogram']) == 99
+    assert stats['percentiles'][0] == pytest.approx(numpy.percentile(values, 50), abs=0.5)
+    src2 = write_tif(tmp_path / 'stats2.tif', numpy.where(data > 0, data + 100., data))
+    both = RasterUtilClass.compute_statistics([src, src2])
+    assert both['count'] == 198
+    assert both['std'] == pytest.approx(numpy.concatenate([values, values + 100.]).std())
+    cache = RasterStatsCache(str(tmp_path / 'cache' / 'stats.json'))
+    first = RasterUtilClass.raster_statistics(src, cache=cache)
+    assert cache.get([src], 'band=1;bins=None;percentiles=[]')['count'] == 99
+    assert RasterUtilClass.raster_statistics(src, cache=cache) == first
+    os.utime(write_tif(tmp_path / 'stats.tif', data * 2.), (0, 0))
+    assert cache.get([src], 'band=1;bins=None;percentiles=[]') is None
+    assert RasterUtilClass.raster_statistics(src, cache=cache)[1] == 198.
+    # entries of removed rasters and beyond `max_entries` are pruned
+    cache = RasterStatsCache(str(tmp_path / 'cache' / 'stats.json'), max_entries=2)
+    assert cache.put([src2], [1.], 'a') and cache.put([src], [2.], 'b')
+    os.remove(src2)
+    assert cache.put([src], [3.], 'c') and cache.put([src], [4.], 'b')
+    paths, stamps = cache.get_stamps([src])
+    assert list(cache._load().values()) == [{'paths': paths, 'stamps': stamps, 'stats': s}
+                                            for s in [[3.], [4.]]]
+    assert not os.path.exists(cache.lock_file)
+
+
+def test_crop_raster_by_extent(tmp_path):
+    data = numpy.arange(35.).reshape(7, 5)
+    data[1][2] = -1.
+    src = write_tif(tmp_path / 'crop_src.tif', data, nodata=-1.)
+    out = str(tmp_path / 'crop.tif')
+    assert RasterUtilClass.crop_raster_by_extent(src, out, (1.5, 3.2, 2.1, 5.9))
+    rst = RasterUtilClass.read_raster(out)
+    assert list(rst.geotrans) == [1., 1., 0., 6., 0., -1.]
+    assert rst.noDataValue == -9999.
+    expected = data[1:5, 1:4].copy()
+    expected[0][1] = -9999.
+    numpy.testing.assert_array_equal(rst.data, expected)
+    assert not RasterUtilClass.crop_raster_by_extent(src, out, (10., 11., 0., 1.))
+
+
+def test_sample_xy(tmp_path):
+    data = numpy.arange(35.).reshape(7, 5)
+    data[3][2] = -9999.
+    src = write_tif(tmp_path / 'sample.tif', data)
+    rst = RasterUtilClass.read_raster(src)
+    xs = numpy.array([0.5, 2.5, 4.9, 5., 5.1, -1.])
+    ys = numpy.array([6.5, 3.5, 0.1, 0., 3., 3.])
+    expected = [0., numpy.nan, 34., 34., numpy.nan, numpy.nan]
+    numpy.testing.assert_array_equal(rst.sample_xy(xs, ys), expected)
+    assert rst.sample_xy(xs, ys, masked=True).mask.tolist() == [False, True, False,
+                                                                 False, True, True]
+    assert rst.sample_xy(xs, ys)[0] == rst.get_value_by_xy(0.5, 6.5)
+    src2 = write_tif(tmp_path / 'sample2.tif', data * 2.)
+    values = RasterUtilClass.sample_rasters([src, src2], xs[:3], ys[:3], max_workers=2)
+    numpy.testing.assert_array_equal(values[0], expected[:3])
+    numpy.testing.assert_array_equal(values[1], [0., 2. * data[3][2], 68.])
+
+
+@pytest.mark.parametrize('max_workers', [1, 3])
+def test_raster_calculator(tmp_path, max_workers):
+    from pygeoc.raster import RasterCalculator, GDT_Int32
+    acc = numpy.arange(1., 36.).reshape(7, 5)
+    acc[0][0] = -9999.
+    slp = numpy.full((7, 5), 0.5)
+    slp[6][4] = -1.
+    inputs = {'acc': write_tif(tmp_path / 'acc.tif', acc),
+              'slp': write_tif(tmp_path / 'slp.tif', slp, nodata=-1.)}
+    out = str(tmp_path / 'twi.tif')
+    calc = RasterCalculator(inputs, 'log(acc * cellsize / tan(slp))', variables={'cellsize': 2.},
+                            block_shape=(2, 5), max_workers=max_workers)
+    assert calc.run(out) == out
+    with numpy.errstate(invalid='ignore'):
+        expected = numpy.log(acc * 2. / numpy.tan(slp)).astype(numpy.float32)
+    expected[0][0] = expected[6][4] = -9999.
+    numpy.testing.assert_allclose(RasterUtilClass.read_raster(out).data, expected, rtol=1e-6)
+    RasterCalculator(inputs, lambda acc, slp: acc - 10., -1, GDT_Int32).run(out)
+    rst = RasterUtilClass.read_raster(out)
+    assert rst.data.dtype == numpy.int32
+    assert rst.data[0][0] == -1 and rst.data[6][4] == -1 and rst.data[3][2] == 8
+
+
+@pytest.mark.parametrize('tile_rows', [None, 2])
+def test_label_connected(tmp_path, tile_rows):
+    data = numpy.array([[1, 1, 0, 0, 1],
+                        [0, 0, 0, 1, 0],
+                        [1, 0, 1, 0, 0],
+                        [1, 0, 1, 1, -9999]], dtype=numpy.float32)
+    src = write_tif(tmp_path / 'label.tif', data)
+    labels, table = RasterUtilClass.label_connected(src, value=1, tile_rows=tile_rows)
+    numpy.testing.assert_array_equal(labels, [[1, 1, 0, 0, 2],
+                                              [0, 0, 0, 2, 0],
+                                              [3, 0, 2, 0, 0],
+                                              [3, 0, 2, 2, 0]])
+    assert table['count'].tolist() == [2, 5, 2]
+    assert table['row_min'].tolist() == [0, 0, 2]
+    assert table['col_max'].tolist() == [1, 4, 0]
+    labels, table = RasterUtilClass.label_connected(src, connectivity=4, tile_rows=tile_rows)
+    assert labels[3][4] == 0
+    assert labels.max() == len(table['label']) == 7
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_tile_scheduler(tmp_path, processes):
+    data = numpy.random.RandomState(0).rand(23, 17)
+    data[data < 0.1] = -9999.
+    src = write_tif(tmp_path / 'tile.tif', data)
+    kernel = partial(RasterUtilClass.morphology, operations=['dilation', 'erosion', 'erosion'],
+                     nodata_value=-9999.)
+    expected = kernel(RasterUtilClass.read_raster(src).data)
+    out = str(tmp_path / 'tile_out.tif')
+    TileScheduler(kernel, halo=3, tile_shape=(5, 6), processes=processes).run(src, out)
+    numpy.testing.assert_array_equal(RasterUtilClass.read_raster(out).data, expected)
+    # tile shape derived from memory limit of float32 input and output per worker
+    scheduler = TileScheduler(kernel, halo=3, memory_limit=8 * 14 * 23)
+    assert [w.read_ysize for w in scheduler.get_windows([src], 4)] == [11, 14, 10]
+    # one output raster for each array returned by the kernel
+    from pygeoc.raster import GDT_Int32
+    outs = [str(tmp_path / 'twice.tif'), str(tmp_path / 'valid.tif')]
+    assert TileScheduler(twice_and_valid, tile_shape=(5, 6), processes=processes).run(
+        src, outs, [GDT_Float32, GDT_Int32], [-9999., -1]) == outs
+    data = RasterUtilClass.read_raster(src).data
+    numpy.testing.assert_array_equal(RasterUtilClass.read_raster(outs[0]).data, data * 2.)
+    numpy.testing.assert_array_equal(RasterUtilClass.read_raster(outs[1]).data, data != -9999.)
+    # the shared memory of finished tiles is released if any tile fails
+    if processes > 1 and os.path.isdir('/dev/shm'):
+        before = set(os.listdir('/dev/shm'))
+        with pytest.raises(ValueError):
+            TileScheduler(failing_kernel, tile_shape=(2, 17), processes=processes,
+                          with_window=True).run(src, out)
+        assert set(os.listdir('/dev/shm')) <= before
+
+
+def twice_and_valid(data):
+    return data * 2., data != -9999.
+
+
+def failing_kernel(data, window):
+    if window.yoff == 0:
+        raise ValueError('failed tile')
+    time.sleep(0.05)
+    return data
+
+
+def test_raster_cache(tmp_path):
+    data = numpy.arange(35.).reshape(7, 5)
+    src = write_tif(tmp_path / 'cached.tif', data)
+    src2 = write_tif(tmp_path / 'cached2.tif', data)
+    cache = RasterUtilClass.enable_raster_cache(data.astype(numpy.float32).nbytes * 3 // 2)
+    try:
+        first = RasterUtilClass.read_raster(src, lazy=True)
+        second = RasterUtilClass.read_raster(src, lazy=True)
+        assert second.data is first.data
+        with pytest.raises(ValueError):
+            second.data[0][0] = 1.
+        second.data = data * 2.  # assign a new array to the copy only
+        assert RasterUtilClass.read_raster(src, lazy=True).data[1][1] == 6.
+        RasterUtilClass.raster_to_gtiff(src, str(tmp_path / 'converted.tif'))
+        assert cache.info()['hits'] == 3 and cache.info()['misses'] == 1
+        RasterUtilClass.read_raster(src2, lazy=True)  # evict src
+        assert cache.info()['evictions'] == 1 and cache.info()['entries'] == 1
+        write_tif(tmp_path / 'cached2.tif', data + 1.)
+        assert RasterUtilClass.read_raster(src2, lazy=True).data[0][0] == 1.
+        assert cache.info()['misses'] == 3
+    finally:
+        RasterUtilClass.disable_raster_cache()
+    assert RasterUtilClass.get_raster_cache() is None
+
+
+@pytest.mark.parametrize('ram_disk', [False, True])
+def test_memory_workspace(tmp_path, ram_disk):
+    data = numpy.arange(6.).reshape(2, 3)
+    with MemoryWorkspace(str(tmp_path / 'ram') if ram_disk else None) as ws:
+        tmp = write_tif(ws.get_path('inter.tif'), data)
+        assert tmp.startswith('/vsimem/') != ram_disk
+        assert ws.exists('inter.tif')
+        RasterUtilClass.raster_reclassify(tmp, {0: 10}, ws.get_path('reclass.tif'))
+        out = ws.persist('reclass.tif', str(tmp_path / 'final.tif'))
+        ws.remove(tmp)
+        assert not ws.exists('inter.tif')
+    assert not ws.exists('reclass.tif')
+    numpy.testing.assert_array_equal(RasterUtilClass.read_raster(out).data,
+                                     [[10., 1., 2.], [3., 4., 5.]])
+
+
+def test_overviews_and_cog(tmp_path):
+    data = numpy.tile(numpy.arange(600., dtype=numpy.float32), (600, 1))
+    data[:10, :10] = -9999.
+    cog = str(tmp_path / 'cog.tif')
+    RasterUtilClass.write_gtiff_file(cog, 600, 600, data, GEOTRANS, '', -9999., cog=True)
+    numpy.testing.assert_array_equal(RasterUtilClass.read_raster(cog).data, data)
+    src = write_tif(tmp_path / 'ovr.tif', data)
+    assert RasterUtilClass.build_overviews(src, resampling='nearest') == [2]
+    assert RasterUtilClass.read_overview(src, max_cells=300 * 300).shape == (300, 300)
+    assert RasterUtilClass.read_overview(src, max_cells=1000).shape == (31, 31)
+    assert RasterUtilClass.read_overview(src, max_cells=600 * 600).shape == (600, 600)
+    exact = RasterUtilClass.raster_statistics(src)
+    approx = RasterUtilClass.raster_statistics(src, approx=True)
+    assert approx[0] == exact[0]
+    assert approx[2] == pytest.approx(exact[2], rel=0.01)
+
+
+def test_align_to(tmp_path):
+    data = numpy.arange(48.).reshape(6, 8)
+    data[0][0] = -9999.
+    src = write_tif(tmp_path / 'fine.tif', data)
+    ref = str(tmp_path / 'ref.tif')
+    RasterUtilClass.write_gtiff_file(ref, 3, 3, numpy.zeros((3, 3)), [2., 2., 0, 7., 0, -2.],
+                                     '', -9999.)
+    outs = [str(tmp_path / 'avg.tif'), str(tmp_path / 'nearest.tif')]
+    avg = RasterUtilClass.align_to(ref, src, method='average')
+    # the reference covers rows 0~5, cols 2~7 of the source
+    expected = data[0:6, 2:8].reshape(3, 2, 3, 2).mean(axis=(1, 3))
+    numpy.testing.assert_array_equal(avg.data, expected)
+    nearest = RasterUtilClass.align_to(ref, [src], [outs[1]])
+    assert nearest == [outs[1]]
+    numpy.testing.assert_array_equal(RasterUtilClass.read_raster(outs[1]).data,
+                                     data[1:6:2, 3:8:2])
+    modes = RasterUtilClass.align_to(ref, [src], method='mode')
+    numpy.testing.assert_array_equal(modes[0].data, data[0:6:2, 2:8:2])
+
+
+def test_zonal_stats(tmp_path):
+    from pygeoc.raster import GDT_Int32
+    zone = numpy.array([[1, 1, 2, 2], [3, 3, 2, -9999], [3, 1, 1, 5]], dtype=numpy.int32)
+    value = numpy.arange(12.).reshape(3, 4)
+    value[2][3] = -9999.
+    zone_file = write_tif(tmp_path / 'zone.tif', zone, -9999, GDT_Int32)
+    value_file = write_tif(tmp_path / 'value.tif', value)
+    table = RasterUtilClass.zonal_stats(zone_file, [value_file], block_shape=(1, 4),
+                                        stats=['count', 'sum', 'mean', 'min', 'max', 'std'])
+    assert table['zone'].tolist() == [1, 2, 3, 5]
+    assert table['value_count'].tolist() == [4, 3, 3, 0]
+    numpy.testing.assert_allclose(table['value_sum'][:3], [20., 11., 17.])
+    numpy.testing.assert_allclose(table['value_mean'][:3], [5., 11. / 3., 17. / 3.])
+    assert table['value_min'][:3].tolist() == [0., 2., 4.]
+    assert table['value_max'][:3].tolist() == [10., 6., 8.]
+    assert table['value_std'][0] == pytest.approx(numpy.std([0., 1., 9., 10.]))
+    assert numpy.isnan(table['value_mean'][3])